@@ -7,15 +7,25 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from typing import Optional
-import hashlib, hmac, base64, json, sqlite3
+import hashlib, hmac, base64, json, sqlite3, os
 from contextlib import contextmanager
-from db.database_utilities import get_db,DATABASE_NAME
+from db.database_utilities import get_db, fetch_one, run_db, use_user_shard, DATABASE_NAME
+from utils.cache import TTLCache
+from utils.passwords import (
+    PASSWORD_REHASHES, hash_password_async, verify_password_async, needs_rehash, reject_unknown_user, scheme_of,
+)
 
 # ─── CONFIG ──────────────────────────────────────────────────────────
 SECRET_KEY = "CHANGE_THIS_IN_PRODUCTION_USE_ENV_VAR"   # ← swap with env var
 ALGORITHM  = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 1 day
 
+# Verified token payloads and resolved users, so an authenticated request
+# on a warm cache costs no decoding and no user-table query
+USER_CACHE_TTL = float(os.environ.get("AUTH_USER_CACHE_TTL", "60"))
+_token_cache = TTLCache(maxsize=int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000")))
+_user_cache  = TTLCache(maxsize=int(os.environ.get("AUTH_USER_CACHE_SIZE", "10000")), ttl=USER_CACHE_TTL)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 auth_router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -31,6 +41,13 @@ def create_token(user_id: str, username: str) -> str:
     return f"{header}.{payload}.{sig}"
 
 def verify_token(token: str) -> dict:
+    cached = _token_cache.get(token)
+    if cached is not None:
+        data, expires_at = cached
+        if expires_at >= datetime.utcnow():
+            return data
+        _token_cache.pop(token)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
     try:
         parts = token.split('.')
         if len(parts) != 3: raise ValueError
@@ -39,34 +56,42 @@ def verify_token(token: str) -> dict:
         if not hmac.compare_digest(sig, expected_sig): raise ValueError("Invalid signature")
         padding = 4 - len(payload) % 4
         data = json.loads(base64.urlsafe_b64decode(payload + '=' * padding))
-        if datetime.fromisoformat(data['exp']) < datetime.utcnow():
+        expires_at = datetime.fromisoformat(data['exp'])
+        if expires_at < datetime.utcnow():
             raise ValueError("Token expired")
+        _token_cache.set(token, (data, expires_at))
         return data
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
 
-def hash_password(pw: str) -> str:
-    return hashlib.sha256(pw.encode()).hexdigest()
-
 # ─── DB HELPER (reuse same db) ────────────────────────────────────────
 
 from fastapi import Depends, HTTPException, status
 from db.database_utilities import get_db
 from utils.helpers import row_to_dict
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """The token's user; the rest of the request's queries go to their shard"""
     payload = verify_token(token)
     user_id = payload["sub"]
 
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-        user = cursor.fetchone()
-
-        if not user:
+    user = _user_cache.get(user_id)
+    if user is None:
+        row = await fetch_one("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        if not row:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+        user = row_to_dict(row)
+        _user_cache.set(user_id, user)
+
+    use_user_shard(user_id)
+    return user
 
-        return row_to_dict(user)
+def invalidate_user(user_id: str):
+    """Drop a cached user — call after any change to their users row"""
+    _user_cache.pop(user_id)
+
+def auth_cache_stats() -> dict:
+    return {"tokens": _token_cache.stats(), "users": _user_cache.stats()}
 
 # ─── RESPONSE MODELS ──────────────────────────────────────────────────
 class TokenResponse(BaseModel):
@@ -82,33 +107,39 @@ class MeResponse(BaseModel):
 # ─── ROUTES ──────────────────────────────────────────────────────────
 @auth_router.post("/login", response_model=TokenResponse)
 async def login(form: OAuth2PasswordRequestForm = Depends()):
-    """Login with username + password → returns JWT token"""
-    with get_db() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT user_id, username, password FROM users WHERE username = ?",
-            (form.username,)
-        )
-        user = cur.fetchone()
-
-    if not user:
+    """
+    Login with username + password → returns JWT token
+    The KDF runs on the password-hash pool, not the event loop. Hashes made
+    with an older scheme or cost are replaced with a current one.
+    """
+    user = await fetch_one(
+        "SELECT user_id, username, password FROM users WHERE username = ?",
+        (form.username,)
+    )
+
+    stored = user["password"] if user else None
+    if not user or not await verify_password_async(form.password, stored):
+        if not user:
+            await reject_unknown_user(form.password)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
         )
 
-    # Compare hashed password
-    if user["password"] != hash_password(form.password):
-        # Also allow plain text for backwards compat with existing test data
-        if user["password"] != form.password:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect username or password"
-            )
+    if needs_rehash(stored):
+        await rehash_password(user["user_id"], form.password, stored)
 
     token = create_token(user["user_id"], user["username"])
     return TokenResponse(access_token=token)
 
+async def rehash_password(user_id: str, password: str, stored: str):
+    """Replace a verified legacy hash, unless the password changed meanwhile"""
+    new_hash = await hash_password_async(password)
+    await run_db(lambda conn: conn.execute(
+        "UPDATE users SET password = ? WHERE user_id = ? AND password = ?", (new_hash, user_id, stored)))
+    PASSWORD_REHASHES.inc(1, scheme_of(stored))
+    invalidate_user(user_id)
+
 @auth_router.get("/me", response_model=MeResponse)
 async def me(current_user: dict = Depends(get_current_user)):
     """Get the currently authenticated user's info"""
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, status, Depends
 from typing import List
 from datetime import datetime, date, timedelta
 import uuid
 
-from db.database_utilities import get_db
+from db.database_utilities import run_db
+from db.budget_status import (
+    BUDGET_SPEND_SQL, MOVING_AVERAGE_WINDOW, budget_spend_params, load_budget_status, refresh_budget_status,
+)
+from db.versions import bump_data_version
 from model.budget_schema import BudgetCreate, BudgetResponse, BudgetAlert
-from utils.helpers import row_to_dict
-from ml.algorithms import moving_average
+from utils.fastjson import encode_rows, json_bytes_response
+from utils.helpers import check_not_modified, etag_headers
 from api.auth import get_current_user
 
 router = APIRouter(
@@ -14,26 +18,31 @@ router = APIRouter(
     tags=["Budgets"]
 )
 
+# Budgets with month-to-date spend and trailing average daily spend come from
+# budget_status snapshots (db/budget_status.py): one primary-key join per
+# request, recomputed from the daily rollup only on the first read of a day.
+async def fetch_budget_spend(user_id: str, today: date):
+    return await run_db(lambda conn: load_budget_status(conn.cursor(), user_id, today))
+
 # ==================== CREATE BUDGET ====================
 @router.post("", response_model=BudgetResponse, status_code=status.HTTP_201_CREATED)
 async def create_budget(budget: BudgetCreate, user=Depends(get_current_user)):
     user_id = user["user_id"]
+    budget_id = str(uuid.uuid4())
+    created_at = datetime.now()
 
-    with get_db() as conn:
+    def _create(conn):
         cursor = conn.cursor()
 
         # Prevent duplicate budget for same category
         cursor.execute("""
             SELECT budget_id FROM budgets
-            WHERE user_id=? AND LOWER(category)=LOWER(?)
+            WHERE user_id=? AND category=?
         """, (user_id, budget.category.value))
 
         if cursor.fetchone():
             raise HTTPException(400, "Budget already exists for this category")
 
-        budget_id = str(uuid.uuid4())
-        created_at = datetime.now()
-
         cursor.execute("""
             INSERT INTO budgets (budget_id, user_id, category, monthly_limit, created_at)
             VALUES (?, ?, ?, ?, ?)
@@ -44,6 +53,10 @@ async def create_budget(budget: BudgetCreate, user=Depends(get_current_user)):
             budget.monthly_limit,
             created_at
         ))
+        refresh_budget_status(cursor, user_id, date.today())
+        bump_data_version(cursor, user_id)
+
+    await run_db(_create)
 
     return BudgetResponse(
         budget_id=budget_id,
@@ -55,135 +68,72 @@ async def create_budget(budget: BudgetCreate, user=Depends(get_current_user)):
 
 
 # ==================== GET BUDGETS ====================
-@router.get("", response_model=List[BudgetResponse])
-async def get_budgets(user=Depends(get_current_user)):
-    user_id = user["user_id"]
-    today = date.today()
-    month_start = today.replace(day=1)
-
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM budgets WHERE user_id=?", (user_id,))
-        budgets = cursor.fetchall()
-
-        result = []
+BUDGET_COLUMNS = tuple(BudgetResponse.model_fields)
 
-        for b in budgets:
-            budget = row_to_dict(b)
-
-            # Calculate current month spending dynamically
-            cursor.execute("""
-                SELECT COALESCE(SUM(amount),0) as total
-                FROM expenses
-                WHERE user_id=?
-                AND LOWER(category)=LOWER(?)
-                AND date>=?
-                AND date<=?
-            """, (
-                user_id,
-                budget["category"],
-                month_start,
-                today
-            ))
+@router.get("", response_model=List[BudgetResponse])
+async def get_budgets(request: Request, user=Depends(get_current_user)):
+    _, etag, not_modified = await check_not_modified(request, user["user_id"])
+    if not_modified:
+        return not_modified
+    rows = await fetch_budget_spend(user["user_id"], date.today())
+    budgets = [[row[c] for c in BUDGET_COLUMNS] for row in rows]
+    return json_bytes_response(encode_rows(budgets, BUDGET_COLUMNS, ("created_at",)), headers=etag_headers(etag))
 
-            spent = cursor.fetchone()["total"]
-            budget["amount_used"] = round(spent, 2)
 
-            result.append(BudgetResponse(**budget))
+# ==================== BUDGET ALERTS ====================
+def month_days_remaining(today: date) -> int:
+    if today.month == 12:
+        next_month = today.replace(year=today.year + 1, month=1, day=1)
+    else:
+        next_month = today.replace(month=today.month + 1, day=1)
+    month_end = next_month - timedelta(days=1)
+    return month_end.day - today.day
+
+
+def build_budget_alert(category, budget_limit, current_spending, avg_daily, days_remaining) -> BudgetAlert:
+    """Status + month-end projection for one budget"""
+    if avg_daily and days_remaining > 0:
+        predicted_month_end = current_spending + avg_daily * days_remaining
+    else:
+        predicted_month_end = current_spending
+
+    percentage_used = (
+        (current_spending / budget_limit) * 100
+        if budget_limit > 0 else 0
+    )
 
-    return result
+    # Status logic
+    if percentage_used >= 90 or predicted_month_end >= budget_limit:
+        status_level = "danger"
+    elif percentage_used >= 70:
+        status_level = "warning"
+    else:
+        status_level = "safe"
+
+    return BudgetAlert(
+        category=category,
+        current_spending=round(current_spending, 2),
+        budget_limit=budget_limit,
+        percentage_used=round(percentage_used, 2),
+        status=status_level,
+        predicted_month_end=round(predicted_month_end, 2)
+    )
 
 
-# ==================== BUDGET ALERTS ====================
 @router.get("/alerts", response_model=List[BudgetAlert])
-async def get_budget_alerts(user=Depends(get_current_user)):
-    user_id = user["user_id"]
-
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM budgets WHERE user_id=?", (user_id,))
-        budgets = [row_to_dict(row) for row in cursor.fetchall()]
-
-        if not budgets:
-            return []
-
-        alerts = []
-        today = date.today()
-        month_start = today.replace(day=1)
-
-        # Calculate month end
-        if today.month == 12:
-            next_month = today.replace(year=today.year + 1, month=1, day=1)
-        else:
-            next_month = today.replace(month=today.month + 1, day=1)
-
-        month_end = next_month - timedelta(days=1)
-        days_remaining = month_end.day - today.day
-
-        for budget in budgets:
-            category = budget["category"]
-
-            # Current month spending
-            cursor.execute("""
-                SELECT COALESCE(SUM(amount),0) as total
-                FROM expenses
-                WHERE user_id=?
-                AND LOWER(category)=LOWER(?)
-                AND date>=?
-                AND date<=?
-            """, (
-                user_id,
-                category,
-                month_start,
-                today
-            ))
-
-            current_spending = cursor.fetchone()["total"]
-
-            # Last 30 days data for ML prediction
-            cursor.execute("""
-                SELECT amount FROM expenses
-                WHERE user_id=?
-                AND LOWER(category)=LOWER(?)
-                AND date>=?
-            """, (
-                user_id,
-                category,
-                today - timedelta(days=30)
-            ))
-
-            daily_amounts = [r["amount"] for r in cursor.fetchall()]
-
-            if daily_amounts and days_remaining > 0:
-                avg_daily = moving_average(daily_amounts, window=7)
-                predicted_month_end = current_spending + avg_daily * days_remaining
-            else:
-                predicted_month_end = current_spending
-
-            budget_limit = budget["monthly_limit"]
-
-            percentage_used = (
-                (current_spending / budget_limit) * 100
-                if budget_limit > 0 else 0
-            )
-
-            # Status logic
-            if percentage_used >= 90 or predicted_month_end >= budget_limit:
-                status_level = "danger"
-            elif percentage_used >= 70:
-                status_level = "warning"
-            else:
-                status_level = "safe"
-
-            alerts.append(
-                BudgetAlert(
-                    category=category,
-                    current_spending=round(current_spending, 2),
-                    budget_limit=budget_limit,
-                    percentage_used=round(percentage_used, 2),
-                    status=status_level,
-                    predicted_month_end=round(predicted_month_end, 2)
-                )
-            )
-
-    return alerts
+async def get_budget_alerts(request: Request, response: Response, user=Depends(get_current_user)):
+    _, etag, not_modified = await check_not_modified(request, user["user_id"])
+    if not_modified:
+        return not_modified
+    response.headers.update(etag_headers(etag))
+    today = date.today()
+    rows = await fetch_budget_spend(user["user_id"], today)
+    days_remaining = month_days_remaining(today)
+
+    return [
+        build_budget_alert(
+            row["category"], row["monthly_limit"], row["month_to_date"],
+            row["recent_avg"], days_remaining
+        )
+        for row in rows
+    ]
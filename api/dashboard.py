@@ -0,0 +1,157 @@
+"""
+api/dashboard.py
+GET /dashboard — everything the web app's dashboard shows, in one request.
+
+One transaction reads the user's daily rollup rows from the start of the
+90-day model window (or the month, if earlier) to the end of this month, the
+8 newest expenses and the budgets. The monthly summary, budget alerts,
+spending patterns and next-week forecast are all derived from those rows in
+memory, using the same functions as their own endpoints.
+
+The ETag is derived from the user's data version and the day. Every expense
+or budget write bumps the version, so a matching If-None-Match returns 304
+after a single primary-key read.
+"""
+from datetime import date, timedelta
+
+from fastapi import APIRouter, Depends, Request, Response
+
+from api.auth import get_current_user
+from api.budgets import MOVING_AVERAGE_WINDOW, BUDGET_COLUMNS, build_budget_alert, month_days_remaining
+from api.expenses import EXPENSE_COLUMNS, EXPENSE_SELECT, EXPENSE_TIMESTAMPS, monthly_summary_body
+from api.predictions import PATTERN_LOOKBACK_DAYS, MIN_FORECAST_DAYS, build_weekly_forecast, patterns_from_series
+from db.database_utilities import run_read, require_version
+from db.model_state import MODEL_LOOKBACK_DAYS, window_start
+from db.versions import get_data_version
+from ml.algorithms import predict_next_week_daily, daily_confidence, daily_trend
+from ml.timeseries import daily_matrix, active_days
+from utils.fastjson import dumps, json_bytes_response, row_dicts
+from utils.helpers import month_range, weak_etag, etag_matches, etag_headers
+
+router = APIRouter(tags=["Dashboard"])
+
+RECENT_EXPENSES = 8
+
+
+def dashboard_etag(user_id: str, version: int, today: date) -> str:
+    return weak_etag("dashboard", user_id, version, today)
+
+
+def load_dashboard_data(conn, user_id: str, today: date) -> dict:
+    """All rows the dashboard needs, read in one transaction"""
+    cursor = conn.cursor()
+    month_start, month_end = month_range(today.year, today.month)
+    since = min(today - timedelta(days=MODEL_LOOKBACK_DAYS), month_start)
+    cursor.execute("""
+        SELECT category, day, total, count FROM daily_category_totals
+        WHERE user_id = ? AND day >= ? AND day < ?
+        ORDER BY day, category
+    """, (user_id, str(since), str(month_end)))
+    rows = [(category, date.fromisoformat(day), total, count) for category, day, total, count in cursor.fetchall()]
+    cursor.execute("SELECT MIN(day), COALESCE(SUM(total), 0) FROM daily_category_totals WHERE user_id = ?",
+                   (user_id,))
+    first_day, total_spent = cursor.fetchone()
+    cursor.execute(f"""
+        SELECT {EXPENSE_SELECT} FROM expenses WHERE user_id = ?
+        ORDER BY date DESC, expense_id DESC LIMIT ?
+    """, (user_id, RECENT_EXPENSES))
+    recent = cursor.fetchall()
+    cursor.execute(f"SELECT {', '.join(BUDGET_COLUMNS)} FROM budgets WHERE user_id = ? ORDER BY category",
+                   (user_id,))
+    budgets = cursor.fetchall()
+    return {
+        "version": get_data_version(cursor, user_id),
+        "rows": rows,
+        "first_day": date.fromisoformat(first_day) if first_day else None,
+        "total_spent": total_spent,
+        "recent": recent,
+        "budgets": budgets,
+    }
+
+
+def forecast_from_rows(rows, first_day: date, today: date):
+    """Next-week forecast over the model window, or None with too little history"""
+    if first_day is None or first_day > today:
+        return None
+    start = window_start(first_day, today)
+    # Category-major order so the matrix rows come out sorted by category
+    window = sorted((r for r in rows if start <= r[1] <= today), key=lambda r: r[0])
+    categories, daily = daily_matrix(window, start, today)
+    if active_days(daily) < MIN_FORECAST_DAYS:
+        return None
+    n = daily.shape[1]
+    return build_weekly_forecast(
+        today, categories, predict_next_week_daily(daily), daily_confidence(daily), daily_trend(daily),
+        weekly_average=daily.sum(axis=1) / n * 7, last_week=daily[:, -8:].sum(axis=1),
+    )
+
+
+def build_dashboard(user: dict, data: dict, today: date) -> dict:
+    rows = data["rows"]
+    month_start = today.replace(day=1)
+    trailing_start = today - timedelta(days=MOVING_AVERAGE_WINDOW - 1)
+    week_start = today - timedelta(days=7)
+
+    month_count, month_total, breakdown = 0, 0.0, {}
+    month_to_date, trailing = {}, {}
+    week_total = 0.0
+    for category, day, total, count in rows:
+        if day >= month_start:
+            month_count += count
+            month_total += total
+            breakdown[category] = breakdown.get(category, 0.0) + total
+            if day <= today:
+                month_to_date[category] = month_to_date.get(category, 0.0) + total
+        if trailing_start <= day <= today:
+            trailing[category] = trailing.get(category, 0.0) + total
+        if week_start <= day <= today:
+            week_total += total
+
+    days_remaining = month_days_remaining(today)
+    alerts = [
+        build_budget_alert(b["category"], b["monthly_limit"], month_to_date.get(b["category"], 0.0),
+                           trailing.get(b["category"], 0.0) / MOVING_AVERAGE_WINDOW, days_remaining)
+        for b in data["budgets"]
+    ]
+
+    lookback = today - timedelta(days=PATTERN_LOOKBACK_DAYS)
+    categories, daily = daily_matrix([r for r in rows if lookback <= r[1] <= today], lookback, today)
+
+    return {
+        "as_of": today,
+        "user": {k: user.get(k) for k in ("user_id", "username", "email", "full_name")},
+        "total_spent": round(data["total_spent"], 2),
+        "week_total": round(week_total, 2),
+        "monthly_summary": monthly_summary_body(
+            today.month, today.year, month_count, month_total,
+            {c: round(t, 2) for c, t in sorted(breakdown.items())}),
+        "recent_expenses": row_dicts(data["recent"], EXPENSE_COLUMNS, EXPENSE_TIMESTAMPS),
+        "budgets": row_dicts(data["budgets"], BUDGET_COLUMNS, ("created_at",)),
+        "budget_alerts": alerts,
+        "forecast": forecast_from_rows(rows, data["first_day"], today),
+        "patterns": patterns_from_series(categories, daily, PATTERN_LOOKBACK_DAYS),
+    }
+
+
+@router.get("/dashboard")
+async def get_dashboard(request: Request, user=Depends(get_current_user)):
+    """
+    Overview stats, monthly summary, recent expenses, budgets with alerts,
+    spending patterns and the next-week forecast (null until there are 7 days
+    of history). Send If-None-Match with the last ETag to get 304 when nothing
+    changed.
+    """
+    user_id = user["user_id"]
+    today = date.today()
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        version = await run_read(lambda conn: get_data_version(conn.cursor(), user_id))
+        etag = dashboard_etag(user_id, version, today)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=etag_headers(etag))
+        require_version(user_id, version)
+
+    data = await run_read(load_dashboard_data, user_id, today)
+    etag = dashboard_etag(user_id, data["version"], today)
+    return json_bytes_response(dumps(build_dashboard(user, data, today)), headers=etag_headers(etag))
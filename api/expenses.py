@@ -1,10 +1,24 @@
-from fastapi import Depends, FastAPI, HTTPException, status
-from typing import List, Optional
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from typing import List, Literal, Optional
 from datetime import datetime, date
+import base64
+import os
 import uuid
-from db.database_utilities import get_db
-from model.expense_schema import ExpenseResponse, ExpenseCreate, ExpenseUpdate, ExpenseCategory
-from utils.helpers import verify_user_exists, verify_expense_ownership, row_to_dict
+from db.database_utilities import run_db, fetch_one, fetch_all, stream_query
+from model.expense_schema import (
+    ExpenseResponse, ExpenseCreate, ExpenseUpdate, ExpenseCategory, BulkImportResult, BulkRowError,
+)
+from db.rollups import apply_expense_delta, apply_expense_batch, move_expense
+from db.versions import bump_data_version
+from utils.helpers import (
+    verify_user_exists, verify_expense_ownership, row_to_dict, month_range, uuid4_strings,
+    check_not_modified, etag_headers,
+)
+from utils.ingest import PARSERS, PARSE_ERRORS, detect_format
+from utils.exports import WRITERS, MEDIA_TYPES, parquet_available
+from utils.fastjson import dumps, encode_rows, encode_rows_ndjson, json_bytes_response, row_dicts
 
 # ------------------------------------------------------------------------
 from fastapi import APIRouter
@@ -16,64 +30,305 @@ router = APIRouter(
 # ------------------------------------------------------------------------
 
 from api.auth import get_current_user   # ← pulls user_id from Bearer token
-def row_dict(row): 
-    return dict(zip(row.keys(), row))
+# Reads select exactly the ExpenseResponse fields and encode the rows as they
+# come from SQLite (see utils/fastjson.py); rows were validated when written.
+EXPENSE_COLUMNS = tuple(ExpenseResponse.model_fields)
+EXPENSE_SELECT = ", ".join(EXPENSE_COLUMNS)
+EXPENSE_TIMESTAMPS = ("created_at", "updated_at")
+
+def expense_json(row) -> Response:
+    return json_bytes_response(dumps(row_dicts([row], EXPENSE_COLUMNS, EXPENSE_TIMESTAMPS)[0]))
+
+# ─── KEYSET PAGINATION ──────────────────────────────────────────────────
+# Pages are ordered (date DESC, expense_id DESC); the cursor is the key of
+# the last row served, so each page is an index seek on idx_expenses_user_date
+# instead of an OFFSET scan.
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+def encode_cursor(row) -> str:
+    return base64.urlsafe_b64encode(f"{row['date']}|{row['expense_id']}".encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        day, expense_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return date.fromisoformat(day).isoformat(), expense_id
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+def expense_filters(user_id, category=None, start_date=None, end_date=None):
+    """WHERE clause + params shared by the list, stream and export paths"""
+    q = "user_id = ?"
+    p = [user_id]
+    if category:    q += " AND category = ?";   p.append(category.value)
+    if start_date:  q += " AND date >= ?";       p.append(str(start_date))
+    if end_date:    q += " AND date <= ?";       p.append(str(end_date))
+    return q, p
+
+async def fetch_expense_page(where, params, after=None, limit=None, columns="*"):
+    q = f"SELECT {columns} FROM expenses WHERE {where}"
+    p = list(params)
+    if after:
+        q += " AND date <= ? AND (date < ? OR expense_id < ?)"
+        p += [after[0], after[0], after[1]]
+    q += " ORDER BY date DESC, expense_id DESC"
+    if limit:
+        q += " LIMIT ?"; p.append(limit)
+    return await fetch_all(q, p)
+
+async def iter_expense_pages(where, params, after=None, limit=None, batch_size=STREAM_BATCH_SIZE, columns="*"):
+    """Yield successive pages without ever holding more than one in memory"""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        rows = await fetch_expense_page(where, params, after, size, columns)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < size:
+            return
+        after = (rows[-1]["date"], rows[-1]["expense_id"])
+        if remaining is not None:
+            remaining -= len(rows)
 
 
 @router.post("", response_model=ExpenseResponse, status_code=201)
 async def add_expense(expense: ExpenseCreate, user=Depends(get_current_user)):
     """Add a new expense — user_id extracted from JWT automatically"""
     user_id = user["user_id"]
-    with get_db() as conn:
+    eid = str(uuid.uuid4())
+    now = datetime.now()
+
+    def _insert(conn):
         cur = conn.cursor()
-        eid = str(uuid.uuid4())
-        now = datetime.now()
         cur.execute("""
             INSERT INTO expenses
             (expense_id, user_id, amount, category, description, date, created_at, updated_at)
             VALUES (?,?,?,?,?,?,?,?)
         """, (eid, user_id, expense.amount, expense.category.value,
               expense.description, expense.date, now, now))
+        apply_expense_delta(cur, user_id, expense.category.value, expense.date, expense.amount)
+        bump_data_version(cur, user_id)
+
+    await run_db(_insert)
     return ExpenseResponse(expense_id=eid, user_id=user_id, **expense.dict(), created_at=now, updated_at=now)
 
+# ─── BULK IMPORT ────────────────────────────────────────────────────────
+# Records are parsed from the request stream, validated BULK_CHUNK_SIZE at a
+# time with one pydantic call per chunk, and inserted with executemany in a
+# single transaction together with their rollup and data-version updates.
+BULK_CHUNK_SIZE = 5000
+BULK_MAX_ROWS = int(os.environ.get("BULK_IMPORT_MAX_ROWS", "200000"))
+# Bounds memory as well as work: a CSV quote that never closes is buffered
+# until it does, so the row limit alone would not stop it
+BULK_MAX_BYTES = int(os.environ.get("BULK_IMPORT_MAX_BYTES", str(64 * 1024 * 1024)))
+BULK_MAX_REPORTED_ERRORS = 100
+UPLOAD_READ_SIZE = 64 * 1024
+
+_expense_list = TypeAdapter(List[ExpenseCreate])
+
+def _format_errors(errors) -> List[str]:
+    return [f"{'.'.join(str(p) for p in e['loc']) or 'row'}: {e['msg']}" for e in errors]
+
+def validate_expense_chunk(records, first_row: int):
+    """Validate a chunk; returns (valid ExpenseCreate list, {row number: [messages]})"""
+    failures = {}
+    candidates = []
+    for offset, record in enumerate(records):
+        if isinstance(record, Exception):
+            failures[first_row + offset] = [f"row: Invalid JSON ({record})"]
+        else:
+            candidates.append((first_row + offset, record))
+    try:
+        return _expense_list.validate_python([r for _, r in candidates]), failures
+    except ValidationError as e:
+        by_index = {}
+        for err in e.errors():
+            by_index.setdefault(err["loc"][0], []).append({**err, "loc": err["loc"][1:]})
+        for index, errors in by_index.items():
+            failures[candidates[index][0]] = _format_errors(errors)
+        good = [r for i, (_, r) in enumerate(candidates) if i not in by_index]
+        return _expense_list.validate_python(good), failures
+
+def _too_large() -> HTTPException:
+    return HTTPException(413, f"Bulk imports are limited to {BULK_MAX_BYTES} bytes")
+
+async def _read_upload(upload):
+    while chunk := await upload.read(UPLOAD_READ_SIZE):
+        yield chunk
+
+async def _capped(chunks):
+    """Pass chunks through, failing with 413 once more than BULK_MAX_BYTES have arrived"""
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > BULK_MAX_BYTES:
+            raise _too_large()
+        yield chunk
+
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_import_expenses(
+    request: Request,
+    format:  Optional[Literal["json", "csv", "ndjson"]] = None,
+    atomic:  bool = False,
+    user=Depends(get_current_user)
+):
+    """
+    Import many expenses in one request. The body is a JSON array, CSV (with an
+    amount,category,description,date header) or NDJSON; a multipart upload in a
+    `file` field works too. The format comes from `format`, else the content type
+    or file extension. Valid rows are inserted and invalid ones reported by row
+    number; with `atomic=true` any invalid row rejects the whole import (422).
+    """
+    user_id = user["user_id"]
+    content_type = request.headers.get("content-type", "")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > BULK_MAX_BYTES:
+        raise _too_large()
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(400, "Upload the expenses as a 'file' field")
+        chunks = _read_upload(upload)
+        fmt = format or detect_format(upload.content_type, upload.filename)
+    else:
+        chunks = request.stream()
+        fmt = format or detect_format(content_type)
+
+    now = str(datetime.now())   # what the sqlite3 datetime adapter would store, once
+    rows, failures, chunk, seen = [], {}, [], 0
+
+    def flush():
+        valid, errors = validate_expense_chunk(chunk, seen - len(chunk) + 1)
+        failures.update(errors)
+        rows.extend((eid, user_id, e.amount, e.category.value, e.description, str(e.date), now, now)
+                    for eid, e in zip(uuid4_strings(len(valid)), valid))
+        chunk.clear()
+
+    try:
+        async for record in PARSERS[fmt](_capped(chunks)):
+            seen += 1
+            if seen > BULK_MAX_ROWS:
+                raise HTTPException(413, f"Bulk imports are limited to {BULK_MAX_ROWS} rows")
+            chunk.append(record)
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                flush()
+    except PARSE_ERRORS as e:
+        raise HTTPException(400, f"Could not parse {fmt} upload: {e}")
+    if chunk:
+        flush()
+
+    result = BulkImportResult(
+        inserted=0 if atomic and failures else len(rows),
+        failed=len(failures),
+        errors=[BulkRowError(row=row, errors=failures[row]) for row in sorted(failures)[:BULK_MAX_REPORTED_ERRORS]],
+    )
+    if atomic and failures:
+        raise HTTPException(422, result.model_dump())
+
+    rows.sort()   # expense_id order keeps primary-key inserts local in the b-tree
+
+    def _insert(conn):
+        cur = conn.cursor()
+        cur.executemany("""
+            INSERT INTO expenses
+            (expense_id, user_id, amount, category, description, date, created_at, updated_at)
+            VALUES (?,?,?,?,?,?,?,?)
+        """, rows)
+        apply_expense_batch(cur, user_id, ((r[3], r[5], r[2]) for r in rows))
+        bump_data_version(cur, user_id)
+
+    if rows:
+        await run_db(_insert)
+    return result
+
 @router.get("", response_model=List[ExpenseResponse])
 async def get_expenses(
+    request:    Request,
     category:   Optional[ExpenseCategory] = None,
     start_date: Optional[date] = None,
     end_date:   Optional[date] = None,
+    limit:      Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor:     Optional[str] = None,
+    format:     Literal["json", "ndjson"] = "json",
     user=Depends(get_current_user)
 ):
-    """Get all expenses for the logged-in user, with optional filters"""
+    """
+    Get expenses for the logged-in user, newest first, with optional filters.
+    Pass `limit` to page: when more rows exist the `X-Next-Cursor` header holds
+    the `cursor` for the next page. `format=ndjson` streams one JSON object per line.
+    Responses carry an ETag; a matching If-None-Match returns 304.
+    """
     user_id = user["user_id"]
-    with get_db() as conn:
-        cur = conn.cursor()
-        q = "SELECT * FROM expenses WHERE user_id = ?"
-        p = [user_id]
-        if category:    q += " AND category = ?";   p.append(category.value)
-        if start_date:  q += " AND date >= ?";       p.append(str(start_date))
-        if end_date:    q += " AND date <= ?";       p.append(str(end_date))
-        q += " ORDER BY date DESC"
-        cur.execute(q,p)
-        return [ExpenseResponse(**row_dict(r)) for r in cur.fetchall()]
+    where, params = expense_filters(user_id, category, start_date, end_date)
+    after = decode_cursor(cursor) if cursor else None
+    _, etag, not_modified = await check_not_modified(request, user_id)
+    if not_modified:
+        return not_modified
+
+    if format == "ndjson":
+        async def lines():
+            async for rows in iter_expense_pages(where, params, after, limit, columns=EXPENSE_SELECT):
+                yield encode_rows_ndjson(rows, EXPENSE_COLUMNS, EXPENSE_TIMESTAMPS)
+        return StreamingResponse(lines(), media_type="application/x-ndjson", headers=etag_headers(etag))
+
+    rows = await fetch_expense_page(where, params, after, limit + 1 if limit else None, EXPENSE_SELECT)
+    headers = etag_headers(etag)
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+    return json_bytes_response(encode_rows(rows, EXPENSE_COLUMNS, EXPENSE_TIMESTAMPS), headers=headers)
+
+# ─── EXPORT ─────────────────────────────────────────────────────────────
+# Rows go from one server-side cursor straight to the encoder, EXPORT_BATCH_SIZE
+# at a time, without pydantic models; memory stays flat for any history size.
+EXPORT_BATCH_SIZE = 2000
+EXPORT_COLUMNS = ("expense_id", "amount", "category", "description", "date", "created_at", "updated_at")
+
+@router.get("/export")
+async def export_expenses(
+    format:     Literal["csv", "ndjson", "parquet"] = "csv",
+    category:   Optional[ExpenseCategory] = None,
+    start_date: Optional[date] = None,
+    end_date:   Optional[date] = None,
+    user=Depends(get_current_user)
+):
+    """Download the logged-in user's expenses, newest first, as CSV, NDJSON or Parquet"""
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(501, "Parquet export requires the optional pyarrow package")
+    where, params = expense_filters(user["user_id"], category, start_date, end_date)
+    sql = f"""
+        SELECT {', '.join(EXPORT_COLUMNS)} FROM expenses
+        WHERE {where} ORDER BY date DESC, expense_id DESC
+    """
+    batches = stream_query(sql, params, batch_size=EXPORT_BATCH_SIZE)
+    filename = f"expenses-{date.today().isoformat()}.{format}"
+    return StreamingResponse(
+        WRITERS[format](EXPORT_COLUMNS, batches),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @router.get("/{expense_id}", response_model=ExpenseResponse)
 async def get_expense(expense_id: str, user=Depends(get_current_user)):
     """Get a single expense (must belong to the logged-in user)"""
     user_id = user["user_id"]
-    with get_db() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM expenses WHERE expense_id = ?", (expense_id,))
-        exp = cur.fetchone()
+    exp = await fetch_one(f"SELECT {EXPENSE_SELECT} FROM expenses WHERE expense_id = ?", (expense_id,))
     if not exp: raise HTTPException(404, "Expense not found")
     if exp["user_id"] != user_id: raise HTTPException(403, "Access denied")
-    return ExpenseResponse(**row_dict(exp))
+    return expense_json(exp)
 
 @router.put("/{expense_id}", response_model=ExpenseResponse)
 async def update_expense(expense_id: str, body: ExpenseUpdate, user=Depends(get_current_user)):
     """Update an expense"""
     user_id = user["user_id"]
-    with get_db() as conn:
+
+    def _update(conn):
         cur = conn.cursor()
+        # Take the write lock before reading the old row, so a concurrent
+        # update or delete cannot change it before the rollup is moved
+        cur.execute("BEGIN IMMEDIATE")
         cur.execute("SELECT * FROM expenses WHERE expense_id = ?", (expense_id,))
         exp = cur.fetchone()
         if not exp: raise HTTPException(404, "Expense not found")
@@ -88,79 +343,85 @@ async def update_expense(expense_id: str, body: ExpenseUpdate, user=Depends(get_
         params.append(expense_id)
 
         cur.execute(f"UPDATE expenses SET {', '.join(fields)} WHERE expense_id = ?", params)
-        cur.execute("SELECT * FROM expenses WHERE expense_id = ?", (expense_id,))
-        return ExpenseResponse(**row_dict(cur.fetchone()))
+        if not cur.rowcount: raise HTTPException(404, "Expense not found")
+        # Re-read rather than RETURNING, which yields values before column affinity (7, not 7.0)
+        cur.execute(f"SELECT {EXPENSE_SELECT} FROM expenses WHERE expense_id = ?", (expense_id,))
+        updated = cur.fetchone()
+        move_expense(cur, user_id, exp, updated)
+        bump_data_version(cur, user_id)
+        return updated
+
+    return expense_json(await run_db(_update))
 
 @router.delete("/{expense_id}", status_code=204)
 async def delete_expense(expense_id: str, user=Depends(get_current_user)):
     """Delete an expense"""
     user_id = user["user_id"]
-    with get_db() as conn:
+
+    def _delete(conn):
         cur = conn.cursor()
-        cur.execute("SELECT user_id FROM expenses WHERE expense_id = ?", (expense_id,))
+        # Only the delete that actually removed the row takes it out of the
+        # rollup; a concurrent delete of the same expense gets 404
+        cur.execute("""
+            DELETE FROM expenses WHERE expense_id = ? AND user_id = ?
+            RETURNING amount, category, date
+        """, (expense_id, user_id))
         exp = cur.fetchone()
-        if not exp: raise HTTPException(404, "Expense not found")
-        if exp["user_id"] != user_id: raise HTTPException(403, "Access denied")
-        cur.execute("DELETE FROM expenses WHERE expense_id = ?", (expense_id,))
+        if not exp:
+            cur.execute("SELECT 1 FROM expenses WHERE expense_id = ?", (expense_id,))
+            if cur.fetchone(): raise HTTPException(403, "Access denied")
+            raise HTTPException(404, "Expense not found")
+        apply_expense_delta(cur, user_id, exp["category"], exp["date"], -exp["amount"], -1)
+        bump_data_version(cur, user_id)
+
+    await run_db(_delete)
 
 # ─── SUMMARY ENDPOINTS ──────────────────────────────────────────────────
+# Read from the daily rollup over a half-open day range, so the cost is one
+# primary-key range scan over days × categories whatever the expense count;
+# totals are folded from the per-category rows.
+MONTH_BREAKDOWN_SQL = """
+    SELECT category, SUM(count) AS cnt, SUM(total) AS t
+    FROM daily_category_totals
+    WHERE user_id = ? AND day >= ? AND day < ?
+    GROUP BY category
+"""
+
+async def month_breakdown(user_id: str, year: int, month: int):
+    start, end = month_range(year, month)
+    rows = await fetch_all(MONTH_BREAKDOWN_SQL, (user_id, start.isoformat(), end.isoformat()))
+    count = sum(r["cnt"] for r in rows)
+    total = sum(r["t"] for r in rows)
+    breakdown = {r["category"]: round(r["t"], 2) for r in rows}
+    return count, total, breakdown
+
 @router.get("/summary/monthly")
-async def monthly_summary(month: int, year: int, user=Depends(get_current_user)):
+async def monthly_summary(month: int, year: int, request: Request, response: Response,
+                          user=Depends(get_current_user)):
     if month < 1 or month > 12: raise HTTPException(400, "Month must be 1-12")
-    user_id = user["user_id"]
-    with get_db() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT COUNT(*) as cnt, COALESCE(SUM(amount),0) as total, COALESCE(AVG(amount),0) as avg
-            FROM expenses WHERE user_id=? AND strftime('%m',date)=? AND strftime('%Y',date)=?
-        """, (user_id, f"{month:02d}", str(year)))
-        row = cur.fetchone()
-        cur.execute("""
-            SELECT category, SUM(amount) as t FROM expenses
-            WHERE user_id=? AND strftime('%m',date)=? AND strftime('%Y',date)=?
-            GROUP BY category
-        """, (user_id, f"{month:02d}", str(year)))
-        breakdown = {r["category"]: round(r["t"], 2) for r in cur.fetchall()}
+    _, etag, not_modified = await check_not_modified(request, user["user_id"])
+    if not_modified:
+        return not_modified
+    response.headers.update(etag_headers(etag))
+    count, total, breakdown = await month_breakdown(user["user_id"], year, month)
+    return monthly_summary_body(month, year, count, total, breakdown)
+
+def monthly_summary_body(month: int, year: int, count: int, total: float, breakdown: dict) -> dict:
     return {
         "month": month, "year": year,
-        "total_expenses": round(row["total"], 2),
-        "expense_count":  row["cnt"],
+        "total_expenses": round(total, 2),
+        "expense_count":  count,
         "category_breakdown": breakdown,
-        "average_expense": round(row["avg"], 2)
+        "average_expense": round(total / count, 2) if count else 0
     }
 @router.get("/summary/category")
-async def category_summary(user=Depends(get_current_user)):
-    user_id = user["user_id"]
-
+async def category_summary(request: Request, response: Response, user=Depends(get_current_user)):
+    _, etag, not_modified = await check_not_modified(request, user["user_id"])
+    if not_modified:
+        return not_modified
+    response.headers.update(etag_headers(etag))
     today = datetime.today()
-    month = f"{today.month:02d}"
-    year = str(today.year)
-
-    with get_db() as conn:
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT COALESCE(SUM(amount),0) as t
-            FROM expenses
-            WHERE user_id=? 
-            AND strftime('%m',date)=?
-            AND strftime('%Y',date)=?
-        """, (user_id, month, year))
-
-        total = cur.fetchone()["t"]
-
-        cur.execute("""
-            SELECT category, SUM(amount) as t
-            FROM expenses
-            WHERE user_id=? 
-            AND strftime('%m',date)=?
-            AND strftime('%Y',date)=?
-            GROUP BY category
-        """, (user_id, month, year))
-
-        rows = cur.fetchall()
-
-    breakdown = {r["category"]: round(r["t"], 2) for r in rows}
+    _, total, breakdown = await month_breakdown(user["user_id"], today.year, today.month)
     pcts = {k: round(v / total * 100, 2) if total else 0 for k, v in breakdown.items()}
 
     return {
@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import TypeAdapter
 from typing import List
 from datetime import date, timedelta
-from collections import defaultdict
-import statistics
+import os
+
+import numpy as np
 
 from model.prediction_schema import WeeklyForecast, ExpensePrediction
 from model.expense_schema import SpendingPattern
-from db.database_utilities import get_db
-from utils.helpers import row_to_dict, verify_user_exists
-from ml.algorithms import predict_next_week_expenses, calculate_confidence, calculate_trend, calculate_volatility
+from db.database_utilities import fetch_all, run_db
+from db.model_state import load_model_state
+from ml.algorithms import daily_trend, daily_volatility
+from ml.online import forecast_from_state
+from ml.timeseries import DAILY_SERIES_SQL, daily_matrix, trim_leading_empty_days
+from utils.cache import TTLCache
+from utils.fastjson import json_bytes_response
+from utils.helpers import seconds_until_midnight, check_not_modified, etag_headers
 from api.auth import get_current_user  # JWT helper
 
 router = APIRouter(
@@ -16,129 +23,150 @@ router = APIRouter(
     tags=["Predictions"]
 )
 
+PATTERN_LOOKBACK_DAYS = 60
+MIN_FORECAST_DAYS = 7
+NOT_ENOUGH_HISTORY = "Not enough historical data for prediction. Add at least 7 days of expenses."
+
+# ─── FORECAST CACHE ──────────────────────────────────────────────────
+# Results are keyed by (kind, user, data version, day): any expense write
+# bumps the version, and the day is part of the key because the lookback
+# windows move with date.today(). Entries also expire at local midnight.
+# The cache holds the encoded response body, so a hit is served as bytes
+# without building or validating any models.
+_forecast_cache = TTLCache(
+    maxsize=int(os.environ.get("FORECAST_CACHE_SIZE", "4096")),
+    max_weight=int(os.environ.get("FORECAST_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    weigher=len,
+)
+_weekly_forecast_json = TypeAdapter(WeeklyForecast)
+_patterns_json = TypeAdapter(List[SpendingPattern])
+
+def forecast_cache_stats() -> dict:
+    return _forecast_cache.stats()
+
+async def cached_forecast(kind: str, request: Request, user_id: str, compute, adapter: TypeAdapter):
+    """
+    Respond with compute(user_id, today), from cache unless the user's data
+    changed; 304 when If-None-Match still matches the user's data version.
+    """
+    version, etag, not_modified = await check_not_modified(request, user_id)
+    if not_modified:
+        return not_modified
+    today = date.today()
+    key = (kind, user_id, version, today)
+    body = _forecast_cache.get(key)
+    if body is None:
+        body = adapter.dump_json(await compute(user_id, today))
+        _forecast_cache.set(key, body, ttl=seconds_until_midnight())
+    return json_bytes_response(body, headers=etag_headers(etag))
+
+async def load_daily_series(user_id: str, start: date, end: date):
+    """Dense category × day spend matrix for [start, end], read from the rollup"""
+    rows = await fetch_all(DAILY_SERIES_SQL, (user_id, str(start), str(end)))
+    return daily_matrix(rows, start, end)
+
 # ==================== ML PREDICTION ENDPOINTS ====================
 
 @router.get("/next-week", response_model=WeeklyForecast)
-async def predict_next_week(current_user: dict = Depends(get_current_user)):
+async def predict_next_week(request: Request, current_user: dict = Depends(get_current_user)):
     """
     🤖 ML: Predict next week's expenses using Linear Regression, Moving Average & Exponential Smoothing
+    Models run on each category's daily spend over the last 90 days, from
+    model state kept current by the expense write path.
     User is identified via JWT.
     """
-    user_id = current_user["user_id"]
-    verify_user_exists(user_id)
-
-    with get_db() as conn:
-        cursor = conn.cursor()
-
-        # Get last 90 days of expenses
-        lookback_date = date.today() - timedelta(days=90)
-        cursor.execute("""
-            SELECT category, amount, date
-            FROM expenses
-            WHERE user_id = ?
-            AND date >= ?
-            ORDER BY date
-        """, (user_id, lookback_date))
-
-        historical_expenses = [row_to_dict(row) for row in cursor.fetchall()]
-
-        if len(historical_expenses) < 7:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Not enough historical data for prediction. Add at least 7 days of expenses."
-            )
-
-        # Get last week's actual expenses
-        last_week_start = date.today() - timedelta(days=7)
-        cursor.execute("""
-            SELECT category, SUM(amount) as total
-            FROM expenses
-            WHERE user_id = ?
-            AND date >= ?
-            GROUP BY category
-        """, (user_id, last_week_start))
-        last_week_data = {row["category"]: row["total"] for row in cursor.fetchall()}
-
-        # Predict next week's expenses
-        predictions_dict = predict_next_week_expenses(historical_expenses)
-
-        # Build category predictions
-        category_predictions = []
-        total_predicted = 0.0
-        category_history = defaultdict(list)
-        for exp in historical_expenses:
-            category_history[exp['category']].append(exp['amount'])
-
-        for category, predicted_amount in predictions_dict.items():
-            historical_amounts = category_history[category]
-            category_pred = ExpensePrediction(
-                category=category,
-                predicted_amount=round(predicted_amount, 2),
-                confidence=calculate_confidence(historical_amounts),
-                trend=calculate_trend(historical_amounts),
-                historical_average=round(statistics.mean(historical_amounts), 2) if historical_amounts else 0.0,
-                last_week_actual=round(last_week_data.get(category, 0.0), 2)
-            )
-            category_predictions.append(category_pred)
-            total_predicted += predicted_amount
-            
-        # Forecast period
-        start_date = date.today() + timedelta(days=1)
-        end_date = start_date + timedelta(days=6)
-
-        return WeeklyForecast(
-            start_date=start_date,
-            end_date=end_date,
-            total_predicted=round(total_predicted, 2),
-            category_predictions=category_predictions,
-            recommendations=[]  
-
-        )
+    return await cached_forecast("next-week", request, current_user["user_id"], compute_next_week, _weekly_forecast_json)
+
+
+async def compute_next_week(user_id: str, today: date) -> WeeklyForecast:
+    state = await run_db(lambda conn: load_model_state(conn.cursor(), user_id, today))
+
+    if state is None or state["active_days"] < MIN_FORECAST_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=NOT_ENOUGH_HISTORY)
+
+    n = state["n"]
+    categories = [row["category"] for row in state["categories"]]
+    sum_y, sum_xy, sum_yy, level = (np.array([row[i] for row in state["categories"]], dtype=np.float64)
+                                    for i in range(1, 5))
+    # Last 8 days (date >= today - 7) plus the window's first day, per category
+    index = {c: i for i, c in enumerate(categories)}
+    recent = np.zeros((len(categories), 8))
+    first = np.zeros(len(categories))
+    for category, day, total in state["recent"]:
+        if category in index:
+            offset = (date.fromisoformat(day) - today).days
+            if offset >= -7:
+                recent[index[category], 7 + offset] = total
+            if day == str(state["start"]):
+                first[index[category]] = total
+
+    predicted, confidence, trends = forecast_from_state(n, sum_y, sum_xy, sum_yy, level, first, recent)
+    return build_weekly_forecast(today, categories, predicted, confidence, trends,
+                                 weekly_average=sum_y / n * 7, last_week=recent.sum(axis=1))
+
+
+def build_weekly_forecast(today, categories, predicted, confidence, trends, weekly_average, last_week) -> WeeklyForecast:
+    """Assemble the response from per-category model outputs (shared with batch_forecasts.py)"""
+    category_predictions = []
+    for i, category in enumerate(categories):
+        category_predictions.append(ExpensePrediction(
+            category=category,
+            predicted_amount=round(predicted[i], 2),
+            confidence=confidence[i],
+            trend=trends[i],
+            historical_average=round(float(weekly_average[i]), 2),
+            last_week_actual=round(float(last_week[i]), 2)
+        ))
+
+    # Forecast period
+    start_date = today + timedelta(days=1)
+    end_date = start_date + timedelta(days=6)
+
+    return WeeklyForecast(
+        start_date=start_date,
+        end_date=end_date,
+        total_predicted=round(sum(predicted), 2),
+        category_predictions=category_predictions,
+        recommendations=[]
+    )
 
 
 @router.get("/patterns", response_model=List[SpendingPattern])
-async def analyze_spending_patterns(current_user: dict = Depends(get_current_user)):
+async def analyze_spending_patterns(request: Request, current_user: dict = Depends(get_current_user)):
     """
     📊 ML: Analyze spending patterns with trend detection & volatility analysis
+    on each category's daily spend over the last 60 days
     """
-    user_id = current_user["user_id"]
-    verify_user_exists(user_id)
-
-    with get_db() as conn:
-        cursor = conn.cursor()
-
-        lookback_date = date.today() - timedelta(days=60)
-        cursor.execute("""
-            SELECT category, amount, date
-            FROM expenses
-            WHERE user_id = ?
-            AND date >= ?
-            ORDER BY date
-        """, (user_id, lookback_date))
-
-        expenses = [row_to_dict(row) for row in cursor.fetchall()]
-
-        if not expenses:
-            return []
-
-        # Group by category
-        category_data = defaultdict(list)
-        for exp in expenses:
-            category_data[exp['category']].append(exp['amount'])
-
-        patterns = []
-        for category, amounts in category_data.items():
-            total = sum(amounts)
-            days_tracked = (date.today() - lookback_date).days
-
-            pattern = SpendingPattern(
-                category=category,
-                average_daily=round(total / days_tracked, 2),
-                average_weekly=round(total / (days_tracked / 7), 2),
-                average_monthly=round(total / (days_tracked / 30), 2),
-                trend_direction=calculate_trend(amounts),
-                volatility=calculate_volatility(amounts)
-            )
-            patterns.append(pattern)
-
-        return patterns
+    return await cached_forecast("patterns", request, current_user["user_id"], compute_patterns, _patterns_json)
+
+
+async def compute_patterns(user_id: str, today: date) -> List[SpendingPattern]:
+    lookback_date = today - timedelta(days=PATTERN_LOOKBACK_DAYS)
+
+    categories, daily = await load_daily_series(user_id, lookback_date, today)
+    return patterns_from_series(categories, daily, (today - lookback_date).days)
+
+
+def patterns_from_series(categories, daily, days_tracked: int) -> List[SpendingPattern]:
+    """Patterns from a category × day matrix covering days_tracked + 1 days (shared with /dashboard)"""
+    if not categories:
+        return []
+
+    totals = daily.sum(axis=1)
+    daily = trim_leading_empty_days(daily)
+    trends = daily_trend(daily)
+    volatility = daily_volatility(daily)
+
+    patterns = []
+    for i, category in enumerate(categories):
+        total = float(totals[i])
+        patterns.append(SpendingPattern(
+            category=category,
+            average_daily=round(total / days_tracked, 2),
+            average_weekly=round(total / (days_tracked / 7), 2),
+            average_monthly=round(total / (days_tracked / 30), 2),
+            trend_direction=trends[i],
+            volatility=volatility[i]
+        ))
+
+    return patterns
@@ -1,8 +1,9 @@
 from fastapi import FastAPI, HTTPException, status,Depends
 from typing import List, Optional
 from model.user_schema import UserResponse, UserCreate
-from db.database_utilities import get_db    
+from db.database_utilities import run_db, fetch_one
 from utils.helpers import row_to_dict
+from utils.passwords import hash_password_async
 import uuid
 from datetime import datetime   
 
@@ -21,8 +22,9 @@ from api.auth import get_current_user   # ← pulls user_id from Bearer token
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register_user(user: UserCreate):
     """Register a new user"""
-    
-    with get_db() as conn:
+    password_hash = await hash_password_async(user.password)
+
+    def _register(conn):
         cursor = conn.cursor()
         
         # Check if username already exists
@@ -48,7 +50,7 @@ async def register_user(user: UserCreate):
         cursor.execute("""
             INSERT INTO users (user_id, username, email, password, full_name, created_at)
             VALUES (?, ?, ?, ?, ?, ?)
-        """, (user_id, user.username, user.email, user.password, user.full_name, created_at))
+        """, (user_id, user.username, user.email, password_hash, user.full_name, created_at))
         
         return UserResponse(
             user_id=user_id,
@@ -58,21 +60,20 @@ async def register_user(user: UserCreate):
             created_at=created_at
         )
 
+    return await run_db(_register)
+
 @router.get("/users/{username}", response_model=UserResponse)
 async def get_user(username: str):
     """Get user information by username"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT user_id, username, email, full_name, created_at FROM users WHERE username = ?",
-            (username,)
+    user = await fetch_one(
+        "SELECT user_id, username, email, full_name, created_at FROM users WHERE username = ?",
+        (username,)
+    )
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
         )
-        user = cursor.fetchone()
-        
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        return UserResponse(**row_to_dict(user))
+    
+    return UserResponse(**row_to_dict(user))
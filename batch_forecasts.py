@@ -0,0 +1,238 @@
+"""
+batch_forecasts.py
+Nightly job: precompute every user's next-week forecast and budget alerts into
+the forecasts table, so notification and email jobs never call the live API.
+
+    python batch_forecasts.py [--date YYYY-MM-DD] [--workers N] [--chunk-size 500] [--restart]
+
+Users are read in user_id order, a chunk at a time, together with their last
+90 days from the daily rollup and their budgets (from each user's shard when
+DB_SHARDS is set). Chunks are scored on a process pool (one vectorized pass
+per chunk) and written back in order, before the job checkpoint moves past
+them, so an interrupted run picks up after the last chunk it wrote.
+"""
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from api.budgets import MOVING_AVERAGE_WINDOW, month_days_remaining, build_budget_alert
+from api.predictions import build_weekly_forecast
+from db.database_utilities import get_db, init_database, group_by_shard, DATABASE_NAME
+from db.model_state import MODEL_LOOKBACK_DAYS, window_start
+from ml.vectorized import batch_forecast_total, batch_confidence, batch_trend
+
+JOB_NAME = "forecasts"
+DEFAULT_CHUNK_SIZE = 500
+MIN_ACTIVE_DAYS = 7
+
+
+# ==================== READING ====================
+def load_chunk(after: str, size: int, today: date) -> list:
+    """Next `size` users after `after` as (user_id, first_day, rollup rows, budgets)"""
+    with get_db() as conn:
+        ids = [row[0] for row in conn.execute(
+            "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?", (after, size))]
+    data = {}
+    for database, group in group_by_shard(ids).items():
+        with get_db(database) as conn:
+            data.update(load_user_data(conn.cursor(), group, today))
+    return [(user_id, *data[user_id]) for user_id in ids]
+
+
+def load_user_data(cursor, ids: list, today: date) -> dict:
+    """
+    {user_id: (first_day, rollup rows, budgets)} for users stored in this database.
+    first_day comes from a per-user MIN(day) seek, not a history scan.
+    """
+    marks = ",".join("?" * len(ids))
+    cursor.execute(f"""
+        SELECT u.column1,
+               (SELECT MIN(d.day) FROM daily_category_totals d WHERE d.user_id = u.column1) AS first_day
+        FROM (VALUES {",".join(["(?)"] * len(ids))}) u
+    """, ids)
+    users = cursor.fetchall()
+
+    rows = {user_id: [] for user_id in ids}
+    cursor.execute(f"""
+        SELECT user_id, category, day, total FROM daily_category_totals
+        WHERE user_id IN ({marks}) AND day >= ? AND day <= ?
+    """, (*ids, str(today - timedelta(days=MODEL_LOOKBACK_DAYS)), str(today)))
+    for user_id, category, day, total in cursor:
+        rows[user_id].append((category, day, total))
+
+    budgets = {user_id: [] for user_id in ids}
+    cursor.execute(f"SELECT user_id, category, monthly_limit FROM budgets WHERE user_id IN ({marks})", ids)
+    for user_id, category, limit in cursor:
+        budgets[user_id].append((category, limit))
+
+    return {user_id: (first_day, rows[user_id], budgets[user_id]) for user_id, first_day in users}
+
+
+# ==================== SCORING (worker processes) ====================
+def score_chunk(today: date, users: list) -> list:
+    """
+    Forecast + alerts for a chunk of users. Every category of every user becomes
+    one left-aligned row of a single matrix, so the models run once per chunk.
+    Returns (user_id, total_predicted, forecast JSON, alerts JSON) per user.
+    """
+    month_start = today.replace(day=1)
+    trailing_start = today - timedelta(days=MOVING_AVERAGE_WINDOW - 1)
+    last_week_start = today - timedelta(days=7)
+    days_remaining = month_days_remaining(today)
+
+    values = np.zeros((sum(len({r[0] for r in rows}) for _, _, rows, _ in users), MODEL_LOOKBACK_DAYS + 1))
+    lengths = np.zeros(len(values), dtype=np.int64)
+    plans = []
+    row = 0
+    for user_id, first_day, rows, budgets in users:
+        start = window_start(date.fromisoformat(first_day), today) if first_day else today
+        n = max((today - start).days + 1, 0)
+        categories = sorted({r[0] for r in rows})
+        index = {c: row + i for i, c in enumerate(categories)}
+        month_to_date, trailing, last_week = {}, {}, {}
+        for category, day, total in rows:
+            d = date.fromisoformat(day)
+            values[index[category], (d - start).days] = total
+            if d >= month_start:
+                month_to_date[category] = month_to_date.get(category, 0.0) + total
+            if d >= trailing_start:
+                trailing[category] = trailing.get(category, 0.0) + total
+            if d >= last_week_start:
+                last_week[category] = last_week.get(category, 0.0) + total
+        lengths[row:row + len(categories)] = n
+        alerts = [
+            build_budget_alert(category, limit, month_to_date.get(category, 0.0),
+                               trailing.get(category, 0.0) / MOVING_AVERAGE_WINDOW, days_remaining)
+            for category, limit in budgets
+        ]
+        active = len({r[1] for r in rows})
+        plans.append((user_id, slice(row, row + len(categories)), categories, n, active, last_week, alerts))
+        row += len(categories)
+
+    predicted = batch_forecast_total(values, lengths, horizon=7).tolist()
+    confidence = batch_confidence(values, lengths).tolist()
+    trends = batch_trend(values, lengths)
+    weekly_average = (values.sum(axis=1) / np.maximum(lengths, 1) * 7).tolist()
+
+    results = []
+    for user_id, rows, categories, n, active, last_week, alerts in plans:
+        forecast = None
+        if active >= MIN_ACTIVE_DAYS:
+            forecast = build_weekly_forecast(
+                today, categories, predicted[rows], confidence[rows], trends[rows],
+                weekly_average=weekly_average[rows], last_week=[last_week.get(c, 0.0) for c in categories],
+            )
+        results.append((
+            user_id,
+            forecast.total_predicted if forecast else None,
+            forecast.model_dump_json() if forecast else None,
+            json.dumps([alert.model_dump() for alert in alerts]),
+        ))
+    return results
+
+
+# ==================== WRITING ====================
+def write_results(today: date, results: list, last_key: str, processed: int):
+    """
+    Forecasts go to each user's shard, then the checkpoint to the main file.
+    Unsharded, both share one transaction; sharded, a crash in between only
+    means the chunk is rewritten (INSERT OR REPLACE) on the next run.
+    """
+    now = datetime.now()
+    by_user = {result[0]: result for result in results}
+    with get_db() as main:
+        for database, group in group_by_shard(by_user).items():
+            with get_db(database) as conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO forecasts (run_date, user_id, total_predicted, forecast, alerts, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [(str(today), *by_user[user_id][:4], now) for user_id in group])
+        write_checkpoint(main.cursor(), today, last_key, processed, now)
+
+
+def write_checkpoint(cursor, today: date, last_key: str, processed: int, now: datetime):
+    cursor.execute("""
+        INSERT INTO job_checkpoints (job, run_date, last_key, processed, updated_at) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (job, run_date) DO UPDATE SET
+            last_key = excluded.last_key, processed = excluded.processed, updated_at = excluded.updated_at
+    """, (JOB_NAME, str(today), last_key, processed, now))
+
+
+def run_batch(today: date, workers: int = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              restart: bool = False, max_chunks: int = None, report=print) -> dict:
+    """Score every user not yet done for `today`; returns counts and throughput"""
+    workers = workers or os.cpu_count() or 1
+    init_database()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if restart:
+            cursor.execute("DELETE FROM job_checkpoints WHERE job = ? AND run_date = ?", (JOB_NAME, str(today)))
+        cursor.execute("SELECT last_key, processed FROM job_checkpoints WHERE job = ? AND run_date = ?",
+                       (JOB_NAME, str(today)))
+        checkpoint = cursor.fetchone()
+    after, processed = (checkpoint["last_key"], checkpoint["processed"]) if checkpoint else ("", 0)
+    if checkpoint:
+        report(f"Resuming {today} after {processed} users")
+
+    started = time.perf_counter()
+    scored = submitted = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        exhausted = False
+        while True:
+            # Keep every worker busy with one chunk queued behind it
+            while not exhausted and len(in_flight) < workers * 2:
+                if max_chunks is not None and submitted >= max_chunks:
+                    exhausted = True
+                    break
+                chunk = load_chunk(after, chunk_size, today)
+                if not chunk:
+                    exhausted = True
+                    break
+                after = chunk[-1][0]
+                in_flight.append((after, len(chunk), pool.submit(score_chunk, today, chunk)))
+                submitted += 1
+            if not in_flight:
+                break
+
+            # Write in submission order so the checkpoint only ever moves forward
+            last_key, size, future = in_flight.popleft()
+            results = future.result()
+            processed += size
+            scored += size
+            write_results(today, results, last_key, processed)
+            elapsed = time.perf_counter() - started
+            report(f"{processed:>9,} users  {scored / elapsed:>9,.0f} users/s")
+
+    elapsed = time.perf_counter() - started
+    return {
+        "run_date": str(today),
+        "processed": processed,
+        "scored_this_run": scored,
+        "seconds": round(elapsed, 3),
+        "users_per_second": round(scored / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute next-week forecasts and budget alerts for all users")
+    parser.add_argument("--date", type=date.fromisoformat, default=date.today(), help="run date (default: today)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="users per chunk")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint for this date")
+    args = parser.parse_args()
+
+    print(f"📁 Database: {DATABASE_NAME}")
+    summary = run_batch(args.date, args.workers, args.chunk_size, args.restart)
+    print(f"✅ {summary['scored_this_run']:,} users in {summary['seconds']}s "
+          f"({summary['users_per_second']:,} users/s); {summary['processed']:,} done for {summary['run_date']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+API load benchmark: the real app, in-process, against a synthetic database
+
+Seeds a temp SQLite file with --users users, --rows expenses spread over the
+last --days days (1k to 10M rows) and a few budgets per user, then drives
+main_ml.app through httpx's ASGI transport with --concurrency concurrent
+clients. Each request picks a random scenario and a random user:
+
+  expenses          GET /expenses?limit=50
+  monthly_summary   GET /expenses/summary/monthly
+  category_summary  GET /expenses/summary/category
+  budget_alerts     GET /budgets/alerts
+  next_week         GET /predictions/next-week
+  patterns          GET /predictions/patterns
+  add_expense       POST /expenses                (only with --scenarios)
+
+Reports req/s and p50/p95/p99 latency per scenario. --json writes the same
+numbers (plus the config and git commit) for comparison across commits;
+--compare prints the change against an earlier --json file.
+
+Run from the repo root:
+  python -m benchmarks.bench_api --rows 100000 --users 200 --json after.json --compare before.json
+Reuse a seeded file between runs with --db PATH (seeded only if empty).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import httpx
+
+SCENARIOS = {
+    "expenses": lambda today: ("GET", "/expenses", {"limit": 50}, None),
+    "monthly_summary": lambda today: ("GET", "/expenses/summary/monthly", {"month": today.month, "year": today.year}, None),
+    "category_summary": lambda today: ("GET", "/expenses/summary/category", None, None),
+    "budget_alerts": lambda today: ("GET", "/budgets/alerts", None, None),
+    "next_week": lambda today: ("GET", "/predictions/next-week", None, None),
+    "patterns": lambda today: ("GET", "/predictions/patterns", None, None),
+    "add_expense": lambda today: ("POST", "/expenses", None, {
+        "amount": 12.5, "category": "food", "description": "bench", "date": str(today)}),
+}
+DEFAULT_SCENARIOS = "expenses,monthly_summary,category_summary,budget_alerts,next_week,patterns"
+SEED_CHUNK = 50_000
+
+
+def print_section(title):
+    print("\n" + "=" * 70)
+    print(f"  {title}")
+    print("=" * 70)
+
+
+# ==================== SEEDING ====================
+def seed(path: str, users: int, rows: int, days: int, seed_value: int) -> list:
+    """Fill an empty database; returns [(user_id, username)]"""
+    import sqlite3
+    from utils.passwords import hash_password
+    from db import database_utilities
+    from db.database_utilities import init_database
+    from db.rollups import rebuild_daily_totals
+    from db.shards import rebalance
+    from db.row_counts import recount_rows
+    from model.expense_schema import ExpenseCategory
+    from utils.helpers import uuid4_strings
+
+    init_database()
+    conn = sqlite3.connect(path)
+    existing = conn.execute("SELECT user_id, username FROM users ORDER BY username").fetchall()
+    if existing:
+        conn.close()
+        print(f"Reusing {len(existing):,} users in {path}")
+        return existing
+
+    rng = random.Random(seed_value)
+    categories = [c.value for c in ExpenseCategory]
+    now = datetime.now()
+    today = date.today()
+    password = hash_password("bench-password")
+    accounts = [(user_id, f"bench{i:07d}") for i, user_id in enumerate(uuid4_strings(users))]
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?, NULL, ?)",
+                     [(u, name, f"{name}@example.com", password, now) for u, name in accounts])
+    conn.executemany("INSERT INTO budgets VALUES (?, ?, ?, ?, ?)", [
+        (budget_id, u, category, float(rng.randrange(200, 1500, 50)), now)
+        for u, _ in accounts
+        for budget_id, category in zip(uuid4_strings(3), rng.sample(categories, 3))
+    ])
+
+    # Users get a skewed share of the rows, like real traffic
+    weights = [rng.paretovariate(1.5) for _ in accounts]
+    user_ids = [u for u, _ in accounts]
+    written = 0
+    while written < rows:
+        n = min(SEED_CHUNK, rows - written)
+        owners = rng.choices(user_ids, weights, k=n)
+        batch = sorted(
+            (expense_id, owner, round(rng.lognormvariate(3, 0.8), 2), rng.choice(categories), "bench",
+             str(today - timedelta(days=rng.randrange(days))), now, now)
+            for expense_id, owner in zip(uuid4_strings(n), owners)
+        )
+        conn.executemany("INSERT INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        written += n
+        print(f"  seeded {written:>11,} / {rows:,} expenses", end="\r")
+    print()
+    cursor = conn.cursor()
+    rebuild_daily_totals(cursor)
+    recount_rows(cursor)
+    conn.commit()
+    conn.close()
+    if database_utilities.SHARDS:
+        # Seeded into the main file; move each user's rows to their shard
+        rebalance(report=print)
+    return accounts
+
+
+# ==================== WORKLOAD ====================
+async def run_workload(app, tokens: list, scenarios: list, requests: int, concurrency: int, seed_value: int):
+    rng = random.Random(seed_value)
+    today = date.today()
+    plan = [(rng.choice(scenarios), rng.choice(tokens)) for _ in range(requests)]
+    latencies = {name: [] for name in scenarios}
+    errors = {name: 0 for name in scenarios}
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        pending = iter(plan)
+
+        async def worker():
+            for name, token in pending:
+                method, path, params, body = SCENARIOS[name](today)
+                started = time.perf_counter()
+                response = await client.request(method, path, params=params, json=body,
+                                                headers={"Authorization": f"Bearer {token}"})
+                elapsed = time.perf_counter() - started
+                # 400 is a valid answer (e.g. too little history to forecast)
+                if response.status_code not in (200, 201, 400):
+                    errors[name] += 1
+                latencies[name].append(elapsed)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return elapsed, latencies, errors
+
+
+def pct(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+def summarize(values, elapsed, errors=0) -> dict:
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "req_per_s": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.mean(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(pct(values, 0.50), 3),
+        "p95_ms": round(pct(values, 0.95), 3),
+        "p99_ms": round(pct(values, 0.99), 3),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: dict, baseline: dict = None):
+    base = (baseline or {}).get("scenarios", {})
+    print(f"{'scenario':<18}{'n':>7}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err':>6}")
+    for name, r in list(results["scenarios"].items()) + [("TOTAL", results["total"])]:
+        line = (f"{name:<18}{r['requests']:>7}{r['req_per_s']:>10.1f}{r['p50_ms']:>10.2f}"
+                f"{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['errors']:>6}")
+        old = base.get(name) if name != "TOTAL" else (baseline or {}).get("total")
+        if old and old.get("p50_ms"):
+            line += f"   p50 {r['p50_ms'] / old['p50_ms'] - 1:+.0%}  p99 {r['p99_ms'] / old['p99_ms'] - 1:+.0%}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="expenses to generate (1k to 10M)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365, help="expenses are spread over the last N days")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200, help="requests run before measuring")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS, help=f"comma list of {', '.join(SCENARIOS)}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="database file to seed or reuse (default: a temp file)")
+    parser.add_argument("--json", help="write results to this file ('-' for stdout)")
+    parser.add_argument("--compare", help="earlier --json results to compare against")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    # The app reads its database path at import time
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_api.db")
+    os.environ["EXPENSE_TRACKER_DB"] = path
+
+    print_section("SEEDING")
+    started = time.perf_counter()
+    accounts = seed(path, args.users, args.rows, args.days, args.seed)
+    seed_seconds = time.perf_counter() - started
+    print(f"{path}: {len(accounts):,} users, {args.rows:,} expenses in {seed_seconds:.1f}s")
+
+    from api.auth import create_token
+    from main_ml import app
+    tokens = [create_token(user_id, username) for user_id, username in accounts]
+
+    print_section("WORKLOAD")
+    print(f"requests={args.requests} warmup={args.warmup} concurrency={args.concurrency} scenarios={','.join(scenarios)}")
+    if args.warmup:
+        asyncio.run(run_workload(app, tokens, scenarios, args.warmup, args.concurrency, args.seed + 1))
+    elapsed, latencies, errors = asyncio.run(
+        run_workload(app, tokens, scenarios, args.requests, args.concurrency, args.seed))
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {k: getattr(args, k) for k in ("rows", "users", "days", "requests", "warmup", "concurrency", "seed")}
+                  | {"scenarios": scenarios},
+        "seed_seconds": round(seed_seconds, 2),
+        "elapsed_seconds": round(elapsed, 3),
+        "scenarios": {name: summarize(latencies[name], elapsed, errors[name]) for name in scenarios},
+        "total": summarize([v for name in scenarios for v in latencies[name]], elapsed, sum(errors.values())),
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"compared with {baseline.get('commit', '?')} ({args.compare})")
+    print_results(results, baseline)
+
+    if args.json == "-":
+        print(json.dumps(results, indent=2))
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nwrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
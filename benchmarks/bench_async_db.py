@@ -0,0 +1,113 @@
+"""
+Concurrency benchmark: blocking vs executor-backed queries in async handlers
+
+Builds a throwaway app with a slow endpoint (a CPU-heavy query, standing in
+for a 90-day prediction scan) and a fast endpoint (a primary-key lookup),
+then fires a mixed workload at it in-process through httpx's ASGI transport.
+
+  before: the slow query runs inline in the async handler (old behaviour)
+  after:  the slow query is awaited through db.database_utilities.run_db
+
+Run from the repo root:  python -m benchmarks.bench_async_db
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+SLOW_SQL = """
+    WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < ?)
+    SELECT SUM(x) AS total FROM c
+"""
+FAST_SQL = "SELECT 1 AS ok"
+
+
+def print_section(title):
+    print("\n" + "=" * 70)
+    print(f"  {title}")
+    print("=" * 70)
+
+
+def build_app(slow_rows: int) -> FastAPI:
+    from db.database_utilities import get_db, fetch_one
+
+    app = FastAPI()
+
+    @app.get("/before/slow")
+    async def before_slow():
+        with get_db() as conn:
+            return {"total": conn.execute(SLOW_SQL, (slow_rows,)).fetchone()["total"]}
+
+    @app.get("/after/slow")
+    async def after_slow():
+        return {"total": (await fetch_one(SLOW_SQL, (slow_rows,)))["total"]}
+
+    @app.get("/fast")
+    async def fast():
+        return {"ok": (await fetch_one(FAST_SQL))["ok"]}
+
+    return app
+
+
+async def run_workload(app, mode: str, requests: int, concurrency: int, slow_ratio: float):
+    transport = httpx.ASGITransport(app=app)
+    slow_every = max(1, round(1 / slow_ratio)) if slow_ratio > 0 else 0
+    latencies = {"slow": [], "fast": []}
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait("slow" if slow_every and i % slow_every == 0 else "fast")
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            while not queue.empty():
+                kind = queue.get_nowait()
+                path = f"/{mode}/slow" if kind == "slow" else "/fast"
+                started = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies[kind].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return elapsed, latencies
+
+
+def pct(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--slow-ratio", type=float, default=0.1)
+    parser.add_argument("--slow-rows", type=int, default=300_000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("EXPENSE_TRACKER_DB", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    app = build_app(args.slow_rows)
+
+    print_section("MIXED SLOW/FAST WORKLOAD")
+    print(f"requests={args.requests} concurrency={args.concurrency} slow_ratio={args.slow_ratio}")
+    for mode in ("before", "after"):
+        elapsed, lat = asyncio.run(run_workload(app, mode, args.requests, args.concurrency, args.slow_ratio))
+        print(f"\n{mode.upper()}: {args.requests / elapsed:8.1f} req/s  ({elapsed:.2f}s)")
+        for kind in ("fast", "slow"):
+            values = lat[kind]
+            if values:
+                print(f"  {kind:4}  n={len(values):4}  mean={statistics.mean(values) * 1000:8.2f}ms"
+                      f"  p50={pct(values, 0.5):8.2f}ms  p99={pct(values, 0.99):8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Budget endpoint benchmark: per-budget queries (N+1) vs one grouped query
+
+Seeds a temp database with one user who has a budget in every category and
+a configurable number of expenses, then times the old /budgets/alerts data
+access (a SUM plus a 30-day fetch per budget) against BUDGET_SPEND_SQL,
+which reads the daily_category_totals rollup.
+Statements are counted with sqlite3's trace callback.
+
+Run from the repo root:  python -m benchmarks.bench_budgets --expenses 50000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from db.rollups import rebuild_daily_totals
+from ml.algorithms import moving_average
+from model.expense_schema import ExpenseCategory
+
+
+def print_section(title):
+    print("\n" + "=" * 70)
+    print(f"  {title}")
+    print("=" * 70)
+
+
+def seed(path: str, expenses: int):
+    from db import database_utilities
+    database_utilities.DATABASE_NAME = path
+    database_utilities.init_database()
+
+    conn = sqlite3.connect(path)
+    user_id = str(uuid.uuid4())
+    now = datetime.now()
+    today = date.today()
+    rng = random.Random(42)
+    categories = [c.value for c in ExpenseCategory]
+    conn.execute("INSERT INTO users (user_id, username, email, password, created_at) VALUES (?,?,?,?,?)",
+                 (user_id, "bench", "bench@example.com", "x", now))
+    conn.executemany("INSERT INTO budgets VALUES (?,?,?,?,?)",
+                     [(str(uuid.uuid4()), user_id, c, 500.0, now) for c in categories])
+    conn.executemany(
+        "INSERT INTO expenses VALUES (?,?,?,?,?,?,?,?)",
+        ((str(uuid.uuid4()), user_id, round(rng.uniform(1, 120), 2), rng.choice(categories), "bench",
+          today - timedelta(days=rng.randint(0, 365)), now, now) for _ in range(expenses)),
+    )
+    rebuild_daily_totals(conn.cursor())
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    return user_id
+
+
+def legacy_alert_inputs(conn, user_id, today):
+    """The pre-aggregation access pattern: 1 + 2 queries per budget"""
+    month_start = today.replace(day=1)
+    out = []
+    budgets = conn.execute("SELECT * FROM budgets WHERE user_id=?", (user_id,)).fetchall()
+    for budget in budgets:
+        spent = conn.execute("""
+            SELECT COALESCE(SUM(amount),0) FROM expenses
+            WHERE user_id=? AND LOWER(category)=LOWER(?) AND date>=? AND date<=?
+        """, (user_id, budget[2], month_start, today)).fetchone()[0]
+        amounts = [r[0] for r in conn.execute("""
+            SELECT amount FROM expenses
+            WHERE user_id=? AND LOWER(category)=LOWER(?) AND date>=?
+        """, (user_id, budget[2], today - timedelta(days=30)))]
+        out.append((budget[2], spent, moving_average(amounts, window=7) if amounts else None))
+    return out
+
+
+def grouped_alert_inputs(conn, user_id, today):
+    from api.budgets import BUDGET_SPEND_SQL, budget_spend_params
+    rows = conn.execute(BUDGET_SPEND_SQL, budget_spend_params(user_id, today)).fetchall()
+    return [(r[2], r[5], r[6]) for r in rows]
+
+
+def measure(conn, fn, user_id, today, repeat):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    fn(conn, user_id, today)
+    conn.set_trace_callback(None)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(conn, user_id, today)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return len(statements), timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_budgets.db")
+    user_id = seed(path, args.expenses)
+    conn = sqlite3.connect(path)
+    today = date.today()
+
+    print_section(f"BUDGET ALERT INPUTS — {args.expenses} expenses, {len(ExpenseCategory)} budgets")
+    for name, fn in (("per-budget (old)", legacy_alert_inputs), ("grouped (new)", grouped_alert_inputs)):
+        queries, p50, p95 = measure(conn, fn, user_id, today, args.repeat)
+        print(f"{name:18}  queries={queries:3}  p50={p50:8.2f}ms  p95={p95:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Response encoding benchmark: a 10k-row GET /expenses body
+
+  models:  row → dict → ExpenseResponse, re-validated against the response
+           model by FastAPI, then json.dumps (the old handler)
+  stdlib:  trusted rows → dicts → json.dumps (utils/fastjson without orjson)
+  orjson:  trusted rows → dicts → orjson.dumps (utils/fastjson)
+
+All three produce the same JSON document; see test/test_fastjson.py.
+
+Run from the repo root:  python -m benchmarks.bench_json --rows 10000
+"""
+import argparse
+import json
+import random
+import sqlite3
+import timeit
+from datetime import date, datetime, timedelta
+from typing import List
+
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+
+from api.expenses import EXPENSE_COLUMNS, EXPENSE_SELECT, EXPENSE_TIMESTAMPS
+from model.expense_schema import ExpenseCategory, ExpenseResponse
+from utils import fastjson
+
+
+def print_section(title):
+    print("\n" + "=" * 70)
+    print(f"  {title}")
+    print("=" * 70)
+
+
+def make_rows(n: int):
+    rng = random.Random(7)
+    conn = sqlite3.connect(":memory:")
+    conn.execute(f"CREATE TABLE expenses ({EXPENSE_SELECT})")
+    categories = [c.value for c in ExpenseCategory]
+    now = datetime.now()
+    conn.executemany("INSERT INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+        (f"{i:032x}", "user", round(rng.uniform(1, 200), 2), rng.choice(categories), f"expense {i}",
+         date.today() - timedelta(days=rng.randrange(365)), now, now)
+        for i in range(n)
+    ])
+    conn.row_factory = sqlite3.Row
+    return conn.execute(f"SELECT {EXPENSE_SELECT} FROM expenses").fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    response_field = TypeAdapter(List[ExpenseResponse])
+
+    def models():
+        content = [ExpenseResponse(**dict(zip(row.keys(), row))) for row in rows]
+        validated = response_field.validate_python(content)
+        return JSONResponse(response_field.dump_python(validated, mode="json")).body
+
+    def stdlib():
+        items = fastjson.row_dicts(rows, EXPENSE_COLUMNS, EXPENSE_TIMESTAMPS)
+        return json.dumps(items, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def orjson():
+        return fastjson.encode_rows(rows, EXPENSE_COLUMNS, EXPENSE_TIMESTAMPS)
+
+    cases = {"models": models, "stdlib": stdlib}
+    if fastjson.orjson is not None:
+        cases["orjson"] = orjson
+    reference = json.loads(models())
+    for name, fn in cases.items():
+        assert json.loads(fn()) == reference, f"{name} output differs"
+
+    print_section(f"ENCODE {args.rows:,} EXPENSE ROWS (best of {args.repeat})")
+    baseline = None
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print(f"  {name:8} {best * 1000:9.2f} ms   {args.rows / best:>12,.0f} rows/s   {baseline / best:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Login throughput versus KDF cost and concurrency
+
+For every --costs entry (scrypt:<log2 N> or pbkdf2:<iterations>) the users'
+stored hashes are rebuilt at that cost, then POST /auth/login is driven
+through main_ml.app in-process at each --concurrency level. A separate probe
+hits GET /health every 5 ms throughout, so the table also shows how long
+other requests wait while logins are hashing.
+
+  pool    the KDF runs on the password-hash thread pool (the app's behaviour)
+  inline  the KDF runs on the event loop, as a plain hashlib call in the
+          handler would (for comparison only)
+
+Run from the repo root:
+  python -m benchmarks.bench_login --costs scrypt:14,scrypt:15,pbkdf2:600000 --concurrency 1,8,32
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from benchmarks.bench_api import pct
+
+
+def print_section(title):
+    print("\n" + "=" * 70)
+    print(f"  {title}")
+    print("=" * 70)
+
+
+def parse_cost(text: str):
+    kdf, _, value = text.partition(":")
+    if kdf not in ("scrypt", "pbkdf2") or not value.isdigit():
+        raise argparse.ArgumentTypeError(f"bad cost {text!r}; use scrypt:<log2 N> or pbkdf2:<iterations>")
+    return kdf, int(value)
+
+
+def apply_cost(passwords, kdf: str, value: int):
+    passwords.KDF = kdf
+    if kdf == "scrypt":
+        passwords.SCRYPT_N = 2 ** value
+    else:
+        passwords.PBKDF2_ITERATIONS = value
+
+
+def reset_passwords(path: str, users: int, password: str, passwords):
+    stored = passwords.hash_password(password)
+    with sqlite3.connect(path) as conn:
+        conn.execute("DELETE FROM users")
+        conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?, NULL, ?)", [
+            (f"user-{i}", f"login{i:05d}", f"login{i}@example.com", stored, datetime.now())
+            for i in range(users)
+        ])
+    from api.auth import _user_cache
+    _user_cache.clear()
+
+
+async def run_logins(app, users: int, password: str, requests: int, concurrency: int):
+    latencies, probes, errors = [], [], 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        pending = iter(range(requests))
+        done = asyncio.Event()
+
+        async def worker():
+            nonlocal errors
+            for i in pending:
+                started = time.perf_counter()
+                response = await client.post("/auth/login", data={
+                    "username": f"login{i % users:05d}", "password": password})
+                latencies.append(time.perf_counter() - started)
+                errors += response.status_code != 200
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/health")
+                probes.append(time.perf_counter() - started)
+                await asyncio.sleep(0.005)
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+    return elapsed, latencies, probes, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--costs", default="scrypt:13,scrypt:14,scrypt:15,pbkdf2:100000,pbkdf2:600000")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma list of concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="logins per cell")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--modes", default="pool,inline", help="comma list of pool, inline")
+    parser.add_argument("--json", help="write results to this file ('-' for stdout)")
+    args = parser.parse_args()
+
+    costs = [parse_cost(c.strip()) for c in args.costs.split(",") if c.strip()]
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    if set(modes) - {"pool", "inline"}:
+        parser.error("modes are pool and inline")
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_login.db")
+    os.environ["EXPENSE_TRACKER_DB"] = path
+    from db.database_utilities import init_database
+    from main_ml import app
+    from utils import passwords
+    init_database()
+    pooled = passwords._run_kdf
+
+    async def inline_kdf(fn, *args):
+        return fn(*args)
+
+    password = "bench-password"
+    results = []
+    print_section(f"LOGIN THROUGHPUT ({args.requests} logins per cell, {passwords.HASH_WORKERS} KDF workers)")
+    print(f"{'cost':<16}{'mode':<8}{'clients':>8}{'hash ms':>9}{'login/s':>9}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'health p99':>12}{'err':>5}")
+    for kdf, value in costs:
+        apply_cost(passwords, kdf, value)
+        started = time.perf_counter()
+        reset_passwords(path, args.users, password, passwords)
+        hash_ms = (time.perf_counter() - started) * 1000
+        for mode in modes:
+            passwords._run_kdf = pooled if mode == "pool" else inline_kdf
+            for concurrency in levels:
+                elapsed, latencies, probes, errors = asyncio.run(
+                    run_logins(app, args.users, password, args.requests, concurrency))
+                row = {
+                    "kdf": kdf, "cost": value, "mode": mode, "concurrency": concurrency,
+                    "hash_ms": round(hash_ms, 2), "logins_per_s": round(len(latencies) / elapsed, 1),
+                    "p50_ms": round(pct(latencies, 0.50), 2), "p99_ms": round(pct(latencies, 0.99), 2),
+                    "health_p99_ms": round(pct(probes, 0.99), 2), "errors": errors,
+                }
+                results.append(row)
+                print(f"{f'{kdf}:{value}':<16}{mode:<8}{concurrency:>8}{row['hash_ms']:>9.1f}"
+                      f"{row['logins_per_s']:>9.1f}{row['p50_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+                      f"{row['health_p99_ms']:>12.1f}{errors:>5}")
+    passwords._run_kdf = pooled
+
+    if args.json == "-":
+        print(json.dumps(results, indent=2))
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nwrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Microbenchmarks: pure-Python ml/algorithms vs the NumPy batch engine
+
+For each series length (10, 1k, 100k points by default) times the reference
+function on one series, the NumPy version on the same series (batch of 1),
+and both over a batch of --rows series (e.g. all categories of many users).
+
+Run from the repo root:  python -m benchmarks.bench_ml
+"""
+import argparse
+import random
+import timeit
+
+from ml import algorithms
+from ml.vectorized import (
+    as_batch, batch_moving_average, batch_exponential_smoothing, batch_linear_regression,
+    batch_coefficient_of_variation,
+)
+
+
+def print_section(title):
+    print("\n" + "=" * 70)
+    print(f"  {title}")
+    print("=" * 70)
+
+
+def reference_cases(s):
+    x = list(range(len(s)))
+    return {
+        "linear_regression": lambda: algorithms.simple_linear_regression(x, s),
+        "exponential_smoothing": lambda: algorithms.exponential_smoothing(s, 0.3),
+        "moving_average": lambda: algorithms.moving_average(s, 7),
+        "volatility": lambda: algorithms.calculate_volatility(s),
+    }
+
+
+def numpy_cases(values, lengths):
+    return {
+        "linear_regression": lambda: batch_linear_regression(values, lengths),
+        "exponential_smoothing": lambda: batch_exponential_smoothing(values, lengths, 0.3),
+        "moving_average": lambda: batch_moving_average(values, lengths, 7),
+        "volatility": lambda: batch_coefficient_of_variation(values, lengths),
+    }
+
+
+def best_of(fn, budget=0.2):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * budget / 0.2))
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def fmt(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:9.1f}µs"
+    return f"{seconds * 1e3:9.2f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 100_000])
+    parser.add_argument("--rows", type=int, default=64, help="series per batch")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    for size in args.sizes:
+        one = [rng.uniform(1, 150) for _ in range(size)]
+        rows = max(1, min(args.rows, 10_000_000 // size))
+        many = [[rng.uniform(1, 150) for _ in range(size)] for _ in range(rows)]
+        v1, l1 = as_batch([one])
+        vn, ln = as_batch(many)
+
+        print_section(f"{size} points  (batch: {rows} series)")
+        print(f"{'function':22} {'python x1':>11} {'numpy x1':>11} {'python xN':>11} {'numpy xN':>11} {'speedup xN':>11}")
+        single_ref, single_np = reference_cases(one), numpy_cases(v1, l1)
+        batch_np = numpy_cases(vn, ln)
+        for name in single_ref:
+            py1 = best_of(single_ref[name])
+            np1 = best_of(single_np[name])
+            pyn = sum(best_of(fn, budget=0.2 / rows) for fn in
+                      (reference_cases(s)[name] for s in many[:min(rows, 8)])) * rows / min(rows, 8)
+            npn = best_of(batch_np[name])
+            print(f"{name:22} {fmt(py1)} {fmt(np1)} {fmt(pyn)} {fmt(npn)} {pyn / npn:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
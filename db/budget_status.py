@@ -0,0 +1,152 @@
+"""
+db/budget_status.py
+Per-budget, per-month spend snapshots kept current by the expense write path.
+
+budget_status holds, for each (user_id, category, month), the month-to-date
+spend, the trailing 7-day total as of `as_of`, and `crossed_at`, the day the
+spend first reached NOTIFY_THRESHOLD of the limit. Writes adjust rows that
+are current (as_of = today) in place. A stale or missing row — a new day or
+a new month — is recomputed from the daily rollup the first time it is
+needed.
+
+Which budgets crossed the threshold on a given day, across all users:
+    python -m db.budget_status crossed [--date YYYY-MM-DD]
+"""
+import argparse
+from datetime import date, timedelta
+
+MOVING_AVERAGE_WINDOW = 7
+NOTIFY_THRESHOLD = 0.9
+
+# Every budget of a user with its month-to-date spend and its average daily
+# spend over the trailing window, in one statement over the daily rollup
+# instead of one or two expense scans per budget.
+BUDGET_SPEND_SQL = """
+    SELECT b.*,
+           COALESCE(SUM(CASE WHEN d.day >= :month_start THEN d.total END), 0) AS month_to_date,
+           COALESCE(SUM(CASE WHEN d.day >= :trailing_start THEN d.total END), 0) / :window AS recent_avg
+    FROM budgets b
+    LEFT JOIN daily_category_totals d
+      ON d.user_id = b.user_id AND d.category = b.category
+     AND d.day >= :since AND d.day <= :today
+    WHERE b.user_id = :user_id
+    GROUP BY b.budget_id
+"""
+
+# Same columns as BUDGET_SPEND_SQL, read from the snapshots by primary key
+BUDGET_STATUS_SQL = """
+    SELECT b.*, s.spent AS month_to_date, s.trailing / :window AS recent_avg, s.as_of
+    FROM budgets b
+    LEFT JOIN budget_status s
+      ON s.user_id = b.user_id AND s.category = b.category AND s.month = :month
+    WHERE b.user_id = :user_id
+"""
+
+UPSERT_STATUS_SQL = """
+    INSERT INTO budget_status (user_id, category, month, monthly_limit, spent, trailing, as_of, crossed_at)
+    VALUES (:user_id, :category, :month, :monthly_limit, :spent, :trailing, :today,
+            CASE WHEN :spent >= :threshold * :monthly_limit THEN :today END)
+    ON CONFLICT (user_id, category, month) DO UPDATE SET
+        monthly_limit = excluded.monthly_limit,
+        spent = excluded.spent,
+        trailing = excluded.trailing,
+        as_of = excluded.as_of,
+        crossed_at = CASE WHEN excluded.crossed_at IS NULL THEN NULL
+                          ELSE COALESCE(budget_status.crossed_at, excluded.crossed_at) END
+"""
+
+APPLY_DELTA_SQL = """
+    UPDATE budget_status SET
+        spent = spent + :spent,
+        trailing = trailing + :trailing,
+        crossed_at = CASE WHEN spent + :spent >= :threshold * monthly_limit
+                          THEN COALESCE(crossed_at, as_of) END
+    WHERE user_id = :user_id AND category = :category AND month = :month AND as_of = :today
+"""
+
+def month_key(day: date) -> str:
+    return day.strftime("%Y-%m")
+
+def budget_spend_params(user_id: str, today: date) -> dict:
+    month_start = today.replace(day=1)
+    trailing_start = today - timedelta(days=MOVING_AVERAGE_WINDOW - 1)
+    return {
+        "user_id": user_id,
+        "month_start": str(month_start),
+        "trailing_start": str(trailing_start),
+        "since": str(min(month_start, trailing_start)),
+        "today": str(today),
+        "window": float(MOVING_AVERAGE_WINDOW),
+    }
+
+def refresh_budget_status(cursor, user_id: str, today: date):
+    """Recompute this month's snapshot of every budget of a user from the rollup"""
+    cursor.execute(BUDGET_SPEND_SQL, budget_spend_params(user_id, today))
+    columns = [c[0] for c in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    cursor.executemany(UPSERT_STATUS_SQL, [{
+        "user_id": user_id, "category": row["category"], "month": month_key(today),
+        "monthly_limit": row["monthly_limit"], "spent": row["month_to_date"],
+        "trailing": row["recent_avg"] * MOVING_AVERAGE_WINDOW, "today": str(today),
+        "threshold": NOTIFY_THRESHOLD,
+    } for row in rows])
+
+def load_budget_status(cursor, user_id: str, today: date):
+    """Budgets + month_to_date + recent_avg, refreshing snapshots that are not current"""
+    params = {"user_id": user_id, "month": month_key(today), "window": float(MOVING_AVERAGE_WINDOW)}
+    rows = cursor.execute(BUDGET_STATUS_SQL, params).fetchall()
+    if any(row["as_of"] != str(today) for row in rows):
+        refresh_budget_status(cursor, user_id, today)
+        rows = cursor.execute(BUDGET_STATUS_SQL, params).fetchall()
+    return rows
+
+def apply_budget_delta(cursor, user_id: str, category: str, day, amount: float, today: date):
+    """Fold one rollup change into the current snapshot (after the rollup was updated)"""
+    d = day if isinstance(day, date) else date.fromisoformat(str(day))
+    in_month = today.replace(day=1) <= d <= today
+    in_trailing = today - timedelta(days=MOVING_AVERAGE_WINDOW - 1) <= d <= today
+    if not (in_month or in_trailing):
+        return
+    cursor.execute(APPLY_DELTA_SQL, {
+        "user_id": user_id, "category": category, "month": month_key(today), "today": str(today),
+        "spent": amount if in_month else 0.0, "trailing": amount if in_trailing else 0.0,
+        "threshold": NOTIFY_THRESHOLD,
+    })
+    if cursor.rowcount == 0:
+        cursor.execute("SELECT 1 FROM budgets WHERE user_id = ? AND category = ?", (user_id, category))
+        if cursor.fetchone():
+            refresh_budget_status(cursor, user_id, today)
+
+def invalidate_budget_status(cursor, user_id: str = None):
+    """Mark snapshots stale; crossed_at is kept and re-checked on refresh"""
+    where, params = ("WHERE user_id = ?", (user_id,)) if user_id else ("", ())
+    cursor.execute(f"UPDATE budget_status SET as_of = NULL {where}", params)
+
+def budgets_crossed_on(cursor, day: date):
+    """(user_id, category, spent, monthly_limit) for budgets that reached the threshold on `day`"""
+    cursor.execute("""
+        SELECT user_id, category, spent, monthly_limit FROM budget_status
+        WHERE crossed_at = ? AND month = ?
+        ORDER BY user_id, category
+    """, (str(day), month_key(day)))
+    return cursor.fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description="Query budget_status snapshots")
+    parser.add_argument("command", choices=["crossed"])
+    parser.add_argument("--date", type=date.fromisoformat, default=date.today())
+    args = parser.parse_args()
+
+    from db.database_utilities import get_db, init_database, data_databases
+    init_database()
+    rows = []
+    for database in data_databases():
+        with get_db(database) as conn:
+            rows += budgets_crossed_on(conn.cursor(), args.date)
+    rows.sort(key=lambda row: (row[0], row[1]))
+    for user_id, category, spent, limit in rows:
+        print(f"{user_id}\t{category}\t{spent:.2f}/{limit:.2f}")
+    print(f"{len(rows)} budgets crossed {NOTIFY_THRESHOLD:.0%} on {args.date}")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,294 @@
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from contextvars import ContextVar
+import asyncio
+import bisect
+import contextvars
+import functools
+import hashlib
+import queue
 import sqlite3
+import itertools
+import threading
+import time
 import os
+from urllib.parse import quote
+
+from db.instrumentation import InstrumentedConnection
+from db.rollups import rebuild_daily_totals
+from db.row_counts import create_row_count_triggers, recount_rows
+from db.versions import get_data_version
+from utils.metrics import Counter
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE_NAME = os.path.join(BASE_DIR, "expense_tracker.db")
+DATABASE_NAME = os.environ.get("EXPENSE_TRACKER_DB", os.path.join(BASE_DIR, "expense_tracker.db"))
+
+# ==================== SHARDING ====================
+# With DB_SHARDS=N, each user's expenses, budgets and derived tables live in
+# one of N shard files next to DATABASE_NAME (expense_tracker.shard0.db, ...).
+# The main file keeps users and job bookkeeping. Users map to shards on a
+# consistent-hash ring, so going from N to N+1 shards moves about 1/(N+1) of
+# them (python -m db.shards rebalance). DB_SHARDS=0 keeps everything in one file.
+#
+# get_current_user calls use_user_shard, so within a request every get_db /
+# get_read_db / run_db / run_read without an explicit database goes to the
+# caller's shard.
+SHARDS = int(os.environ.get("DB_SHARDS", "0"))
+SHARD_VNODES = 64
+
+_shard_db: ContextVar = ContextVar("shard_db", default=None)
+
+
+def _ring_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+class ShardRing:
+    """Consistent-hash ring: each shard owns `vnodes` points; a key belongs to the next point clockwise"""
+
+    def __init__(self, names, vnodes: int = SHARD_VNODES):
+        points = sorted((_ring_hash(f"{name}#{i}"), name) for name in names for i in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def shard_for(self, key: str) -> str:
+        return self._names[bisect.bisect(self._points, _ring_hash(key)) % len(self._points)]
+
+
+@functools.lru_cache(maxsize=None)
+def shard_ring(count: int) -> ShardRing:
+    return ShardRing([f"shard{i}" for i in range(count)])
+
+
+def shard_path(name: str) -> str:
+    root, ext = os.path.splitext(DATABASE_NAME)
+    return f"{root}.{name}{ext or '.db'}"
+
+
+def shard_database(user_id: str) -> str:
+    """File holding user_id's data"""
+    if not SHARDS:
+        return DATABASE_NAME
+    return shard_path(shard_ring(SHARDS).shard_for(user_id))
+
+
+def group_by_shard(user_ids) -> dict:
+    """{database: [user_id, ...]} in input order"""
+    groups = {}
+    for user_id in user_ids:
+        groups.setdefault(shard_database(user_id), []).append(user_id)
+    return groups
+
+
+def data_databases() -> list:
+    """Files holding per-user data: the shards, or the main file when unsharded"""
+    if not SHARDS:
+        return [DATABASE_NAME]
+    return [shard_path(f"shard{i}") for i in range(SHARDS)]
+
+
+def all_databases() -> list:
+    return list(dict.fromkeys([DATABASE_NAME] + data_databases()))
+
+
+def use_user_shard(user_id: str):
+    """Route this request's queries without an explicit database to user_id's shard"""
+    if SHARDS:
+        _shard_db.set(shard_database(user_id))
+
+
+def _resolve(database: str = None) -> str:
+    return database or _shard_db.get() or DATABASE_NAME
+
+# ==================== CONNECTION POOL ====================
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+
+# Applied once when a connection is opened, never per checkout
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA cache_size=-{int(os.environ.get('DB_CACHE_KB', '16384'))}",
+    f"PRAGMA mmap_size={int(os.environ.get('DB_MMAP_BYTES', str(128 * 1024 * 1024)))}",
+    f"PRAGMA busy_timeout={int(os.environ.get('DB_BUSY_TIMEOUT_MS', '5000'))}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA recursive_triggers=ON",  # REPLACE deletions fire the row-count triggers
+)
+
+# Read-only connections cannot change the journal mode or sync setting
+READ_PRAGMAS = tuple(p for p in CONNECTION_PRAGMAS
+                     if not p.startswith(("PRAGMA journal_mode", "PRAGMA synchronous"))) + ("PRAGMA query_only=ON",)
+
+
+class PoolExhausted(sqlite3.OperationalError):
+    """Raised when no connection frees up within POOL_TIMEOUT"""
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections for a single database file.
+
+    Idle connections are kept on a LIFO stack so the most recently used
+    (and therefore warmest) connection is handed out first. A connection
+    is only ever used by one thread at a time, but may be returned from a
+    different thread than the one that opened it.
+    """
+
+    def __init__(self, database: str, max_size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 readonly: bool = False):
+        self.database = database
+        self.readonly = readonly
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.readonly:
+            conn = sqlite3.connect(f"file:{quote(self.database)}?mode=ro", uri=True,
+                                   check_same_thread=False, factory=InstrumentedConnection)
+        else:
+            conn = sqlite3.connect(self.database, check_same_thread=False, factory=InstrumentedConnection)
+        conn.row_factory = sqlite3.Row  # Enable column access by name
+        for pragma in READ_PRAGMAS if self.readonly else CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.max_size
+            if can_open:
+                self._opened += 1
+                self.misses += 1
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        # Pool is at capacity: block until somebody releases a connection
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self.timeouts += 1
+            raise PoolExhausted(f"No database connection available after {self.timeout}s")
+        with self._lock:
+            self.waits += 1
+            self.wait_time += time.perf_counter() - started
+        return conn
+
+    def record_reuse(self):
+        with self._lock:
+            self.hits += 1
+
+    def release(self, conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self.discard(conn)
+            return
+        self._idle.put(conn)
+
+    def discard(self, conn: sqlite3.Connection):
+        """Drop a connection that is no longer usable"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        finally:
+            with self._lock:
+                self._opened -= 1
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self._opened,
+                "idle": self._idle.qsize(),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "wait_time_ms": round(self.wait_time * 1000, 3),
+                "timeouts": self.timeouts,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Connection currently checked out by this thread / asyncio task, so nested
+# get_db() calls share it instead of taking a second one from the pool.
+_current_conn: ContextVar = ContextVar("current_conn", default=None)
+
+
+def get_pool(database: str = None, readonly: bool = False) -> ConnectionPool:
+    """Return the pool for a database file, creating it on first use"""
+    key = (_resolve(database), readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                size = READ_POOL_SIZE if readonly else POOL_SIZE
+                pool = _pools[key] = ConnectionPool(key[0], max_size=size, readonly=readonly)
+    return pool
+
+
+def pool_stats() -> dict:
+    """Hit/miss/wait counters for every open pool"""
+    return {os.path.basename(name) + (":ro" if readonly else ""): pool.stats()
+            for (name, readonly), pool in _pools.items()}
+
+
+def close_pools():
+    """Close all idle pooled connections (used on shutdown)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
 
 @contextmanager
-def get_db():
+def get_db(database: str = None):
     """Context manager for database connection"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row  # Enable column access by name
+    database = _resolve(database)
+    current = _current_conn.get()
+    if current is not None and current[0].database == database:
+        # Nested call: the outermost block owns commit/rollback
+        pool, conn = current
+        pool.record_reuse()
+        yield conn
+        return
+
+    pool = get_pool(database)
+    conn = pool.acquire()
+    token = _current_conn.set((pool, conn))
     try:
         yield conn
         conn.commit()
@@ -17,11 +296,187 @@ def get_db():
         conn.rollback()
         raise
     finally:
-        conn.close()
+        _current_conn.reset(token)
+        pool.release(conn)
 
-def init_database():
-    """Initialize database tables"""
+# ==================== READ ROUTING ====================
+# Writes (get_db / run_db) go to the primary through a read-write pool.
+# Reads (get_read_db / run_read) get their own pool of mode=ro connections,
+# so they never queue behind writes for a connection or an executor thread.
+# In WAL mode those see every committed write.
+#
+# DB_READ_REPLICAS lists snapshot copies of the primary (kept current by
+# `python -m db.replicas sync`). A read is sent to one only when the request
+# has a read floor (require_version) and the replica holds at least that data
+# version for the user, so a user always reads their own writes; otherwise it
+# falls back to the primary.
+READ_POOL_SIZE = int(os.environ.get("DB_READ_POOL_SIZE", str(POOL_SIZE)))
+READ_REPLICAS = [path.strip() for path in os.environ.get("DB_READ_REPLICAS", "").split(",") if path.strip()]
+
+DB_READ_ROUTES = Counter("db_read_routes_total", "Read transactions by where they were served", ("target",))
+
+_replica_turn = itertools.count()
+_read_floor: ContextVar = ContextVar("read_floor", default=None)
+
+
+def require_version(user_id: str, version: int):
+    """Reads for the rest of this request must see user_id's data at `version` or later"""
+    _read_floor.set((user_id, version))
+
+
+def _acquire_replica(floor):
+    path = READ_REPLICAS[next(_replica_turn) % len(READ_REPLICAS)]
+    pool = get_pool(path, readonly=True)
+    try:
+        conn = pool.acquire()
+    except sqlite3.Error:       # not synced yet
+        return None
+    try:
+        conn.execute("BEGIN")   # pin one snapshot for the version check and the reads
+        if get_data_version(conn.cursor(), floor[0]) >= floor[1]:
+            return pool, conn
+        DB_READ_ROUTES.inc(1, "stale_replica")
+    except sqlite3.Error:
+        pass
+    pool.release(conn)
+    return None
+
+
+def _acquire_reader(database: str = None):
+    database = _resolve(database)
+    floor = _read_floor.get()
+    # Replicas are copies of the main file, so they only serve unsharded data
+    if READ_REPLICAS and floor is not None and database == DATABASE_NAME:
+        replica = _acquire_replica(floor)
+        if replica is not None:
+            DB_READ_ROUTES.inc(1, "replica")
+            return replica
+    DB_READ_ROUTES.inc(1, "primary")
+    pool = get_pool(database, readonly=True)
+    return pool, pool.acquire()
+
+
+@contextmanager
+def get_read_db(database: str = None):
+    """
+    Read-only connection. Inside a get_db() block on the same database this
+    is that block's connection, so reads see its uncommitted writes.
+    """
+    current = _current_conn.get()
+    if current is not None and current[0].database == _resolve(database):
+        pool, conn = current
+        pool.record_reuse()
+        yield conn
+        return
+
+    pool, conn = _acquire_reader(database)
+    token = _current_conn.set((pool, conn))
+    try:
+        yield conn
+    finally:
+        _current_conn.reset(token)
+        pool.release(conn)
+
+# ==================== ASYNC EXECUTION ====================
+# Handlers are async, so queries must not run on the event loop thread.
+# Each executor is sized like its pool: every worker can hold a connection
+# without queueing inside the pool.
+_db_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="db")
+_read_executor = ThreadPoolExecutor(max_workers=READ_POOL_SIZE, thread_name_prefix="db-read")
+
+
+def _run_with_db(fn, args, kwargs):
     with get_db() as conn:
+        return fn(conn, *args, **kwargs)
+
+
+def _run_with_read_db(fn, args, kwargs):
+    with get_read_db() as conn:
+        return fn(conn, *args, **kwargs)
+
+
+async def run_db(fn, *args, **kwargs):
+    """Run fn(conn, *args, **kwargs) in one transaction on the DB executor"""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, _run_with_db, fn, args, kwargs)
+    return await loop.run_in_executor(_db_executor, call)
+
+
+async def run_read(fn, *args, **kwargs):
+    """Run fn(conn, *args, **kwargs) on a read-only connection (see READ ROUTING)"""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, _run_with_read_db, fn, args, kwargs)
+    return await loop.run_in_executor(_read_executor, call)
+
+
+async def run_everywhere(fn, *args, write: bool = False) -> dict:
+    """
+    Run fn(conn, *args) on every database (main file and shards) in
+    parallel, on read-only connections unless `write`; {database: result}
+    """
+    loop = asyncio.get_running_loop()
+    databases = all_databases()
+    calls = []
+    for database in databases:
+        ctx = contextvars.copy_context()
+        ctx.run(_shard_db.set, database)
+        runner = _run_with_db if write else _run_with_read_db
+        calls.append(loop.run_in_executor(_db_executor if write else _read_executor,
+                                          functools.partial(ctx.run, runner, fn, args, {})))
+    return dict(zip(databases, await asyncio.gather(*calls)))
+
+
+async def stream_query(sql: str, params=(), batch_size: int = 1000):
+    """
+    Yield lists of up to batch_size rows from one server-side cursor.
+    The connection stays checked out (and its read snapshot open) until the
+    generator is exhausted or closed; each fetch runs on the read executor.
+    """
+    ctx = contextvars.copy_context()
+    acquiring = _read_executor.submit(ctx.run, _acquire_reader)
+    try:
+        pool, conn = await asyncio.wrap_future(acquiring)
+    except asyncio.CancelledError:
+        acquiring.add_done_callback(lambda f: f.cancelled() or f.exception() or f.result()[0].release(f.result()[1]))
+        raise
+    pending = _read_executor.submit(ctx.run, conn.execute, sql, params)
+    try:
+        cursor = await asyncio.wrap_future(pending)
+        while True:
+            pending = _read_executor.submit(ctx.run, cursor.fetchmany, batch_size)
+            rows = await asyncio.wrap_future(pending)
+            if not rows:
+                return
+            yield rows
+    finally:
+        # If the consumer went away mid-fetch, hand the connection back only
+        # once that fetch has finished with it
+        pending.add_done_callback(lambda _: pool.release(conn))
+
+
+async def fetch_one(sql: str, params=()):
+    return await run_read(lambda conn: conn.execute(sql, params).fetchone())
+
+
+async def fetch_all(sql: str, params=()):
+    return await run_read(lambda conn: conn.execute(sql, params).fetchall())
+
+
+async def execute(sql: str, params=()) -> int:
+    """Execute a single write statement and return the affected row count"""
+    return await run_db(lambda conn: conn.execute(sql, params).rowcount)
+
+
+def init_database():
+    """Initialize database tables in the main file and every shard"""
+    for database in all_databases():
+        _init_schema(database)
+
+
+def _init_schema(database: str):
+    with get_db(database) as conn:
         cursor = conn.cursor()
         
         # Create users table
@@ -64,24 +519,160 @@ def init_database():
             )
         """)
         
-        # Create indexes for better performance
+        # Create indexes for better performance. Every expense query filters
+        # on user_id, so (user_id, date) also serves plain user_id lookups.
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_expenses_user_id 
-            ON expenses(user_id)
+            CREATE INDEX IF NOT EXISTS idx_expenses_user_date 
+            ON expenses(user_id, date)
         """)
         
+        # Covering index for per-category budget sums: the amount column is
+        # included so SUM(amount) never has to visit the table
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_expenses_date 
-            ON expenses(date)
+            CREATE INDEX IF NOT EXISTS idx_expenses_user_category_date
+            ON expenses(user_id, category, date, amount)
         """)
-        
+
+        # Daily per-category rollup, kept current by the expense write path
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_expenses_category 
-            ON expenses(category)
+            CREATE TABLE IF NOT EXISTS daily_category_totals (
+                user_id TEXT NOT NULL,
+                day DATE NOT NULL,
+                category TEXT NOT NULL,
+                total REAL NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (user_id, day, category)
+            ) WITHOUT ROWID
         """)
-        
+
+        # Per-user data version, bumped by every expense write (db/versions.py)
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_expenses_user_date 
-            ON expenses(user_id, date)
+            CREATE TABLE IF NOT EXISTS user_data_versions (
+                user_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+        # Online forecast state, maintained with the rollup (db/model_state.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS model_state_users (
+                user_id TEXT PRIMARY KEY,
+                first_day DATE NOT NULL,
+                as_of DATE NOT NULL,
+                active_days INTEGER NOT NULL
+            ) WITHOUT ROWID
         """)
 
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS model_state (
+                user_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                days INTEGER NOT NULL,
+                sum_y REAL NOT NULL,
+                sum_xy REAL NOT NULL,
+                sum_yy REAL NOT NULL,
+                level REAL NOT NULL,
+                PRIMARY KEY (user_id, category)
+            ) WITHOUT ROWID
+        """)
+
+        # Month-to-date budget snapshots, maintained on expense writes (db/budget_status.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS budget_status (
+                user_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                month TEXT NOT NULL,
+                monthly_limit REAL NOT NULL,
+                spent REAL NOT NULL,
+                trailing REAL NOT NULL,
+                as_of DATE,
+                crossed_at DATE,
+                PRIMARY KEY (user_id, category, month)
+            ) WITHOUT ROWID
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_budget_status_crossed
+            ON budget_status(crossed_at) WHERE crossed_at IS NOT NULL
+        """)
+
+        # Nightly precomputed forecasts and budget alerts (batch_forecasts.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS forecasts (
+                run_date DATE NOT NULL,
+                user_id TEXT NOT NULL,
+                total_predicted REAL,
+                forecast TEXT,
+                alerts TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL,
+                PRIMARY KEY (run_date, user_id)
+            ) WITHOUT ROWID
+        """)
+
+        # Resume points for batch jobs: the last key fully written per job/run
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS job_checkpoints (
+                job TEXT NOT NULL,
+                run_date DATE NOT NULL,
+                last_key TEXT NOT NULL,
+                processed INTEGER NOT NULL,
+                updated_at TIMESTAMP NOT NULL,
+                PRIMARY KEY (job, run_date)
+            )
+        """)
+
+        # Row counts for /stats, maintained by triggers (db/row_counts.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS table_row_counts (
+                table_name TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        create_row_count_triggers(cursor)
+
+        run_migrations(conn)
+
+# ==================== MIGRATIONS ====================
+# Each migration runs once, in order; PRAGMA user_version records how many
+# have been applied to a database file.
+def _migrate_lowercase_categories(cursor):
+    """Categories are stored lowercase so predicates can be exact matches"""
+    cursor.execute("UPDATE expenses SET category = LOWER(category) WHERE category <> LOWER(category)")
+    # A user could have both 'Food' and 'food' budgets; keep the lowercase one
+    cursor.execute("UPDATE OR IGNORE budgets SET category = LOWER(category) WHERE category <> LOWER(category)")
+    cursor.execute("DELETE FROM budgets WHERE category <> LOWER(category)")
+
+def _migrate_backfill_daily_totals(cursor):
+    rebuild_daily_totals(cursor)
+
+def _migrate_drop_unused_expense_indexes(cursor):
+    """No query filters on date or category alone; each index slows every insert"""
+    for index in ("idx_expenses_user_id", "idx_expenses_date", "idx_expenses_category"):
+        cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+def _migrate_backfill_row_counts(cursor):
+    recount_rows(cursor)
+
+MIGRATIONS = [
+    _migrate_lowercase_categories,
+    _migrate_backfill_daily_totals,
+    _migrate_drop_unused_expense_indexes,
+    _migrate_backfill_row_counts,
+]
+
+def run_migrations(conn):
+    """Apply pending migrations in one write transaction"""
+    if conn.in_transaction:
+        conn.commit()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")  # serialise workers starting together
+    try:
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
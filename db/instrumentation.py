@@ -0,0 +1,145 @@
+"""
+db/instrumentation.py
+Query counting for pooled connections. Every statement run through an
+InstrumentedConnection (or a cursor it hands out) is timed; the number of
+statements, rows fetched and SQL time go to process-wide metrics and to the
+per-request QueryStats, if one is active (see track_queries).
+
+Statements slower than DB_SLOW_QUERY_MS are logged as their SQL template
+(parameters are never logged). Unset or 0 disables the slow-query log.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from utils.metrics import Counter, Histogram
+
+SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", "0") or 0)
+
+slow_query_log = logging.getLogger("spendly.slow_query")
+
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed")
+DB_ROWS = Counter("db_rows_total", "Rows fetched from SQL statements")
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds", "Time spent executing and fetching SQL statements",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5, 1.0),
+)
+
+
+class QueryStats:
+    __slots__ = ("queries", "rows", "seconds", "_lock")
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, queries: int, rows: int, seconds: float):
+        with self._lock:
+            self.queries += queries
+            self.rows += rows
+            self.seconds += seconds
+
+
+# Stats of the request being served. run_db copies the context into the DB
+# executor, so queries on worker threads add to the same object; run_everywhere
+# does so from several threads at once, hence the lock in QueryStats.add.
+_current_stats: ContextVar = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def track_queries():
+    """Collect QueryStats for everything run in this context"""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def _template(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _record(sql, seconds: float, rows: int, statement: bool):
+    if statement:
+        DB_QUERIES.inc()
+    if rows:
+        DB_ROWS.inc(rows)
+    DB_QUERY_SECONDS.observe(seconds)
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.add(statement, rows, seconds)
+    if SLOW_QUERY_MS and sql is not None and seconds * 1000 >= SLOW_QUERY_MS:
+        slow_query_log.warning("slow query %.1fms: %s", seconds * 1000, _template(sql))
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times execute/executemany and the fetches that follow them"""
+    _sql = None
+
+    def execute(self, sql, parameters=()):
+        self._sql = sql
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record(sql, time.perf_counter() - started, 0, True)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql = sql
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record(sql, time.perf_counter() - started, 0, True)
+
+    def _fetched(self, started, rows: int):
+        _record(None, time.perf_counter() - started, rows, False)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = super().__next__()
+        self._fetched(started, 1)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including the execute shortcuts) are instrumented"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,176 @@
+"""
+db/model_state.py
+Persisted online model state for next-week forecasts (see ml/online.py).
+
+Per user, model_state_users holds the series origin (first day with any
+spend), the day the state is current to (as_of) and the number of days with
+spend in the window. Per category, model_state holds the window sums and the
+smoothing level as of as_of. The window is the last MODEL_LOOKBACK_DAYS + 1
+days, clipped to start at the user's first expense.
+
+Every daily-rollup change goes through update_model_state, an O(1) correction.
+Moving to a new day decays the levels and subtracts the days that left the
+window, read back from the rollup (refresh_model_state). Anything that moves
+the origin simply drops the user's state; it is rebuilt on the next read.
+"""
+from datetime import date, timedelta
+
+from ml.online import ES_ALPHA, es_weight
+
+MODEL_LOOKBACK_DAYS = 90
+
+UPSERT_MODEL_STATE_SQL = """
+    INSERT INTO model_state (user_id, category, days, sum_y, sum_xy, sum_yy, level)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, category) DO UPDATE SET
+        days   = days   + excluded.days,
+        sum_y  = sum_y  + excluded.sum_y,
+        sum_xy = sum_xy + excluded.sum_xy,
+        sum_yy = sum_yy + excluded.sum_yy,
+        level  = level  + excluded.level
+"""
+
+def window_start(first_day: date, as_of: date) -> date:
+    return max(as_of - timedelta(days=MODEL_LOOKBACK_DAYS), first_day)
+
+def _day(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+def _user_state(cursor, user_id: str):
+    cursor.execute("SELECT first_day, as_of, active_days FROM model_state_users WHERE user_id = ?", (user_id,))
+    row = cursor.fetchone()
+    return (_day(row[0]), _day(row[1]), row[2]) if row else None
+
+def invalidate_model_state(cursor, user_id: str = None):
+    """Drop a user's state (or everybody's); it is rebuilt from the rollup on the next read"""
+    where, params = ("WHERE user_id = ?", (user_id,)) if user_id else ("", ())
+    cursor.execute(f"DELETE FROM model_state {where}", params)
+    cursor.execute(f"DELETE FROM model_state_users {where}", params)
+
+def _add_days(cursor, user_id: str, first_day: date, as_of: date, rows, sign: int) -> int:
+    """Add (sign=1) or remove (sign=-1) whole rollup rows; returns the change in active days"""
+    stats, days = {}, set()
+    for category, day, total in rows:
+        d = _day(day)
+        days.add(d)
+        s = stats.setdefault(category, [0, 0.0, 0.0, 0.0, 0.0])
+        s[0] += sign
+        s[1] += sign * total
+        s[2] += sign * total * (d - first_day).days
+        s[3] += sign * total * total
+        s[4] += sign * total * es_weight((as_of - d).days)
+    cursor.executemany(UPSERT_MODEL_STATE_SQL, [(user_id, c, *s) for c, s in stats.items()])
+    return sign * len(days)
+
+def _rollup_rows(cursor, user_id: str, after: date, until: date):
+    """(category, day, total) for after < day <= until"""
+    cursor.execute("""
+        SELECT category, day, total FROM daily_category_totals
+        WHERE user_id = ? AND day > ? AND day <= ?
+    """, (user_id, str(after), str(until)))
+    return cursor.fetchall()
+
+def rebuild_model_state(cursor, user_id: str, today: date):
+    """Recompute a user's state from the rollup; returns (first_day, as_of, active_days) or None"""
+    invalidate_model_state(cursor, user_id)
+    cursor.execute("SELECT MIN(day) FROM daily_category_totals WHERE user_id = ?", (user_id,))
+    first_day = cursor.fetchone()[0]
+    if first_day is None:
+        return None
+    first_day = _day(first_day)
+    start = window_start(first_day, today)
+    active = _add_days(cursor, user_id, first_day, today,
+                       _rollup_rows(cursor, user_id, start - timedelta(days=1), today), 1)
+    cursor.execute("INSERT INTO model_state_users VALUES (?, ?, ?, ?)",
+                   (user_id, str(first_day), str(today), active))
+    return first_day, today, active
+
+def refresh_model_state(cursor, user_id: str, today: date):
+    """Bring a user's state forward to `today`; None when the user has no state"""
+    state = _user_state(cursor, user_id)
+    if state is None or state[1] == today:
+        return state
+    first_day, as_of, active = state
+    if as_of > today or (today - as_of).days > MODEL_LOOKBACK_DAYS:
+        return rebuild_model_state(cursor, user_id, today)
+
+    cursor.execute("UPDATE model_state SET level = level * ? WHERE user_id = ?",
+                   ((1 - ES_ALPHA) ** (today - as_of).days, user_id))
+    old_start, new_start = window_start(first_day, as_of), window_start(first_day, today)
+    if new_start > old_start:
+        dropped = _rollup_rows(cursor, user_id, old_start - timedelta(days=1), new_start - timedelta(days=1))
+        active += _add_days(cursor, user_id, first_day, today, dropped, -1)
+        cursor.execute("DELETE FROM model_state WHERE user_id = ? AND days <= 0", (user_id,))
+    # Rows dated after as_of were written ahead of time and skipped until now
+    active += _add_days(cursor, user_id, first_day, today, _rollup_rows(cursor, user_id, as_of, today), 1)
+    cursor.execute("UPDATE model_state_users SET as_of = ?, active_days = ? WHERE user_id = ?",
+                   (str(today), active, user_id))
+    return first_day, today, active
+
+def update_model_state(cursor, user_id: str, state, category: str, day, amount: float,
+                       total: float, count: int, count_delta: int):
+    """
+    Apply one rollup change to a state already refreshed to today. `amount`
+    and `count_delta` are what was added to the bucket, `total` and `count`
+    the bucket's values afterwards (count <= 0 means it was deleted).
+    """
+    first_day, as_of, _ = state
+    d = _day(str(day))
+    if d < first_day:
+        invalidate_model_state(cursor, user_id)
+        return
+    if d > as_of or d < window_start(first_day, as_of):
+        return
+
+    created = count_delta > 0 and count == count_delta
+    removed = count <= 0
+    new_total = 0.0 if removed else total
+    old_total = total - amount
+    active_delta = 0
+    if created or removed:
+        cursor.execute("SELECT COUNT(*) FROM daily_category_totals WHERE user_id = ? AND day = ?",
+                       (user_id, str(d)))
+        others = cursor.fetchone()[0] - (1 if created else 0)
+        if removed and others == 0 and d == first_day:
+            invalidate_model_state(cursor, user_id)
+            return
+        if others == 0:
+            active_delta = 1 if created else -1
+
+    cursor.execute(UPSERT_MODEL_STATE_SQL, (
+        user_id, category, int(created) - int(removed), amount, amount * (d - first_day).days,
+        new_total * new_total - old_total * old_total, amount * es_weight((as_of - d).days),
+    ))
+    if active_delta:
+        cursor.execute("UPDATE model_state_users SET active_days = active_days + ? WHERE user_id = ?",
+                       (active_delta, user_id))
+
+def load_model_state(cursor, user_id: str, today: date):
+    """
+    Everything a next-week forecast needs, as of `today`, or None without data:
+    n (window length in days), active_days, start, categories (window stats
+    rows: category, sum_y, sum_xy with x = 0 at start, sum_yy, level) and
+    recent (category, day, total) rollup rows for the last 8 days and `start`.
+    """
+    state = refresh_model_state(cursor, user_id, today) or rebuild_model_state(cursor, user_id, today)
+    if state is None:
+        return None
+    first_day, _, active = state
+    start = window_start(first_day, today)
+    shift = (start - first_day).days
+    cursor.execute("""
+        SELECT category, sum_y, sum_xy - ? * sum_y, sum_yy, level FROM model_state
+        WHERE user_id = ? AND days > 0 ORDER BY category
+    """, (shift, user_id))
+    categories = cursor.fetchall()
+    cursor.execute("""
+        SELECT category, day, total FROM daily_category_totals
+        WHERE user_id = ? AND ((day >= ? AND day <= ?) OR day = ?)
+    """, (user_id, str(today - timedelta(days=7)), str(today), str(start)))
+    return {
+        "n": max((today - start).days + 1, 0),
+        "active_days": active,
+        "start": start,
+        "categories": categories,
+        "recent": cursor.fetchall(),
+    }
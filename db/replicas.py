@@ -0,0 +1,82 @@
+"""
+db/replicas.py
+Read replicas: snapshot copies of the primary database made with the sqlite3
+backup API. List them in DB_READ_REPLICAS and the API sends reads there when
+the copy already holds the requesting user's latest data version (see READ
+ROUTING in db/database_utilities.py); anything older falls back to the primary.
+
+Each sync copies the whole file in one step, so readers of a replica see
+either the previous snapshot or the new one, never a mix. Keep the replicas
+current with one sync process per host, shared by all API workers:
+    python -m db.replicas sync --every 5
+or, with a single worker, set DB_REPLICA_SYNC_SECONDS to sync in-process.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+SYNC_SECONDS = float(os.environ.get("DB_REPLICA_SYNC_SECONDS", "0") or 0)
+
+log = logging.getLogger("spendly.replicas")
+
+
+def sync_replica(source: str, replica: str) -> float:
+    """Copy source into replica; returns the seconds it took"""
+    started = time.perf_counter()
+    src = sqlite3.connect(f"file:{quote(source)}?mode=ro", uri=True)
+    dst = sqlite3.connect(replica, timeout=30)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    return time.perf_counter() - started
+
+
+def sync_replicas(source: str = None, replicas=None) -> dict:
+    from db.database_utilities import DATABASE_NAME, READ_REPLICAS
+    source = source or DATABASE_NAME
+    return {replica: sync_replica(source, replica) for replica in (READ_REPLICAS if replicas is None else replicas)}
+
+
+def _sync_forever(every: float, stop: threading.Event):
+    while not stop.wait(every):
+        try:
+            sync_replicas()
+        except sqlite3.Error:
+            log.exception("replica sync failed")
+
+
+def start_sync_thread(every: float = SYNC_SECONDS) -> threading.Event:
+    """Sync the replicas every `every` seconds until the returned event is set"""
+    stop = threading.Event()
+    sync_replicas()
+    threading.Thread(target=_sync_forever, args=(every, stop), name="replica-sync", daemon=True).start()
+    return stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot the primary database into its read replicas")
+    parser.add_argument("command", choices=["sync"])
+    parser.add_argument("replicas", nargs="*", help="replica files (default: DB_READ_REPLICAS)")
+    parser.add_argument("--every", type=float, help="keep syncing every N seconds")
+    args = parser.parse_args()
+
+    from db.database_utilities import DATABASE_NAME, READ_REPLICAS
+    replicas = args.replicas or READ_REPLICAS
+    if not replicas:
+        parser.error("no replicas given and DB_READ_REPLICAS is empty")
+    while True:
+        for replica, seconds in sync_replicas(DATABASE_NAME, replicas).items():
+            print(f"{DATABASE_NAME} -> {replica}\t{seconds * 1000:.1f} ms")
+        if not args.every:
+            return
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
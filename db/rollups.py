@@ -0,0 +1,89 @@
+"""
+db/rollups.py
+Daily per-category expense totals, maintained incrementally on every write
+so read paths aggregate over days instead of individual expenses.
+
+Rebuild from the expenses table (e.g. after importing rows by hand):
+    python -m db.rollups rebuild [--user USER_ID]
+"""
+import argparse
+from datetime import date
+
+from db.model_state import refresh_model_state, update_model_state, invalidate_model_state
+from db.budget_status import apply_budget_delta, invalidate_budget_status
+
+UPSERT_DAILY_TOTAL_SQL = """
+    INSERT INTO daily_category_totals (user_id, day, category, total, count)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, day, category) DO UPDATE SET
+        total = total + excluded.total,
+        count = count + excluded.count
+"""
+
+def apply_expense_delta(cursor, user_id: str, category: str, day, amount: float, count: int = 1):
+    """Add (or with negative values, remove) expenses from one day bucket"""
+    today = date.today()
+    state = refresh_model_state(cursor, user_id, today)
+    cursor.execute(UPSERT_DAILY_TOTAL_SQL + " RETURNING total, count",
+                   (user_id, str(day), category, amount, count))
+    total, new_count = cursor.fetchone()
+    if new_count <= 0:
+        cursor.execute("""
+            DELETE FROM daily_category_totals
+            WHERE user_id = ? AND day = ? AND category = ?
+        """, (user_id, str(day), category))
+    if state is not None:
+        update_model_state(cursor, user_id, state, category, day, amount, total, new_count, count)
+    apply_budget_delta(cursor, user_id, category, day, amount, today)
+
+def apply_expense_batch(cursor, user_id: str, expenses):
+    """Add many new expenses at once; expenses yields (category, day, amount)"""
+    buckets = {}
+    for category, day, amount in expenses:
+        key = (str(day), category)
+        total, count = buckets.get(key, (0.0, 0))
+        buckets[key] = (total + amount, count + 1)
+    cursor.executemany(UPSERT_DAILY_TOTAL_SQL, [
+        (user_id, day, category, total, count) for (day, category), (total, count) in buckets.items()
+    ])
+    invalidate_model_state(cursor, user_id)   # rebuilt once on the next forecast
+    invalidate_budget_status(cursor, user_id)
+
+def move_expense(cursor, user_id: str, old: dict, new: dict):
+    """Shift an updated expense between buckets; old/new have amount, category, date"""
+    if (old["category"], str(old["date"])) == (new["category"], str(new["date"])):
+        if old["amount"] != new["amount"]:
+            apply_expense_delta(cursor, user_id, new["category"], new["date"], new["amount"] - old["amount"], 0)
+        return
+    apply_expense_delta(cursor, user_id, old["category"], old["date"], -old["amount"], -1)
+    apply_expense_delta(cursor, user_id, new["category"], new["date"], new["amount"], 1)
+
+def rebuild_daily_totals(cursor, user_id: str = None):
+    """Recompute the rollup from expenses for one user, or for everybody"""
+    where, params = ("WHERE user_id = ?", (user_id,)) if user_id else ("", ())
+    invalidate_model_state(cursor, user_id)
+    invalidate_budget_status(cursor, user_id)
+    cursor.execute(f"DELETE FROM daily_category_totals {where}", params)
+    cursor.execute(f"""
+        INSERT INTO daily_category_totals (user_id, day, category, total, count)
+        SELECT user_id, date, category, SUM(amount), COUNT(*)
+        FROM expenses {where}
+        GROUP BY user_id, date, category
+    """, params)
+    return cursor.rowcount
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the daily_category_totals rollup")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user", help="only rebuild this user_id")
+    args = parser.parse_args()
+
+    from db.database_utilities import get_db, init_database, data_databases, shard_database
+    init_database()
+    for database in [shard_database(args.user)] if args.user else data_databases():
+        with get_db(database) as conn:
+            rows = rebuild_daily_totals(conn.cursor(), args.user)
+        print(f"Rebuilt {rows} daily rollup rows in {database}")
+
+if __name__ == "__main__":
+    main()
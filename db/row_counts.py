@@ -0,0 +1,64 @@
+"""
+db/row_counts.py
+Row counts of the main tables, kept in table_row_counts by triggers so
+/stats reads three primary-key rows instead of scanning every table. The
+triggers fire for every write path (API, bulk import, manual SQL).
+
+Recount from the tables if they were ever modified with triggers dropped:
+    python -m db.row_counts recount
+"""
+import argparse
+
+COUNTED_TABLES = ("users", "expenses", "budgets")
+
+
+def create_row_count_triggers(cursor):
+    for table in COUNTED_TABLES:
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_insert AFTER INSERT ON {table}
+            BEGIN
+                UPDATE table_row_counts SET row_count = row_count + 1 WHERE table_name = '{table}';
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_delete AFTER DELETE ON {table}
+            BEGIN
+                UPDATE table_row_counts SET row_count = row_count - 1 WHERE table_name = '{table}';
+            END
+        """)
+
+
+def recount_rows(cursor):
+    """Reset every counter from a full COUNT(*) (one scan per table)"""
+    for table in COUNTED_TABLES:
+        cursor.execute(f"""
+            INSERT INTO table_row_counts (table_name, row_count) VALUES (?, (SELECT COUNT(*) FROM {table}))
+            ON CONFLICT (table_name) DO UPDATE SET row_count = excluded.row_count
+        """, (table,))
+
+
+def get_row_counts(cursor) -> dict:
+    cursor.execute("SELECT table_name, row_count FROM table_row_counts")
+    counts = dict.fromkeys(COUNTED_TABLES, 0)
+    counts.update((name, count) for name, count in cursor.fetchall())
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain table_row_counts")
+    parser.add_argument("command", choices=["recount"])
+    parser.parse_args()
+
+    from db.database_utilities import get_db, init_database, all_databases
+    init_database()
+    for database in all_databases():
+        with get_db(database) as conn:
+            cursor = conn.cursor()
+            recount_rows(cursor)
+            counts = get_row_counts(cursor)
+        for table, count in counts.items():
+            print(f"{database}\t{table}\t{count}")
+
+
+if __name__ == "__main__":
+    main()
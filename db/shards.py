@@ -0,0 +1,131 @@
+"""
+db/shards.py
+Move per-user rows to the database that owns them under the current
+DB_SHARDS setting (see SHARDING in db/database_utilities.py).
+
+To shard an existing database, or change the shard count, stop the API,
+set DB_SHARDS to the new count, run
+    python -m db.shards status       # users per database, and how many are misplaced
+    python -m db.shards rebalance
+and start the API with the same DB_SHARDS. When the count shrinks, shard files
+numbered DB_SHARDS or above are drained into the remaining ones and left empty
+for you to delete. Rows are copied to their new shard
+and committed before they are deleted from the old one, so an interrupted
+rebalance loses nothing and can simply be run again.
+"""
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import time
+
+# Every table keyed by user_id except users itself, which stays in the main file
+PER_USER_TABLES = (
+    "expenses", "budgets", "daily_category_totals", "user_data_versions",
+    "model_state_users", "model_state", "budget_status", "forecasts",
+)
+MOVE_BATCH = 500
+
+
+def stored_users(cursor) -> list:
+    """Users with any row in this database's per-user tables"""
+    union = " UNION ".join(f"SELECT user_id FROM {table}" for table in PER_USER_TABLES)
+    cursor.execute(f"SELECT user_id FROM ({union}) ORDER BY user_id")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def retired_databases() -> list:
+    """Shard files on disk that the current DB_SHARDS no longer uses (all of them when unsharded)"""
+    from db.database_utilities import DATABASE_NAME, SHARDS
+    root, ext = os.path.splitext(DATABASE_NAME)
+    ext = ext or ".db"
+    pattern = re.compile(re.escape(root) + r"\.shard(\d+)" + re.escape(ext) + "$")
+    found = []
+    for path in glob.glob(f"{glob.escape(root)}.shard*{ext}"):
+        match = pattern.match(path)
+        if match and int(match.group(1)) >= SHARDS:
+            found.append((int(match.group(1)), path))
+    return [path for _, path in sorted(found)]
+
+
+def source_databases() -> list:
+    """Every file that may hold per-user rows: the current layout plus retired shards"""
+    from db.database_utilities import all_databases
+    return all_databases() + retired_databases()
+
+
+def misplaced_users(database: str) -> dict:
+    """{target database: [user_id, ...]} for users stored in `database` but owned by another"""
+    from db.database_utilities import get_db, group_by_shard
+    with get_db(database) as conn:
+        groups = group_by_shard(stored_users(conn.cursor()))
+    groups.pop(database, None)
+    return groups
+
+
+def move_users(source: str, target: str, user_ids: list) -> int:
+    """Copy the users' rows from source to target, then delete them from source; returns rows moved"""
+    from db.database_utilities import CONNECTION_PRAGMAS
+    conn = sqlite3.connect(source)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    moved = 0
+    try:
+        conn.execute("ATTACH DATABASE ? AS target", (target,))
+        for i in range(0, len(user_ids), MOVE_BATCH):
+            batch = user_ids[i:i + MOVE_BATCH]
+            marks = ",".join("?" * len(batch))
+            with conn:
+                for table in PER_USER_TABLES:
+                    columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA main.table_info({table})"))
+                    moved += conn.execute(f"""
+                        INSERT OR REPLACE INTO target.{table} ({columns})
+                        SELECT {columns} FROM main.{table} WHERE user_id IN ({marks})
+                    """, batch).rowcount
+            with conn:
+                for table in PER_USER_TABLES:
+                    conn.execute(f"DELETE FROM main.{table} WHERE user_id IN ({marks})", batch)
+    finally:
+        conn.close()
+    return moved
+
+
+def rebalance(report=print) -> dict:
+    """Move every misplaced user to its shard; returns {"users": n, "rows": n, "seconds": s}"""
+    from db.database_utilities import close_pools, init_database
+    init_database()
+    close_pools()   # the moves use their own connections
+    started = time.perf_counter()
+    users = rows = 0
+    for source in source_databases():
+        for target, user_ids in misplaced_users(source).items():
+            moved = move_users(source, target, user_ids)
+            report(f"{source} -> {target}: {len(user_ids):,} users, {moved:,} rows")
+            users += len(user_ids)
+            rows += moved
+    close_pools()
+    return {"users": users, "rows": rows, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and rebalance user shards")
+    parser.add_argument("command", choices=["status", "rebalance"])
+    args = parser.parse_args()
+
+    from db.database_utilities import SHARDS, get_db, init_database
+    init_database()
+    if args.command == "status":
+        print(f"DB_SHARDS={SHARDS}")
+        for database in source_databases():
+            with get_db(database) as conn:
+                stored = len(stored_users(conn.cursor()))
+            misplaced = sum(len(ids) for ids in misplaced_users(database).values())
+            print(f"{database}\t{stored:,} users\t{misplaced:,} misplaced")
+        return
+    summary = rebalance()
+    print(f"Moved {summary['users']:,} users ({summary['rows']:,} rows) in {summary['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
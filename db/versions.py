@@ -0,0 +1,19 @@
+"""
+db/versions.py
+Per-user data versions: a counter bumped in the same transaction as every
+write to a user's expenses, so caches can key on (user, version) and never
+serve results computed from older data — across all API workers.
+"""
+
+def bump_data_version(cursor, user_id: str) -> int:
+    cursor.execute("""
+        INSERT INTO user_data_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+        RETURNING version
+    """, (user_id,))
+    return cursor.fetchone()[0]
+
+def get_data_version(cursor, user_id: str) -> int:
+    cursor.execute("SELECT version FROM user_data_versions WHERE user_id = ?", (user_id,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
@@ -1,23 +1,32 @@
-from fastapi import FastAPI
-from fastapi import APIRouter, FastAPI, HTTPException, status
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import APIRouter, FastAPI, HTTPException, Request, status
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field, EmailStr
 from typing import Annotated, Optional, List, Dict
 from datetime import datetime, date, timedelta
 from enum import Enum
 import uuid
+import os
+import sqlite3
 import statistics
+import time
 from collections import defaultdict
-from db.database_utilities import get_db, init_database
+from db.database_utilities import run_everywhere, init_database, pool_stats, close_pools
 from model.user_schema import UserCreate, UserResponse
 from model.expense_schema import ExpenseCreate, ExpenseResponse, ExpenseUpdate, ExpenseCategory,MonthlySummary,SpendingPattern
 from model.budget_schema import BudgetCreate, BudgetResponse, BudgetAlert
 from model.prediction_schema import WeeklyForecast, ExpensePrediction
 from ml.algorithms import predict_next_week_expenses, calculate_confidence, calculate_trend, calculate_volatility, moving_average
 from utils.helpers import row_to_dict, verify_user_exists, verify_expense_ownership
-from db.database_utilities import DATABASE_NAME
+from db.database_utilities import DATABASE_NAME, READ_REPLICAS
+from db.replicas import SYNC_SECONDS as REPLICA_SYNC_SECONDS, start_sync_thread
+from db.instrumentation import track_queries
+from db.row_counts import COUNTED_TABLES, get_row_counts
+from utils.cache import TTLCache
+from utils.fastjson import ORJSONResponse
+from utils.metrics import Counter, Histogram, render_all, render_gauges
+from utils.passwords import password_hash_stats
 
-app = FastAPI(title="Personal Expense Tracker API with ML", version="2.0.0")
+app = FastAPI(title="Personal Expense Tracker API with ML", version="2.0.0", default_response_class=ORJSONResponse)
 
 # ------------------------------------------------------------------
 from api.users import router as users_router
@@ -26,20 +35,64 @@ app.include_router(users_router)
 from api.expenses import router as expenses_router
 app.include_router(expenses_router)
 # ------------------------------------------------------------------
-from api.predictions import router as predictions_router
+from api.predictions import router as predictions_router, forecast_cache_stats
 app.include_router(predictions_router)
 # ------------------------------------------------------------------
 from api.budgets import router as budgets_router
 app.include_router(budgets_router)
 # ------------------------------------------------------------------
 
-from api.auth import auth_router
+from api.auth import auth_router, auth_cache_stats
 app.include_router(auth_router)
+# ------------------------------------------------------------------
+from api.dashboard import router as dashboard_router
+app.include_router(dashboard_router)
 
 # ==================== DATABASE CONNECTION ====================
 # Initialize database on startup
 init_database()
 
+# ==================== METRICS ====================
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to response headers per route", ("method", "route", "status"))
+HTTP_DB_QUERIES = Counter("http_db_queries_total", "SQL statements run while serving a route", ("route",))
+HTTP_DB_ROWS = Counter("http_db_rows_total", "Rows fetched while serving a route", ("route",))
+HTTP_DB_SECONDS = Counter("http_db_seconds_total", "SQL time spent while serving a route", ("route",))
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Latency per route template plus the request's query count, rows and SQL time"""
+    started = time.perf_counter()
+    with track_queries() as queries:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    HTTP_REQUEST_SECONDS.observe(elapsed, request.method, path, str(response.status_code))
+    HTTP_DB_QUERIES.inc(queries.queries, path)
+    HTTP_DB_ROWS.inc(queries.rows, path)
+    HTTP_DB_SECONDS.inc(queries.seconds, path)
+    response.headers["Server-Timing"] = (
+        f"db;dur={queries.seconds * 1000:.2f};desc=\"{queries.queries} queries, {queries.rows} rows\", "
+        f"app;dur={elapsed * 1000:.2f}"
+    )
+    return response
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition for this process"""
+    pools = [({"pool": name, "stat": stat}, value)
+             for name, stats in pool_stats().items() for stat, value in stats.items()]
+    cache_stats = {f"auth_{name}": stats for name, stats in auth_cache_stats().items()}
+    cache_stats["forecast"] = forecast_cache_stats()
+    caches = [({"cache": name, "stat": stat}, value)
+              for name, stats in cache_stats.items()
+              for stat, value in stats.items() if isinstance(value, (int, float))]
+    body = (render_all()
+            + render_gauges("db_pool", "Connection pool counters", pools)
+            + render_gauges("cache", "Cache counters", caches))
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 # ==================== ROOT ENDPOINT ====================
 @app.get("/")
 async def root():
@@ -47,27 +100,50 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) as count FROM users")
-        users_count = cursor.fetchone()["count"]
-        
-        cursor.execute("SELECT COUNT(*) as count FROM expenses")
-        expenses_count = cursor.fetchone()["count"]
-        
-        cursor.execute("SELECT COUNT(*) as count FROM budgets")
-        budgets_count = cursor.fetchone()["count"]
-    
+    """
+    Liveness/readiness probe: one trivial query per database file, no table scans.
+    Runs on the read executor and read-only connections to the primary files,
+    so it answers promptly even while writes and bulk imports hold the DB executor.
+    """
+    try:
+        await run_everywhere(lambda conn: conn.execute("SELECT 1").fetchone())
+    except sqlite3.Error as exc:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={
+            "status": "unavailable",
+            "database": "SQLite",
+            "error": str(exc),
+            "db_pool": pool_stats(),
+        })
     return {
         "status": "healthy",
         "database": "SQLite",
         "ml_enabled": True,
         "timestamp": datetime.now(),
-        "users_count": users_count,
-        "expenses_count": expenses_count,
-        "budgets_count": budgets_count
+        "db_pool": pool_stats(),
+    }
+
+# Row counts come from trigger-maintained counters; caching them as well keeps
+# frequent polling off the database entirely
+STATS_CACHE_TTL = float(os.environ.get("STATS_CACHE_TTL", "10"))
+_stats_cache = TTLCache(maxsize=1, ttl=STATS_CACHE_TTL)
+
+@app.get("/stats")
+async def service_stats():
+    """Row counts (summed over the main file and shards) plus pool and cache counters"""
+    counts = _stats_cache.get("counts")
+    if counts is None:
+        per_database = await run_everywhere(lambda conn: get_row_counts(conn.cursor()))
+        counts = {table: sum(c[table] for c in per_database.values()) for table in COUNTED_TABLES}
+        _stats_cache.set("counts", counts)
+    return {
+        "timestamp": datetime.now(),
+        "users_count": counts["users"],
+        "expenses_count": counts["expenses"],
+        "budgets_count": counts["budgets"],
+        "db_pool": pool_stats(),
+        "auth_cache": auth_cache_stats(),
+        "forecast_cache": forecast_cache_stats(),
+        "password_hashing": password_hash_stats(),
     }
 
 # ==================== STARTUP/SHUTDOWN EVENTS ====================
@@ -78,8 +154,15 @@ async def startup_event():
     print(f"📁 Database: {DATABASE_NAME}")
     print("🤖 ML Features: Enabled")
     print("📊 Prediction Models: Linear Regression, Moving Average, Exponential Smoothing")
+    if READ_REPLICAS:
+        print(f"📚 Read replicas: {', '.join(READ_REPLICAS)}")
+        if REPLICA_SYNC_SECONDS:
+            app.state.replica_sync = start_sync_thread(REPLICA_SYNC_SECONDS)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Run on application shutdown"""
     print("👋 Expense Tracker API Shutting Down")
+    if getattr(app.state, "replica_sync", None):
+        app.state.replica_sync.set()
+    close_pools()
@@ -1,6 +1,13 @@
 from typing import List, Dict
 from collections import defaultdict
 import statistics
+
+import numpy as np
+
+from ml.vectorized import (
+    predict_by_category, batch_forecast_total, batch_confidence, batch_trend, batch_volatility,
+)
+from utils.metrics import timed
 # ==================== ML HELPER FUNCTIONS ====================
 
 def simple_linear_regression(x_values: List[float], y_values: List[float]) -> tuple:
@@ -51,6 +58,7 @@ def exponential_smoothing(values: List[float], alpha: float = 0.3) -> float:
     
     return smoothed
 
+@timed
 def calculate_trend(values: List[float]) -> str:
     """Determine trend direction from historical data"""
     if len(values) < 2:
@@ -67,6 +75,7 @@ def calculate_trend(values: List[float]) -> str:
     else:
         return "stable"
 
+@timed
 def calculate_volatility(values: List[float]) -> str:
     """Calculate spending volatility"""
     if len(values) < 2:
@@ -90,41 +99,21 @@ def calculate_volatility(values: List[float]) -> str:
     except:
         return "low"
 
+@timed
 def predict_next_week_expenses(historical_data: List[Dict]) -> Dict[str, float]:
     """
-    Predict next week's expenses by category using multiple methods
+    Predict next week's expenses by category using multiple methods:
+    0.4 × moving average + 0.4 × exponential smoothing + 0.2 × linear
+    regression, evaluated for all categories as one NumPy batch
     """
-    predictions = {}
-    
     # Group by category
     category_data = defaultdict(list)
     for expense in historical_data:
         category_data[expense['category']].append(expense['amount'])
     
-    for category, amounts in category_data.items():
-        if not amounts:
-            predictions[category] = 0.0
-            continue
-        
-        # Method 1: Moving average (40% weight)
-        ma = moving_average(amounts, window=7)
-        
-        # Method 2: Exponential smoothing (40% weight)
-        es = exponential_smoothing(amounts, alpha=0.3)
-        
-        # Method 3: Linear regression prediction (20% weight)
-        x = list(range(len(amounts)))
-        slope, intercept = simple_linear_regression(x, amounts)
-        lr_pred = slope * len(amounts) + intercept
-        
-        # Weighted average of predictions
-        weighted_pred = (0.4 * ma + 0.4 * es + 0.2 * lr_pred)
-        
-        # Ensure non-negative prediction
-        predictions[category] = max(0, weighted_pred)
-    
-    return predictions
+    return predict_by_category(category_data)
 
+@timed
 def calculate_confidence(historical_data: List[float]) -> float:
     """Calculate prediction confidence based on data consistency"""
     if len(historical_data) < 2:
@@ -151,3 +140,26 @@ def calculate_confidence(historical_data: List[float]) -> float:
     except:
         return 0.5
 
+# ==================== DAILY SERIES MODELS ====================
+# Each row of `daily` is one category's dense, zero-filled daily spend
+# (see ml/timeseries.daily_matrix); every function scores all rows at once.
+
+def _full_lengths(daily: np.ndarray) -> np.ndarray:
+    return np.full(daily.shape[0], daily.shape[1], dtype=np.int64)
+
+@timed
+def predict_next_week_daily(daily: np.ndarray, horizon: int = 7) -> List[float]:
+    """Forecast total spend over the next `horizon` days for each row"""
+    return batch_forecast_total(daily, _full_lengths(daily), horizon).tolist()
+
+@timed
+def daily_confidence(daily: np.ndarray) -> List[float]:
+    return batch_confidence(daily, _full_lengths(daily)).tolist()
+
+@timed
+def daily_trend(daily: np.ndarray) -> List[str]:
+    return batch_trend(daily, _full_lengths(daily))
+
+@timed
+def daily_volatility(daily: np.ndarray) -> List[str]:
+    return batch_volatility(daily, _full_lengths(daily))
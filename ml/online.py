@@ -0,0 +1,61 @@
+"""
+ml/online.py
+Streaming forms of the daily-series models. Each category keeps sufficient
+statistics over its window — Σy, Σxy, Σy² and the exponential-smoothing
+level — which a single expense changes by a closed-form amount, so writes
+update the model in O(1) and forecasts never rescan the window.
+
+With x = 0..n-1 over the window, a, the smoothing factor:
+    level = Σ a(1-a)^(n-1-k) y_k
+and the seeded smoother of ml/vectorized.batch_exponential_smoothing is
+    level + (1-a)^n y_0
+Results match ml/vectorized on the same dense series up to rounding.
+"""
+from typing import List, Tuple
+import numpy as np
+
+from ml.vectorized import ensemble_total, confidence_from_cv, trend_labels
+from utils.metrics import timed
+
+ES_ALPHA = 0.3
+
+def es_weight(age: int, alpha: float = ES_ALPHA) -> float:
+    """Contribution to the level of one unit spent `age` days before the level's day"""
+    return alpha * (1 - alpha) ** age
+
+def regression_from_sums(n: int, sum_y: np.ndarray, sum_xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """OLS of y against x = 0..n-1 from Σy and Σxy; returns (slopes, intercepts)"""
+    y_mean = sum_y / n if n else np.zeros_like(sum_y)
+    x_mean = (n - 1) / 2
+    denominator = n * (n * n - 1) / 12     # Σ(x - x̄)²
+    if n < 2 or denominator == 0:
+        return np.zeros_like(sum_y), y_mean
+    slopes = (sum_xy - x_mean * sum_y) / denominator
+    return slopes, y_mean - slopes * x_mean
+
+def cv_from_sums(n: int, sum_y: np.ndarray, sum_yy: np.ndarray) -> np.ndarray:
+    """Sample coefficient of variation from Σy and Σy²; NaN where undefined"""
+    if n < 2:
+        return np.full(len(sum_y), np.nan)
+    mean = sum_y / n
+    variance = np.maximum(sum_yy - n * mean * mean, 0.0) / (n - 1)
+    return np.divide(np.sqrt(variance), mean, out=np.full(len(sum_y), np.nan), where=mean != 0)
+
+@timed
+def forecast_from_state(
+    n: int, sum_y: np.ndarray, sum_xy: np.ndarray, sum_yy: np.ndarray,
+    level: np.ndarray, first: np.ndarray, recent: np.ndarray, horizon: int = 7,
+) -> Tuple[List[float], List[float], List[str]]:
+    """
+    Forecast totals, confidence and trend per category from window statistics.
+    `first` is each category's spend on the window's first day and `recent`
+    holds (at least) its last 7 days; both only matter for short windows.
+    """
+    lengths = np.full(len(sum_y), n, dtype=np.int64)
+    window = min(7, n)
+    ma = recent[:, recent.shape[1] - window:].sum(axis=1) / window if window else np.zeros(len(sum_y))
+    es = level + (1 - ES_ALPHA) ** n * first
+    slopes, intercepts = regression_from_sums(n, sum_y, sum_xy)
+    totals = ensemble_total(ma, es, slopes, intercepts, lengths, horizon)
+    confidence = confidence_from_cv(cv_from_sums(n, sum_y, sum_yy), lengths)
+    return totals.tolist(), confidence.tolist(), trend_labels(slopes, lengths)
@@ -0,0 +1,52 @@
+"""
+ml/timeseries.py
+Time-series preparation: turn per-day totals (straight from the
+daily_category_totals rollup) into a dense category × day matrix, zero-filling
+days without spending, so models see calendar time instead of transaction
+order and the data moved from SQLite is O(days × categories).
+"""
+from datetime import date
+from typing import Iterable, List, Tuple
+import numpy as np
+
+DAILY_SERIES_SQL = """
+    SELECT category, day, total
+    FROM daily_category_totals
+    WHERE user_id = ? AND day >= ? AND day <= ?
+    ORDER BY day, category
+"""
+
+def daily_matrix(rows: Iterable, start: date, end: date) -> Tuple[List[str], np.ndarray]:
+    """
+    (category, day, total) rows → (categories, matrix) where matrix[i, j] is
+    the spend of categories[i] on start + j days. Categories keep the order in
+    which they first appear in `rows`.
+    """
+    rows = list(rows)
+    n_days = (end - start).days + 1
+    categories, index = [], {}
+    for row in rows:
+        if row[0] not in index:
+            index[row[0]] = len(categories)
+            categories.append(row[0])
+
+    matrix = np.zeros((len(categories), n_days), dtype=np.float64)
+    if rows:
+        cat_idx = np.fromiter((index[r[0]] for r in rows), dtype=np.int64, count=len(rows))
+        day_idx = (np.array([str(r[1]) for r in rows], dtype="datetime64[D]")
+                   - np.datetime64(start, "D")).astype(np.int64)
+        totals = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+        np.add.at(matrix, (cat_idx, day_idx), totals)
+    return categories, matrix
+
+def active_days(matrix: np.ndarray) -> int:
+    """Number of days on which anything was spent"""
+    return int((matrix.sum(axis=0) > 0).sum()) if matrix.size else 0
+
+def trim_leading_empty_days(matrix: np.ndarray) -> np.ndarray:
+    """
+    Drop the days before the first expense in any category, so a user who
+    started tracking mid-window isn't read as a jump up from zero
+    """
+    spent = np.flatnonzero(matrix.sum(axis=0) > 0) if matrix.size else []
+    return matrix[:, spent[0]:] if len(spent) else matrix
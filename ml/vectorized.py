@@ -0,0 +1,138 @@
+"""
+ml/vectorized.py
+NumPy versions of the forecasting helpers in ml/algorithms.py.
+
+Every function works on a batch: a 2-D float64 array with one series per
+row, left-aligned, plus the length of each row. Values past a row's length
+are ignored, so ragged series (categories of one user, or many users) can
+share one contiguous array. Results match the pure-Python functions up to
+floating-point summation order.
+"""
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+
+def as_batch(series: Sequence[Sequence[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack ragged series into a zero-padded (rows, max_len) array + lengths"""
+    lengths = np.fromiter((len(s) for s in series), dtype=np.int64, count=len(series))
+    values = np.zeros((len(series), int(lengths.max()) if len(series) else 0), dtype=np.float64)
+    for row, s in enumerate(series):
+        values[row, :len(s)] = s
+    return values, lengths
+
+def _mask(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    return np.arange(values.shape[1]) < lengths[:, None]
+
+def _tail(values: np.ndarray, lengths: np.ndarray, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Last `width` points of each row as (rows, width) + their positions (-1 = none)"""
+    width = max(0, min(width, values.shape[1]))
+    pos = lengths[:, None] - width + np.arange(width)
+    valid = pos >= 0
+    pos = np.where(valid, pos, -1)
+    tail = np.take_along_axis(values, np.maximum(pos, 0), axis=1) if width else values[:, :0]
+    return np.where(valid, tail, 0.0), pos
+
+def batch_moving_average(values: np.ndarray, lengths: np.ndarray, window: int = 7) -> np.ndarray:
+    """Mean of the last `window` points of each row (0 for empty rows)"""
+    tail, _ = _tail(values, lengths, window)
+    counts = np.minimum(lengths, window)
+    return np.divide(tail.sum(axis=1), counts, out=np.zeros(len(values)), where=counts > 0)
+
+def batch_exponential_smoothing(values: np.ndarray, lengths: np.ndarray, alpha: float = 0.3) -> np.ndarray:
+    """
+    Final smoothed level of each row, seeded with the row's first value.
+    Closed form of the recurrence: s = (1-a)^(n-1)*x0 + sum_k a*(1-a)^(n-1-k)*x_k.
+    Only the last points whose weight is still representable are read.
+    """
+    decay = 1 - alpha
+    if decay <= 0:
+        return np.where(lengths > 0, values[np.arange(len(values)), np.maximum(lengths - 1, 0)], 0.0)
+    horizon = int(np.log(np.finfo(np.float64).tiny) / np.log(decay)) + 1 if decay < 1 else values.shape[1]
+    tail, pos = _tail(values, lengths, horizon)
+    age = lengths[:, None] - 1 - pos
+    weights = np.where(pos > 0, alpha * decay ** np.where(pos > 0, age, 0), 0.0)
+    first = np.where(lengths > 0, values[:, 0] if values.shape[1] else 0.0, 0.0)
+    return (weights * tail).sum(axis=1) + decay ** np.maximum(lengths - 1, 0) * first
+
+def batch_linear_regression(values: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """OLS of each row against x = 0..n-1; returns (slopes, intercepts)"""
+    mask = _mask(values, lengths)
+    n = lengths.astype(np.float64)
+    safe_n = np.where(n > 0, n, 1.0)
+    y = np.where(mask, values, 0.0)
+    x_mean = (n - 1) / 2
+    y_mean = y.sum(axis=1) / safe_n
+    dx = np.where(mask, np.arange(values.shape[1]) - x_mean[:, None], 0.0)
+    numerator = (dx * (y - y_mean[:, None])).sum(axis=1)
+    denominator = (dx * dx).sum(axis=1)
+    ok = (lengths >= 2) & (denominator != 0)
+    slopes = np.divide(numerator, denominator, out=np.zeros(len(values)), where=ok)
+    intercepts = np.where(ok, y_mean - slopes * x_mean, y_mean)
+    return slopes, intercepts
+
+def batch_coefficient_of_variation(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Sample stdev / mean per row; NaN where it is undefined (n < 2 or mean 0)"""
+    mask = _mask(values, lengths)
+    n = lengths.astype(np.float64)
+    mean = np.where(mask, values, 0.0).sum(axis=1) / np.where(n > 0, n, 1.0)
+    sq = np.where(mask, (values - mean[:, None]) ** 2, 0.0).sum(axis=1)
+    std = np.sqrt(sq / np.where(n > 1, n - 1, 1.0))
+    ok = (lengths >= 2) & (mean != 0)
+    return np.divide(std, mean, out=np.full(len(values), np.nan), where=ok)
+
+def batch_volatility(values: np.ndarray, lengths: np.ndarray) -> List[str]:
+    """Volatility label per row, same thresholds as calculate_volatility"""
+    cv = batch_coefficient_of_variation(values, lengths)
+    labels = np.where(cv > 0.5, "high", np.where(cv > 0.25, "medium", "low"))
+    return labels.tolist()
+
+def trend_labels(slopes: np.ndarray, lengths: np.ndarray) -> List[str]:
+    """Same thresholds as calculate_trend"""
+    slopes = np.where(lengths >= 2, slopes, 0.0)
+    return np.where(slopes > 0.1, "increasing", np.where(slopes < -0.1, "decreasing", "stable")).tolist()
+
+def batch_trend(values: np.ndarray, lengths: np.ndarray) -> List[str]:
+    """Trend label per row, same thresholds as calculate_trend"""
+    slopes, _ = batch_linear_regression(values, lengths)
+    return trend_labels(slopes, lengths)
+
+def batch_predict_next(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Ensemble next-point forecast per row: 0.4*MA + 0.4*ES + 0.2*LR, floored at 0"""
+    ma = batch_moving_average(values, lengths, window=7)
+    es = batch_exponential_smoothing(values, lengths, alpha=0.3)
+    slopes, intercepts = batch_linear_regression(values, lengths)
+    lr = slopes * lengths + intercepts
+    prediction = np.maximum(0.0, 0.4 * ma + 0.4 * es + 0.2 * lr)
+    return np.where(lengths > 0, prediction, 0.0)
+
+def batch_forecast_total(values: np.ndarray, lengths: np.ndarray, horizon: int = 7) -> np.ndarray:
+    """
+    Ensemble total over the next `horizon` points of each row: MA and ES are
+    flat level forecasts, LR is summed along its line; floored at 0
+    """
+    ma = batch_moving_average(values, lengths, window=7)
+    es = batch_exponential_smoothing(values, lengths, alpha=0.3)
+    slopes, intercepts = batch_linear_regression(values, lengths)
+    return ensemble_total(ma, es, slopes, intercepts, lengths, horizon)
+
+def ensemble_total(ma, es, slopes, intercepts, lengths, horizon: int = 7) -> np.ndarray:
+    """Combine per-row model outputs into the forecast total over `horizon` points"""
+    steps = lengths[:, None] + np.arange(horizon)
+    lr = (slopes[:, None] * steps + intercepts[:, None]).sum(axis=1)
+    total = np.maximum(0.0, 0.4 * horizon * ma + 0.4 * horizon * es + 0.2 * lr)
+    return np.where(lengths > 0, total, 0.0)
+
+def batch_confidence(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Same scoring as calculate_confidence, per row"""
+    return confidence_from_cv(batch_coefficient_of_variation(values, lengths), lengths)
+
+def confidence_from_cv(cv: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    confidence = np.clip(1.0 - np.nan_to_num(cv), 0.3, 1.0) * np.minimum(1.0, lengths / 30)
+    confidence = np.where(np.isnan(cv), 0.5, np.round(confidence, 2))
+    return np.where(lengths < 2, 0.3, confidence)
+
+def predict_by_category(category_data: Dict[str, List[float]]) -> Dict[str, float]:
+    """Run batch_predict_next over every category of a user at once"""
+    if not category_data:
+        return {}
+    values, lengths = as_batch(list(category_data.values()))
+    return dict(zip(category_data, batch_predict_next(values, lengths).tolist()))
@@ -35,6 +35,15 @@ class ExpenseResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class BulkRowError(BaseModel):
+    row: int            # 1-based position in the upload (data rows only)
+    errors: list[str]
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: list[BulkRowError]
+
 class MonthlySummary(BaseModel):
     month: int
     year: int
@@ -0,0 +1,55 @@
+"""
+Shared fixtures: a fresh database file per test, and API clients logged in
+as newly registered users.
+
+`client` registers and logs in as `username` ("tester" unless a test module
+overrides the `username` fixture or parametrizes it).
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from db import database_utilities
+
+PASSWORD = "secret123"
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Path of an initialised, empty database; pools are closed afterwards"""
+    monkeypatch.setattr(database_utilities, "DATABASE_NAME", str(tmp_path / "test.db"))
+    database_utilities.init_database()
+    yield database_utilities.DATABASE_NAME
+    database_utilities.close_pools()
+
+
+@pytest.fixture
+def app(database):
+    import main_ml
+    main_ml._stats_cache.clear()
+    return main_ml.app
+
+
+@pytest.fixture
+def register(app):
+    """register(username) -> Authorization headers for a new, logged-in user"""
+    client = TestClient(app)
+
+    def register(username: str, password: str = PASSWORD) -> dict:
+        client.post("/users/register", json={
+            "username": username, "email": f"{username}@example.com", "password": password})
+        response = client.post("/auth/login", data={"username": username, "password": password})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return register
+
+
+@pytest.fixture
+def username():
+    return "tester"
+
+
+@pytest.fixture
+def client(app, register, username):
+    client = TestClient(app)
+    client.headers.update(register(username))
+    return client
@@ -0,0 +1,62 @@
+"""
+Cached tokens and users: a cache hit still honours token expiry, and a
+change to the users row is visible once the user is invalidated.
+Run with: python -m pytest test/test_auth_cache.py
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from api import auth
+from db import database_utilities
+
+
+class Later(datetime):
+    """datetime whose utcnow() is two days ahead, past the token lifetime"""
+
+    @classmethod
+    def utcnow(cls):
+        return datetime.utcnow() + timedelta(days=2)
+
+
+def token_of(client) -> str:
+    return client.headers["Authorization"].split(" ", 1)[1]
+
+
+def set_full_name(user_id, full_name):
+    with sqlite3.connect(database_utilities.DATABASE_NAME) as conn:
+        conn.execute("UPDATE users SET full_name = ? WHERE user_id = ?", (full_name, user_id))
+
+
+def test_cache_hit_rejects_an_expired_token(client, monkeypatch):
+    token = token_of(client)
+    assert client.get("/auth/me").status_code == 200
+    assert auth._token_cache.get(token) is not None
+
+    monkeypatch.setattr(auth, "datetime", Later)
+    with pytest.raises(HTTPException) as error:
+        auth.verify_token(token)
+    assert error.value.status_code == 401
+    assert auth._token_cache.get(token) is None
+    assert client.get("/auth/me").status_code == 401
+
+
+def test_user_changes_are_visible_after_invalidation(client):
+    me = client.get("/auth/me").json()
+    set_full_name(me["user_id"], "Renamed")
+    # Still served from the cache until the row's writer invalidates it
+    assert client.get("/auth/me").json()["full_name"] == me["full_name"]
+
+    auth.invalidate_user(me["user_id"])
+    assert client.get("/auth/me").json()["full_name"] == "Renamed"
+
+
+def test_password_rehash_invalidates_the_cached_user(client, monkeypatch):
+    user_id = client.get("/auth/me").json()["user_id"]
+    assert auth._user_cache.get(user_id) is not None
+
+    monkeypatch.setattr(auth, "needs_rehash", lambda stored: True)
+    assert client.post("/auth/login", data={"username": "tester", "password": "secret123"}).status_code == 200
+    assert auth._user_cache.get(user_id) is None
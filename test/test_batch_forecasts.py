@@ -0,0 +1,65 @@
+"""
+Run with: python -m pytest test/test_batch_forecasts.py
+"""
+import asyncio
+import json
+import random
+import sqlite3
+import uuid
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import batch_forecasts
+from db import database_utilities
+from db.rollups import rebuild_daily_totals
+from api.predictions import compute_next_week
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def seeded(tmp_path, monkeypatch):
+    path = str(tmp_path / "batch.db")
+    monkeypatch.setattr(database_utilities, "DATABASE_NAME", path)
+    database_utilities.init_database()
+    rng = random.Random(3)
+    now = datetime.now()
+    users = sorted(str(uuid.uuid4()) for _ in range(5))
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO users (user_id, username, email, password, created_at) VALUES (?,?,?,?,?)",
+                     [(u, f"user{i}", f"user{i}@example.com", "x", now) for i, u in enumerate(users)])
+    for i, user_id in enumerate(users[:4]):
+        days = 120 if i else 3   # the first user has too little history for a forecast
+        conn.executemany("INSERT INTO expenses VALUES (?,?,?,?,?,?,?,?)", [
+            (str(uuid.uuid4()), user_id, round(rng.uniform(1, 90), 2), rng.choice(["food", "bills", "travel"]),
+             "x", str(TODAY - timedelta(days=rng.randrange(days))), now, now)
+            for _ in range(150)
+        ])
+    conn.execute("INSERT INTO budgets VALUES (?,?,?,?,?)", (str(uuid.uuid4()), users[1], "food", 300.0, now))
+    rebuild_daily_totals(conn.cursor())
+    conn.commit()
+    yield conn, users
+    conn.close()
+    database_utilities.close_pools()
+
+
+def test_batch_matches_api_and_resumes(seeded):
+    conn, users = seeded
+    lines = []
+    first = batch_forecasts.run_batch(TODAY, workers=1, chunk_size=2, max_chunks=1, report=lines.append)
+    assert first["processed"] == 2
+    rest = batch_forecasts.run_batch(TODAY, workers=2, chunk_size=2, report=lines.append)
+    assert rest["scored_this_run"] == 3 and rest["processed"] == 5
+    assert lines[-1].endswith("users/s")
+
+    stored = {r[0]: r[1:] for r in conn.execute(
+        "SELECT user_id, forecast, alerts FROM forecasts WHERE run_date = ?", (str(TODAY),))}
+    assert set(stored) == set(users)
+    assert stored[users[0]][0] is None and stored[users[4]] == (None, "[]")
+
+    for user_id in users[1:4]:
+        api = asyncio.run(compute_next_week(user_id, TODAY))
+        batch = json.loads(stored[user_id][0])
+        assert batch == json.loads(api.model_dump_json())
+    assert json.loads(stored[users[1]][1])[0]["category"] == "food"
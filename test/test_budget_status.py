@@ -0,0 +1,81 @@
+"""
+budget_status snapshots must agree with a recompute from the rollup.
+Run with: python -m pytest test/test_budget_status.py
+"""
+import random
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from db import database_utilities, rollups
+from db.budget_status import (
+    BUDGET_SPEND_SQL, budget_spend_params, load_budget_status, budgets_crossed_on,
+)
+
+
+class FakeDate(date):
+    current = date(2024, 1, 25)
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+
+@pytest.fixture
+def cursor(tmp_path, monkeypatch):
+    path = str(tmp_path / "budgets.db")
+    monkeypatch.setattr(database_utilities, "DATABASE_NAME", path)
+    database_utilities.init_database()
+    monkeypatch.setattr(rollups, "date", FakeDate)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    for category, limit in (("food", 400.0), ("bills", 250.0)):
+        conn.execute("INSERT INTO budgets VALUES (?, 'u', ?, ?, ?)", (category, category, limit, datetime.now()))
+    yield conn.cursor()
+    conn.close()
+
+
+def snapshot(cursor, today):
+    return {r["category"]: (round(r["month_to_date"], 6), round(r["recent_avg"], 6))
+            for r in load_budget_status(cursor, "u", today)}
+
+
+def recompute(cursor, today):
+    return {r["category"]: (round(r["month_to_date"], 6), round(r["recent_avg"], 6))
+            for r in cursor.execute(BUDGET_SPEND_SQL, budget_spend_params("u", today)).fetchall()}
+
+
+def test_writes_keep_snapshots_current_across_days_and_months(cursor):
+    rng = random.Random(9)
+    crossings = {}
+    live = []
+    for step in range(300):
+        if step % 25 == 0:
+            FakeDate.current += timedelta(days=rng.choice([1, 3]))
+            snapshot(cursor, FakeDate.current)   # a read opens the new day
+        today = FakeDate.current
+        before = {r["category"]: r["month_to_date"] for r in load_budget_status(cursor, "u", today)}
+        if rng.random() < 0.75 or not live:
+            expense = (rng.choice(["food", "bills", "travel"]), today - timedelta(days=rng.choice([0, 0, 2, 9, 40])),
+                       round(rng.uniform(1, 40), 2))
+            rollups.apply_expense_delta(cursor, "u", *expense)
+            live.append(expense)
+        else:
+            category, day, amount = live.pop(rng.randrange(len(live)))
+            rollups.apply_expense_delta(cursor, "u", category, day, -amount, -1)
+        for row in cursor.execute("SELECT category, spent, monthly_limit FROM budget_status WHERE month = ?",
+                                  (today.strftime("%Y-%m"),)):
+            crossed = row["spent"] >= 0.9 * row["monthly_limit"]
+            if crossed and before.get(row["category"], 0) < 0.9 * row["monthly_limit"]:
+                crossings[(row["category"], today.strftime("%Y-%m"))] = today
+
+        # Writes alone must keep the snapshot exact, without a refresh
+        stored = {r["category"]: (round(r["spent"], 6), round(r["trailing"] / 7, 6)) for r in cursor.execute(
+            "SELECT * FROM budget_status WHERE month = ? AND as_of = ?", (today.strftime("%Y-%m"), str(today)))}
+        assert stored == recompute(cursor, today)
+
+    assert crossings, "the random walk should cross a threshold"
+    for (category, month), day in crossings.items():
+        if month == FakeDate.current.strftime("%Y-%m"):
+            assert any(r["category"] == category for r in budgets_crossed_on(cursor, day)), (category, day)
@@ -0,0 +1,66 @@
+"""
+Concurrent updates and deletes of the same expense keep the daily rollup and
+budget snapshots equal to the expenses table.
+Run with: python -m pytest test/test_concurrent_writes.py
+"""
+import asyncio
+import sqlite3
+from datetime import date
+
+import httpx
+
+from db import database_utilities
+
+TODAY = date.today()
+
+
+def totals(database):
+    with sqlite3.connect(database) as conn:
+        expenses = conn.execute("SELECT COUNT(*), ROUND(COALESCE(SUM(amount), 0), 2) FROM expenses").fetchone()
+        rollup = conn.execute(
+            "SELECT COALESCE(SUM(count), 0), ROUND(COALESCE(SUM(total), 0), 2) FROM daily_category_totals").fetchone()
+        by_category = dict(conn.execute("""
+            SELECT category, ROUND(SUM(amount), 2) FROM expenses WHERE date >= ? GROUP BY category
+        """, (str(TODAY.replace(day=1)),)))
+        snapshots = dict(conn.execute("SELECT category, ROUND(spent, 2) FROM budget_status"))
+    return expenses, rollup, by_category, snapshots
+
+
+async def hammer(app, headers, rounds: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+        for n in range(rounds):
+            created = []
+            for amount in (10, 20):
+                response = await client.post("/expenses", json={
+                    "amount": amount, "category": "food", "description": "x", "date": str(TODAY)})
+                created.append(response.json()["expense_id"])
+            doomed, edited = created
+            await asyncio.gather(
+                *(client.delete(f"/expenses/{doomed}") for _ in range(concurrency)),
+                *(client.put(f"/expenses/{edited}", json={"amount": 1 + i, "category": ["food", "bills"][i % 2]})
+                  for i in range(concurrency)),
+                client.delete(f"/expenses/{edited}") if n % 3 == 0 else asyncio.sleep(0),
+            )
+
+
+def test_concurrent_deletes_and_updates_keep_rollups_exact(app, client):
+    client.post("/budgets", json={"category": "food", "monthly_limit": 500})
+    client.post("/budgets", json={"category": "bills", "monthly_limit": 500})
+    client.get("/budgets/alerts")   # materialise the snapshots
+
+    asyncio.run(hammer(app, dict(client.headers), rounds=40, concurrency=8))
+
+    (count, total), rollup, by_category, snapshots = totals(database_utilities.DATABASE_NAME)
+    assert count > 0
+    assert rollup == (count, total)
+    assert {c: snapshots.get(c, 0.0) for c in by_category} == by_category
+
+
+def test_update_response_matches_the_stored_row(client):
+    expense_id = client.post("/expenses", json={
+        "amount": 10, "category": "food", "description": "x", "date": str(TODAY)}).json()["expense_id"]
+    updated = client.put(f"/expenses/{expense_id}", json={"amount": 7})
+    assert updated.status_code == 200
+    assert updated.json() == client.get(f"/expenses/{expense_id}").json()
+    assert updated.json()["amount"] == 7.0 and isinstance(updated.json()["amount"], float)
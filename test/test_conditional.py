@@ -0,0 +1,75 @@
+"""
+Read endpoints answer If-None-Match with 304 until the user's data changes.
+Run with: python -m pytest test/test_conditional.py
+"""
+import re
+from datetime import date, timedelta
+
+import pytest
+
+
+TODAY = date.today()
+ENDPOINTS = [
+    ("/expenses", None),
+    ("/expenses", {"limit": 2}),
+    ("/expenses", {"format": "ndjson"}),
+    ("/expenses/summary/monthly", {"month": TODAY.month, "year": TODAY.year}),
+    ("/expenses/summary/category", None),
+    ("/budgets", None),
+    ("/budgets/alerts", None),
+    ("/predictions/next-week", None),
+    ("/predictions/patterns", None),
+]
+
+
+@pytest.fixture
+def client(client):
+    for age in range(20):
+        client.post("/expenses", json={"amount": 5 + age, "category": "food", "description": "x",
+                                       "date": str(TODAY - timedelta(days=age))})
+    client.post("/budgets", json={"category": "food", "monthly_limit": 100})
+    return client
+
+
+def db_queries(response) -> int:
+    return int(re.search(r'desc="(\d+) queries', response.headers["Server-Timing"]).group(1))
+
+
+@pytest.mark.parametrize("path,params", ENDPOINTS)
+def test_not_modified_until_a_write(client, path, params):
+    first = client.get(path, params=params)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    unchanged = client.get(path, params=params, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.content == b""
+    assert unchanged.headers["ETag"] == etag
+    # Token check plus the version read; no expense query runs
+    assert db_queries(unchanged) <= 2
+
+    client.post("/expenses", json={"amount": 1, "category": "bills", "description": "y", "date": str(TODAY)})
+    changed = client.get(path, params=params, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+
+def test_etag_depends_on_query(client):
+    a = client.get("/expenses", params={"limit": 2}).headers["ETag"]
+    b = client.get("/expenses", params={"limit": 3}).headers["ETag"]
+    assert a != b
+    assert client.get("/expenses", params={"limit": 3}, headers={"If-None-Match": a}).status_code == 200
+
+
+def test_every_write_invalidates(client):
+    etag = client.get("/expenses").headers["ETag"]
+    expense_id = client.get("/expenses", params={"limit": 1}).json()[0]["expense_id"]
+    writes = [
+        lambda: client.put(f"/expenses/{expense_id}", json={"amount": 42}),
+        lambda: client.delete(f"/expenses/{expense_id}"),
+        lambda: client.post("/budgets", json={"category": "travel", "monthly_limit": 50}),
+    ]
+    for write in writes:
+        assert write().status_code < 300
+        response = client.get("/expenses", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
@@ -0,0 +1,44 @@
+"""
+/dashboard must agree with the endpoints it replaces, and honour If-None-Match.
+Run with: python -m pytest test/test_dashboard.py
+"""
+import random
+from datetime import date, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def username():
+    return "dash"
+
+
+def test_dashboard_matches_endpoints_and_revalidates(client):
+    rng = random.Random(11)
+    today = date.today()
+    for age in range(100, -2, -1):
+        for _ in range(rng.randrange(3)):
+            client.post("/expenses", json={
+                "amount": round(rng.uniform(1, 80), 2), "category": rng.choice(["food", "bills", "travel"]),
+                "description": "x", "date": str(today - timedelta(days=age))})
+    for category, limit in (("travel", 60), ("food", 400)):
+        client.post("/budgets", json={"category": category, "monthly_limit": limit})
+
+    response = client.get("/dashboard")
+    data = response.json()
+    by_category = lambda items: sorted(items, key=lambda item: item["category"])
+    assert data["forecast"] == client.get("/predictions/next-week").json()
+    assert data["patterns"] == client.get("/predictions/patterns").json()
+    assert data["monthly_summary"] == client.get(
+        "/expenses/summary/monthly", params={"month": today.month, "year": today.year}).json()
+    assert data["budget_alerts"] == by_category(client.get("/budgets/alerts").json())
+    assert data["budgets"] == by_category(client.get("/budgets").json())
+    assert data["recent_expenses"] == client.get("/expenses", params={"limit": 8}).json()
+    assert data["user"] == client.get("/auth/me").json()
+
+    etag = response.headers["ETag"]
+    unchanged = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.content == b""
+    client.post("/budgets", json={"category": "other", "monthly_limit": 10})
+    changed = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
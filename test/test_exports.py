@@ -0,0 +1,68 @@
+"""
+Run with: python -m pytest test/test_exports.py
+"""
+import asyncio
+import csv
+import io
+import json
+
+from db import database_utilities
+from utils.exports import csv_chunks, ndjson_chunks
+
+
+async def batches_of(rows, size):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def collect(gen):
+    async def run():
+        return [chunk async for chunk in gen]
+    return asyncio.run(run())
+
+
+def test_csv_and_ndjson_emit_one_chunk_per_batch():
+    rows = [("a", 1.5, "x, with comma"), ("b", 2.0, 'quote "q"'), ("c", 3.0, "z")]
+    chunks = collect(csv_chunks(("id", "amount", "note"), batches_of(rows, 2)))
+    assert len(chunks) == 2
+    assert list(csv.reader(io.StringIO("".join(chunks)))) == [["id", "amount", "note"]] + [
+        [r[0], str(r[1]), r[2]] for r in rows]
+
+    chunks = collect(ndjson_chunks(("id", "amount", "note"), batches_of(rows, 2)))
+    assert [json.loads(line)["note"] for line in "".join(chunks).splitlines()] == [r[2] for r in rows]
+
+
+def test_timestamps_are_iso_like_the_list_endpoint(client):
+    client.post("/expenses", json={"amount": 5, "category": "food", "description": "x", "date": "2024-03-01"})
+    listed = client.get("/expenses").json()[0]
+    assert "T" in listed["created_at"]
+
+    columns = ("expense_id", "created_at", "updated_at")
+    rows = [(listed["expense_id"], listed["created_at"].replace("T", " "), listed["updated_at"].replace("T", " "))]
+    csv_rows = list(csv.DictReader(io.StringIO("".join(collect(csv_chunks(columns, batches_of(rows, 1)))))))
+    ndjson_rows = [json.loads(line) for line in "".join(collect(ndjson_chunks(columns, batches_of(rows, 1)))).splitlines()]
+    for exported in csv_rows + ndjson_rows:
+        assert (exported["created_at"], exported["updated_at"]) == (listed["created_at"], listed["updated_at"])
+
+    exported = client.get("/expenses/export", params={"format": "csv"})
+    assert exported.status_code == 200
+    row = next(csv.DictReader(io.StringIO(exported.text)))
+    assert (row["created_at"], row["updated_at"]) == (listed["created_at"], listed["updated_at"])
+
+
+def test_stream_query_returns_connection_when_closed_early(tmp_path, monkeypatch):
+    monkeypatch.setattr(database_utilities, "DATABASE_NAME", str(tmp_path / "stream.db"))
+    with database_utilities.get_db() as conn:
+        conn.execute("CREATE TABLE t (n INTEGER)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    pool = database_utilities.get_pool(readonly=True)
+
+    async def first_batch():
+        stream = database_utilities.stream_query("SELECT n FROM t ORDER BY n", batch_size=4)
+        async for rows in stream:
+            await stream.aclose()
+            return [r[0] for r in rows]
+
+    assert asyncio.run(first_batch()) == [0, 1, 2, 3]
+    assert pool.stats()["idle"] == pool.stats()["size"] == 1
+    pool.close()
@@ -0,0 +1,27 @@
+"""
+Trusted-row encoding must produce what the pydantic response models produce.
+Run with: python -m pytest test/test_fastjson.py
+"""
+import json
+import sqlite3
+from datetime import date, datetime
+
+from api.expenses import EXPENSE_COLUMNS, EXPENSE_SELECT, EXPENSE_TIMESTAMPS
+from model.expense_schema import ExpenseResponse
+from utils.fastjson import encode_rows, encode_rows_ndjson
+
+
+def test_expense_rows_match_response_model():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(f"CREATE TABLE expenses ({EXPENSE_SELECT})")
+    conn.executemany("INSERT INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+        ("e1", "u", 12.5, "food", 'lunch "café"', date(2024, 1, 5),
+         datetime(2024, 1, 5, 12, 30, 1, 250), datetime(2024, 1, 6, 8, 0)),
+        ("e2", "u", 3.0, "bills", "x", "2024-02-29", str(datetime(2024, 3, 1, 0, 0, 0)), str(datetime(2024, 3, 1, 0, 0, 0, 500000))),
+    ])
+    rows = conn.execute(f"SELECT {EXPENSE_SELECT} FROM expenses").fetchall()
+    expected = [ExpenseResponse(**dict(zip(EXPENSE_COLUMNS, r))).model_dump(mode="json") for r in rows]
+
+    assert json.loads(encode_rows(rows, EXPENSE_COLUMNS, EXPENSE_TIMESTAMPS)) == expected
+    lines = encode_rows_ndjson(rows, EXPENSE_COLUMNS, EXPENSE_TIMESTAMPS).decode().splitlines()
+    assert [json.loads(line) for line in lines] == expected
@@ -0,0 +1,125 @@
+"""
+Forecast response cache: the weight-bounded LRU it is built on, and how
+writes, midnight and the counters show up through the API.
+Run with: python -m pytest test/test_forecast_cache.py
+"""
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from api import predictions
+from utils import cache as cache_module
+from utils.cache import TTLCache
+from utils.helpers import seconds_until_midnight
+
+TODAY = date.today()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+@pytest.fixture
+def client(client, monkeypatch):
+    # A fresh cache per test, so the counters start at zero
+    old = predictions._forecast_cache
+    monkeypatch.setattr(predictions, "_forecast_cache",
+                        TTLCache(maxsize=old.maxsize, max_weight=old.max_weight, weigher=old.weigher))
+    for age in range(14):
+        client.post("/expenses", json={"amount": 5 + age, "category": "food", "description": "x",
+                                       "date": str(TODAY - timedelta(days=age))})
+    return client
+
+
+def counters() -> tuple:
+    stats = predictions.forecast_cache_stats()
+    return stats["hits"], stats["misses"]
+
+
+def test_evicts_least_recently_used_by_count():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1          # "b" is now the oldest
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1 and len(cache) == 2
+
+
+def test_evicts_by_total_weight():
+    cache = TTLCache(maxsize=100, max_weight=10, weigher=len)
+    cache.set("a", b"xxxx")
+    cache.set("b", b"yyyy")
+    cache.set("c", b"zzzz")
+    assert cache.get("a") is None and cache.weight == 8
+    cache.set("b", b"y")                # replacing an entry re-weighs it
+    assert cache.weight == 5
+    # A single entry over the limit is kept rather than emptying the cache
+    cache.set("big", b"w" * 50)
+    assert len(cache) == 1 and cache.get("big") == b"w" * 50
+    assert cache.stats()["evictions"] == 3
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TTLCache(ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=5)
+    clock.now += 10
+    assert cache.get("b") is None and cache.get("a") == 1
+    clock.now += 60
+    assert cache.get("a") is None and len(cache) == 0
+
+
+def test_ttl_runs_to_midnight():
+    assert seconds_until_midnight(datetime.combine(TODAY, datetime.min.time()).replace(hour=23, minute=59, second=30)) == 30
+    assert seconds_until_midnight(datetime.combine(TODAY, datetime.max.time())) == 1.0
+
+
+def test_repeat_forecast_is_a_cache_hit(client):
+    first = client.get("/predictions/next-week")
+    assert first.status_code == 200
+    assert counters() == (0, 1)
+    assert client.get("/predictions/next-week").content == first.content
+    assert counters() == (1, 1)
+    stats = predictions.forecast_cache_stats()
+    assert stats["size"] == 1 and stats["weight"] == len(first.content) and stats["hit_rate"] == 0.5
+
+
+def test_write_bumps_the_version_and_misses(client):
+    client.get("/predictions/next-week")
+    client.post("/expenses", json={"amount": 500, "category": "food", "description": "y", "date": str(TODAY)})
+    response = client.get("/predictions/next-week")
+    assert response.status_code == 200
+    assert counters() == (0, 2)
+    assert predictions.forecast_cache_stats()["size"] == 2   # the stale version ages out at midnight
+
+
+def test_forecast_expires_at_midnight(client, clock, monkeypatch):
+    monkeypatch.setattr(predictions, "seconds_until_midnight", lambda: 30)
+    client.get("/predictions/patterns")
+    clock.now += 29
+    client.get("/predictions/patterns")
+    assert counters() == (1, 1)
+    clock.now += 2
+    client.get("/predictions/patterns")
+    assert counters() == (1, 2)
+
+
+def test_stats_are_reported_by_the_api(client):
+    client.get("/predictions/next-week")
+    client.get("/predictions/next-week")
+    stats = client.get("/stats").json()["forecast_cache"]
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (1, 1, 0, 1)
+    assert 'cache="forecast",stat="hits"} 1' in client.get("/metrics").text
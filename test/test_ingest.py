@@ -0,0 +1,92 @@
+"""
+Run with: python -m pytest test/test_ingest.py
+"""
+import asyncio
+import json
+
+import pytest
+
+from api import expenses
+from utils.ingest import iter_csv, iter_json_array, iter_ndjson, detect_format
+from api.expenses import validate_expense_chunk
+
+
+def parse(parser, data: bytes, size: int):
+    async def chunks():
+        for i in range(0, len(data), size):
+            yield data[i:i + size]
+
+    async def collect():
+        return [r async for r in parser(chunks())]
+    return asyncio.run(collect())
+
+
+def test_csv_quoted_newlines_survive_any_chunking():
+    data = 'amount,category,description,date\n3,food,"two\nlines, quoted",2024-01-02\n4,travel,x,\n'.encode()
+    expected = [{"amount": "3", "category": "food", "description": "two\nlines, quoted", "date": "2024-01-02"},
+                {"amount": "4", "category": "travel", "description": "x"}]
+    for size in (1, 3, 7, len(data)):
+        assert parse(iter_csv, data, size) == expected
+
+
+def test_ndjson_reports_bad_lines_and_validation_row_numbers():
+    data = b'{"amount": 1, "category": "food", "description": "a"}\n\n{oops\n{"amount": -2, "category": "food", "description": "b"}'
+    records = parse(iter_ndjson, data, 5)
+    assert len(records) == 3 and isinstance(records[1], ValueError)
+
+    valid, failures = validate_expense_chunk(records, first_row=11)
+    assert [e.amount for e in valid] == [1.0]
+    assert sorted(failures) == [12, 13]
+    assert failures[13] == ["amount: Input should be greater than 0"]
+
+
+def test_detect_format():
+    assert detect_format("text/csv; charset=utf-8") == "csv"
+    assert detect_format("application/octet-stream", "history.jsonl") == "ndjson"
+    assert detect_format("application/json") == "json"
+
+
+def test_json_array_is_decoded_incrementally():
+    records = [{"amount": n + 1, "category": "food", "description": "a],{" * n} for n in range(12)] + [12345]
+    data = json.dumps(records).encode()
+    for size in (1, 2, 5, len(data)):
+        assert parse(iter_json_array, data, size) == records
+    assert parse(iter_json_array, b" [ ] ", 1) == [] and parse(iter_json_array, b"", 1) == []
+
+
+def test_json_array_yields_before_the_body_ends():
+    async def chunks():
+        yield b'[{"amount": 1}, '
+        raise AssertionError("read past the first element")
+
+    async def first():
+        async for record in iter_json_array(chunks()):
+            return record
+    assert asyncio.run(first()) == {"amount": 1}
+
+
+@pytest.mark.parametrize("data", [b'{"amount": 1}', b"[1, 2", b"[1 2]", b"[1,]", b"[] []"])
+def test_json_array_rejects_malformed_bodies(data):
+    with pytest.raises(ValueError):
+        parse(iter_json_array, data, 2)
+
+
+@pytest.mark.parametrize("fmt,body", [
+    ("json", json.dumps([{"amount": 1, "category": "food", "description": "x" * 50}] * 40).encode()),
+    ("csv", b'amount,category,description\n1,food,"never closed\n' + b"2,food,x\n" * 200),
+])
+def test_bulk_upload_over_the_byte_limit_is_rejected(client, monkeypatch, fmt, body):
+    monkeypatch.setattr(expenses, "BULK_MAX_BYTES", 1000)
+
+    def streamed():
+        for i in range(0, len(body), 100):
+            yield body[i:i + 100]
+
+    # No Content-Length: the limit is enforced while the stream is read
+    response = client.post(f"/expenses/bulk?format={fmt}", content=streamed())
+    assert response.status_code == 413
+    assert client.post(f"/expenses/bulk?format={fmt}", content=body).status_code == 413
+    assert client.get("/expenses").json() == []
+
+    monkeypatch.setattr(expenses, "BULK_MAX_BYTES", len(body))
+    assert client.post(f"/expenses/bulk?format={fmt}", content=body).status_code != 413
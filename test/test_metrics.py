@@ -0,0 +1,60 @@
+"""
+Run with: python -m pytest test/test_metrics.py
+"""
+import contextvars
+import sqlite3
+import sys
+import threading
+
+from db.instrumentation import InstrumentedConnection, _record, track_queries
+from utils.metrics import Histogram, render_all
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = Histogram("test_latency_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        hist.observe(value, '/a"b')
+    lines = [l for l in render_all().splitlines() if l.startswith("test_latency_seconds")]
+    assert lines == [
+        'test_latency_seconds_bucket{route="/a\\"b",le="0.1"} 1',
+        'test_latency_seconds_bucket{route="/a\\"b",le="1.0"} 2',
+        'test_latency_seconds_bucket{route="/a\\"b",le="+Inf"} 3',
+        'test_latency_seconds_sum{route="/a\\"b"} 5.55',
+        'test_latency_seconds_count{route="/a\\"b"} 3',
+    ]
+
+
+def test_connection_counts_queries_and_rows():
+    conn = sqlite3.connect(":memory:", factory=InstrumentedConnection)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    with track_queries() as stats:
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+        assert len(conn.execute("SELECT x FROM t").fetchall()) == 10
+        cursor = conn.cursor()
+        cursor.execute("SELECT x FROM t WHERE x < 4")
+        assert sum(1 for _ in cursor) == 4
+        assert cursor.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 10
+    assert (stats.queries, stats.rows) == (4, 15)
+    assert stats.seconds > 0
+    conn.close()
+
+
+
+def test_stats_shared_across_threads_lose_no_updates():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)   # switch threads as often as possible
+    try:
+        with track_queries() as stats:
+            def work():
+                for _ in range(20000):
+                    _record(None, 0.001, 2, True)
+
+            # Each thread runs in a copy of this context, as run_everywhere's workers do
+            threads = [threading.Thread(target=contextvars.copy_context().run, args=(work,)) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert (stats.queries, stats.rows) == (160000, 320000)
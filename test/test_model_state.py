@@ -0,0 +1,100 @@
+"""
+The persisted online model state must match a full recompute over the window.
+Run with: python -m pytest test/test_model_state.py
+"""
+import random
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from db import database_utilities, rollups
+from db.model_state import load_model_state, window_start, MODEL_LOOKBACK_DAYS
+from ml.algorithms import predict_next_week_daily, daily_confidence, daily_trend
+from ml.online import forecast_from_state
+from ml.timeseries import DAILY_SERIES_SQL, daily_matrix, active_days
+
+START = date(2024, 1, 1)
+
+
+class FakeDate(date):
+    current = START
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+
+@pytest.fixture
+def cursor(tmp_path, monkeypatch):
+    path = str(tmp_path / "state.db")
+    monkeypatch.setattr(database_utilities, "DATABASE_NAME", path)
+    database_utilities.init_database()
+    monkeypatch.setattr(rollups, "date", FakeDate)
+    conn = sqlite3.connect(path)
+    yield conn.cursor()
+    conn.close()
+
+
+def reference(cursor, user_id, today):
+    cursor.execute("SELECT MIN(day) FROM daily_category_totals WHERE user_id = ?", (user_id,))
+    start = window_start(date.fromisoformat(cursor.fetchone()[0]), today)
+    categories, daily = daily_matrix(cursor.execute(DAILY_SERIES_SQL, (user_id, str(start), str(today))), start, today)
+    order = np.argsort(categories)
+    daily = daily[order]
+    return (sorted(categories), active_days(daily), predict_next_week_daily(daily),
+            daily_confidence(daily), daily_trend(daily))
+
+
+def from_state(cursor, user_id, today):
+    state = load_model_state(cursor, user_id, today)
+    rows = state["categories"]
+    categories = [r[0] for r in rows]
+    recent = np.zeros((len(rows), 8))
+    first = np.zeros(len(rows))
+    for category, day, total in state["recent"]:
+        i = categories.index(category)
+        if (date.fromisoformat(day) - today).days >= -7:
+            recent[i, 7 + (date.fromisoformat(day) - today).days] = total
+        if day == str(state["start"]):
+            first[i] = total
+    stats = [np.array([r[k] for r in rows]) for k in range(1, 5)]
+    return (categories, state["active_days"], *forecast_from_state(state["n"], *stats, first, recent))
+
+
+def test_state_tracks_random_writes_across_days(cursor):
+    rng = random.Random(5)
+    user_id = "u1"
+    live = []   # (category, day, amount)
+    for step in range(600):
+        if step % 15 == 0:
+            FakeDate.current += timedelta(days=rng.choice([1, 1, 2, 5]))
+        today = FakeDate.current
+        op = rng.random()
+        if op < 0.65 or not live:
+            expense = (rng.choice(["food", "bills", "travel"]),
+                       today - timedelta(days=rng.choice([0, 0, 0, 1, 3, 40, 120])) + timedelta(days=rng.random() < 0.03),
+                       round(rng.uniform(1, 80), 2))
+            rollups.apply_expense_delta(cursor, user_id, expense[0], expense[1], expense[2])
+            live.append(expense)
+        elif op < 0.85:
+            old = live.pop(rng.randrange(len(live)))
+            new = (rng.choice(["food", "bills"]), old[1] - timedelta(days=rng.choice([0, 2])), round(rng.uniform(1, 80), 2))
+            rollups.move_expense(cursor, user_id, dict(zip(("category", "date", "amount"), old)),
+                                 dict(zip(("category", "date", "amount"), new)))
+            live.append(new)
+        else:
+            category, day, amount = live.pop(rng.randrange(len(live)))
+            rollups.apply_expense_delta(cursor, user_id, category, day, -amount, -1)
+
+        if step % 20 == 19:
+            expected = reference(cursor, user_id, today)
+            got = from_state(cursor, user_id, today)
+            assert got[0] == expected[0] and got[1] == expected[1]
+            np.testing.assert_allclose(got[2], expected[2], rtol=1e-9, atol=1e-7)
+            assert got[3] == expected[3] and got[4] == expected[4]
+
+    # Long idle gaps fall back to a rebuild
+    FakeDate.current += timedelta(days=MODEL_LOOKBACK_DAYS * 2)
+    assert load_model_state(cursor, user_id, FakeDate.current)["categories"] == []
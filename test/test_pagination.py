@@ -0,0 +1,63 @@
+"""
+Keyset pagination of GET /expenses: following X-Next-Cursor visits every
+row exactly once, in (date DESC, expense_id DESC) order.
+Run with: python -m pytest test/test_pagination.py
+"""
+import base64
+from datetime import date, timedelta
+
+import pytest
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def client(client):
+    # Most rows share one of two dates, so pages break in the middle of a day
+    for n in range(23):
+        day = TODAY if n < 12 else TODAY - timedelta(days=1 + n // 20)
+        client.post("/expenses", json={"amount": 1 + n, "category": "food", "description": "x", "date": str(day)})
+    return client
+
+
+def walk(client, limit, **params):
+    pages, cursor = [], None
+    while True:
+        response = client.get("/expenses", params={"limit": limit, **params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+@pytest.mark.parametrize("limit", [1, 5, 11, 23, 50])
+def test_cursor_walk_has_no_duplicates_or_gaps(client, limit):
+    everything = client.get("/expenses").json()
+    assert len(everything) == 23
+
+    pages = walk(client, limit)
+    walked = [row["expense_id"] for page in pages for row in page]
+    assert walked == [row["expense_id"] for row in everything]
+    assert len(set(walked)) == 23
+    assert all(len(page) == limit for page in pages[:-1])
+    keys = [(row["date"], row["expense_id"]) for page in pages for row in page]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_cursor_walk_respects_filters(client):
+    pages = walk(client, 4, start_date=str(TODAY))
+    assert sum(len(page) for page in pages) == 12
+    assert {row["date"] for page in pages for row in page} == {str(TODAY)}
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-base64!",
+    base64.urlsafe_b64encode(b"no separator").decode(),
+    base64.urlsafe_b64encode(b"2024-13-45|abc").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|abc").decode(),
+])
+def test_malformed_cursor_is_rejected(client, cursor):
+    response = client.get("/expenses", params={"limit": 5, "cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,96 @@
+"""
+KDF password hashes, and their transparent upgrade at login.
+Run with: python -m pytest test/test_passwords.py
+"""
+import hashlib
+import sqlite3
+
+import pytest
+
+from db import database_utilities
+from utils import passwords
+
+
+@pytest.fixture(autouse=True)
+def cheap_kdf(monkeypatch):
+    monkeypatch.setattr(passwords, "KDF", "scrypt")
+    monkeypatch.setattr(passwords, "SCRYPT_N", 2 ** 10)
+
+
+@pytest.fixture
+def username():
+    return "kdf"
+
+
+def stored_password(username="kdf"):
+    with sqlite3.connect(database_utilities.DATABASE_NAME) as conn:
+        return conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()[0]
+
+
+def set_stored_password(value, username="kdf"):
+    with sqlite3.connect(database_utilities.DATABASE_NAME) as conn:
+        conn.execute("UPDATE users SET password = ? WHERE username = ?", (value, username))
+
+
+def login(client, password):
+    return client.post("/auth/login", data={"username": "kdf", "password": password})
+
+
+def test_hash_roundtrip_and_salting(monkeypatch):
+    first, second = passwords.hash_password("pw"), passwords.hash_password("pw")
+    assert first != second and first.startswith("scrypt$1024$8$1$")
+    assert passwords.verify_password("pw", first) and not passwords.verify_password("pw!", first)
+    assert not passwords.needs_rehash(first)
+
+    monkeypatch.setattr(passwords, "KDF", "pbkdf2")
+    monkeypatch.setattr(passwords, "PBKDF2_ITERATIONS", 1000)
+    pbkdf2 = passwords.hash_password("pw")
+    assert pbkdf2.startswith("pbkdf2_sha256$1000$") and passwords.verify_password("pw", pbkdf2)
+    assert passwords.needs_rehash(first) and not passwords.needs_rehash(pbkdf2)
+    assert not passwords.verify_password("pw", "scrypt$bad")
+
+
+def test_register_stores_a_kdf_hash(client):
+    assert stored_password().startswith("scrypt$")
+    assert login(client, "secret123").status_code == 200
+    assert login(client, "wrong").status_code == 401
+    assert client.post("/auth/login", data={"username": "nobody", "password": "x"}).status_code == 401
+
+
+@pytest.mark.parametrize("legacy", [hashlib.sha256(b"secret123").hexdigest(), "secret123"])
+def test_legacy_hash_is_upgraded_on_login(client, legacy):
+    set_stored_password(legacy)
+    assert login(client, "wrong").status_code == 401
+    assert stored_password() == legacy
+
+    assert login(client, "secret123").status_code == 200
+    upgraded = stored_password()
+    assert upgraded.startswith("scrypt$1024$") and passwords.verify_password("secret123", upgraded)
+    assert login(client, "secret123").status_code == 200
+    assert stored_password() == upgraded
+
+
+def test_raised_cost_is_applied_on_next_login(client, monkeypatch):
+    old = stored_password()
+    monkeypatch.setattr(passwords, "SCRYPT_N", 2 ** 11)
+    assert login(client, "secret123").status_code == 200
+    assert stored_password() != old and stored_password().startswith("scrypt$2048$")
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda h: h.rsplit("$", 1)[0] + "$abcde",         # digest has impossible base64 padding
+    lambda h: h.replace("$", "$x", 1),                # cost is not a number
+    lambda h: "$".join(h.split("$")[:4] + ["@@", h.split("$")[5]]),   # salt is not base64
+    lambda h: h.rsplit("$", 1)[0],                    # a field is missing
+])
+def test_corrupted_stored_hash_is_rejected(client, corrupt):
+    set_stored_password(corrupt(stored_password()))
+    assert not passwords.verify_password("secret123", stored_password())
+    assert login(client, "secret123").status_code == 401
+    assert not passwords.verify_password("pw", "pbkdf2_sha256$1000$c2FsdA$a")
+
+
+def test_full_queue_sheds_load(client, monkeypatch):
+    monkeypatch.setattr(passwords, "MAX_PENDING", 0)
+    response = login(client, "secret123")
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
@@ -0,0 +1,118 @@
+"""
+Connection pool: nested get_db blocks share one transaction, the pool is
+bounded and counts how connections were obtained, and run_db runs a
+transaction on the DB executor.
+Run with: python -m pytest test/test_pool.py
+"""
+import asyncio
+import threading
+from contextvars import ContextVar
+
+import pytest
+
+from db.database_utilities import ConnectionPool, PoolExhausted, get_db, get_pool, run_db
+
+request_tag: ContextVar = ContextVar("request_tag", default=None)
+
+
+@pytest.fixture
+def table(database):
+    with get_db() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    return database
+
+
+def count_rows() -> int:
+    with get_db() as conn:
+        return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+
+def test_nested_get_db_reuses_the_outer_connection(table):
+    pool = get_pool()
+    hits = pool.hits
+    with get_db() as outer:
+        with get_db() as inner:
+            assert inner is outer
+            inner.execute("INSERT INTO t VALUES (1)")
+            with get_db() as innermost:
+                assert innermost is outer
+        # Leaving the inner blocks does not commit
+        assert outer.in_transaction
+    # The outer block reused the fixture's idle connection; each nested block counts as a hit too
+    assert pool.hits == hits + 3
+    assert count_rows() == 1
+
+
+def test_only_the_outermost_block_rolls_back(table):
+    with pytest.raises(RuntimeError):
+        with get_db() as outer:
+            outer.execute("INSERT INTO t VALUES (1)")
+            try:
+                with get_db() as inner:
+                    inner.execute("INSERT INTO t VALUES (2)")
+                    raise ValueError
+            except ValueError:
+                pass
+            # The inner failure left the outer transaction intact
+            assert outer.in_transaction
+            assert outer.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2
+            raise RuntimeError
+    assert count_rows() == 0
+
+
+def test_exhausted_pool_times_out(table):
+    pool = ConnectionPool(table, max_size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(PoolExhausted):
+        pool.acquire()
+    assert (pool.misses, pool.hits, pool.timeouts, pool.waits) == (1, 0, 1, 0)
+
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert (pool.misses, pool.hits, pool.timeouts) == (1, 1, 1)
+    pool.release(conn)
+    pool.close()
+
+
+def test_counts_hits_misses_and_waits(table):
+    pool = ConnectionPool(table, max_size=2, timeout=1)
+    first, second = pool.acquire(), pool.acquire()
+    assert pool.misses == 2 and pool.hits == 0
+
+    # A third caller waits until a connection is released
+    threading.Timer(0.05, pool.release, (first,)).start()
+    assert pool.acquire() is first
+    assert pool.waits == 1 and pool.wait_time > 0 and pool.timeouts == 0
+
+    pool.release(first)
+    pool.release(second)
+    # LIFO: the most recently released connection is handed out first
+    assert pool.acquire() is second and pool.hits == 1
+    pool.release(second)
+    pool.close()
+
+
+def test_run_db_uses_the_executor_with_the_callers_context(table):
+    def work(conn):
+        conn.execute("INSERT INTO t VALUES (1)")
+        with get_db() as nested:
+            assert nested is conn
+        return threading.current_thread().name, request_tag.get()
+
+    async def call():
+        request_tag.set("req-1")
+        return await run_db(work)
+
+    thread, tag = asyncio.run(call())
+    assert thread.startswith("db_") and tag == "req-1"
+    assert count_rows() == 1
+
+
+def test_run_db_rolls_back_on_error(table):
+    def fail(conn):
+        conn.execute("INSERT INTO t VALUES (1)")
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_db(fail))
+    assert count_rows() == 0
@@ -0,0 +1,108 @@
+"""
+EXPLAIN QUERY PLAN regression tests for the hot summary queries.
+Run with: python -m pytest test/test_query_plans.py
+"""
+import random
+import sqlite3
+import uuid
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from db import database_utilities
+from db.rollups import rebuild_daily_totals
+from api.expenses import MONTH_BREAKDOWN_SQL
+from api.budgets import BUDGET_SPEND_SQL, budget_spend_params
+from db.budget_status import BUDGET_STATUS_SQL
+
+CATEGORIES = ["food", "bills", "travel", "entertainment", "shopping", "healthcare", "education", "other"]
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("plans") / "plans.db")
+    original = database_utilities.DATABASE_NAME
+    database_utilities.DATABASE_NAME = path
+    try:
+        database_utilities.init_database()
+    finally:
+        database_utilities.DATABASE_NAME = original
+
+    conn = sqlite3.connect(path)
+    rng = random.Random(7)
+    now = datetime.now()
+    users = [str(uuid.uuid4()) for _ in range(20)]
+    conn.executemany(
+        "INSERT INTO users (user_id, username, email, password, created_at) VALUES (?,?,?,?,?)",
+        [(u, f"user{i}", f"user{i}@example.com", "x", now) for i, u in enumerate(users)],
+    )
+    conn.executemany(
+        "INSERT INTO expenses VALUES (?,?,?,?,?,?,?,?)",
+        [
+            (str(uuid.uuid4()), rng.choice(users), round(rng.uniform(1, 200), 2), rng.choice(CATEGORIES),
+             "x", date.today() - timedelta(days=rng.randint(0, 400)), now, now)
+            for _ in range(5000)
+        ],
+    )
+    rebuild_daily_totals(conn.cursor())
+    conn.commit()
+    conn.execute("ANALYZE")
+    yield conn
+    conn.close()
+
+
+def query_plan(conn, sql, params):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def test_month_breakdown_range_scans_rollup_primary_key(conn):
+    plan = query_plan(conn, MONTH_BREAKDOWN_SQL, ("u", "2024-01-01", "2024-02-01"))
+    assert any(
+        step.startswith("SEARCH daily_category_totals USING PRIMARY KEY")
+        and "user_id=?" in step and "day>?" in step
+        for step in plan
+    ), plan
+    assert not any("expenses" in step for step in plan), plan
+
+
+def test_budget_spend_range_scans_rollup(conn):
+    plan = query_plan(conn, BUDGET_SPEND_SQL, budget_spend_params("u", date(2024, 1, 20)))
+    assert any(step.startswith("SEARCH d USING PRIMARY KEY (user_id=? AND day>? AND day<?)") for step in plan), plan
+    assert not any(step.startswith("SCAN d") or "expenses" in step for step in plan), plan
+
+
+def test_budget_status_is_a_primary_key_join(conn):
+    plan = query_plan(conn, BUDGET_STATUS_SQL, {"user_id": "u", "month": "2024-01", "window": 7.0})
+    assert any(step.startswith("SEARCH s USING PRIMARY KEY (user_id=? AND category=? AND month=?)")
+               for step in plan), plan
+    plan = query_plan(conn, "SELECT user_id FROM budget_status WHERE crossed_at = ? AND month = ?",
+                      ("2024-01-20", "2024-01"))
+    assert any("INDEX idx_budget_status_crossed (crossed_at=?)" in step for step in plan), plan
+
+
+def test_covering_index_answers_category_sums(conn):
+    plan = query_plan(conn, """
+        SELECT SUM(amount) FROM expenses WHERE user_id = ? AND category = ? AND date >= ? AND date <= ?
+    """, ("u", "food", "2024-01-01", "2024-01-31"))
+    assert any("USING COVERING INDEX idx_expenses_user_category_date" in step for step in plan), plan
+
+
+def test_categories_are_normalized_on_migration(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    original = database_utilities.DATABASE_NAME
+    database_utilities.DATABASE_NAME = path
+    try:
+        database_utilities.init_database()
+        with database_utilities.get_db() as db:
+            db.execute("PRAGMA user_version = 0")
+            db.execute("INSERT INTO users VALUES ('u', 'legacy', 'l@example.com', 'x', NULL, ?)", (datetime.now(),))
+            db.execute("INSERT INTO expenses VALUES ('e', 'u', 5, 'Food', 'x', '2024-01-01', ?, ?)",
+                       (datetime.now(), datetime.now()))
+            db.execute("INSERT INTO budgets VALUES ('b1', 'u', 'Food', 100, ?)", (datetime.now(),))
+            db.execute("INSERT INTO budgets VALUES ('b2', 'u', 'food', 200, ?)", (datetime.now(),))
+        database_utilities.init_database()
+        with database_utilities.get_db() as db:
+            assert db.execute("SELECT category FROM expenses").fetchone()[0] == "food"
+            assert [tuple(r) for r in db.execute("SELECT budget_id, category FROM budgets")] == [("b2", "food")]
+    finally:
+        database_utilities.DATABASE_NAME = original
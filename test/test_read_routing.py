@@ -0,0 +1,85 @@
+"""
+Reads go to read-only connections, and to replicas only when those hold the
+user's latest data version.
+Run with: python -m pytest test/test_read_routing.py
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from db import database_utilities
+from db.replicas import sync_replicas
+
+
+@pytest.fixture(autouse=True)
+def replica(tmp_path, monkeypatch):
+    monkeypatch.setattr(database_utilities, "READ_REPLICAS", [str(tmp_path / "replica.db")])
+
+
+@pytest.fixture
+def username():
+    return "reader"
+
+
+def routes() -> dict:
+    return {values[0]: count for values, count in database_utilities.DB_READ_ROUTES._values.items()}
+
+
+def add_expense(client, amount):
+    return client.post("/expenses", json={"amount": amount, "category": "food", "description": "x",
+                                          "date": str(date.today())})
+
+
+def test_read_connections_are_read_only(client):
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        asyncio.run(database_utilities.run_read(lambda conn: conn.execute("DELETE FROM users")))
+    with database_utilities.get_db() as conn:
+        conn.execute("CREATE TABLE scratch (n INTEGER)")
+        conn.execute("INSERT INTO scratch VALUES (1)")
+        with database_utilities.get_read_db() as nested:
+            assert nested is conn and nested.execute("SELECT n FROM scratch").fetchone()[0] == 1
+
+
+def test_replica_serves_only_current_versions(client):
+    add_expense(client, 10)
+    sync_replicas()
+    before = routes()
+    assert [e["amount"] for e in client.get("/expenses").json()] == [10]
+    assert routes().get("replica", 0) > before.get("replica", 0)
+
+    # The replica now lags this user's version: the read falls back to the primary
+    add_expense(client, 20)
+    before = routes()
+    assert sorted(e["amount"] for e in client.get("/expenses").json()) == [10, 20]
+    after = routes()
+    assert after.get("stale_replica", 0) > before.get("stale_replica", 0)
+    assert after.get("replica", 0) == before.get("replica", 0)
+
+    sync_replicas()
+    assert sorted(e["amount"] for e in client.get("/expenses").json()) == [10, 20]
+    assert routes().get("replica", 0) > after.get("replica", 0)
+
+
+def test_missing_replica_falls_back(client):
+    add_expense(client, 5)
+    assert [e["amount"] for e in client.get("/expenses").json()] == [5]
+
+
+def test_health_does_not_queue_behind_writes(client):
+    release = threading.Event()
+    # Occupy every DB executor worker, as long writes or bulk imports would
+    busy = [database_utilities._db_executor.submit(release.wait, 10)
+            for _ in range(database_utilities._db_executor._max_workers)]
+    try:
+        started = time.perf_counter()
+        response = client.get("/health")
+        assert response.status_code == 200 and response.json()["status"] == "healthy"
+        assert time.perf_counter() - started < 5
+    finally:
+        release.set()
+        for future in busy:
+            future.result()
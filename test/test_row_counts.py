@@ -0,0 +1,32 @@
+"""
+Trigger-maintained row counts must match COUNT(*) after any mix of writes.
+Run with: python -m pytest test/test_row_counts.py
+"""
+from datetime import datetime
+
+from db import database_utilities
+from db.row_counts import COUNTED_TABLES, get_row_counts, recount_rows
+
+
+def test_counts_follow_inserts_and_deletes(tmp_path, monkeypatch):
+    path = str(tmp_path / "counts.db")
+    monkeypatch.setattr(database_utilities, "DATABASE_NAME", path)
+    database_utilities.init_database()
+    conn = database_utilities.get_pool(path)._connect()
+    now = datetime.now()
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, 'x', NULL, ?)",
+                     [(f"u{i}", f"user{i}", f"u{i}@example.com", now) for i in range(3)])
+    conn.executemany("INSERT INTO expenses VALUES (?, 'u0', 5.0, 'food', 'd', '2024-01-01', ?, ?)",
+                     [(f"e{i}", now, now) for i in range(50)])
+    conn.execute("INSERT INTO budgets VALUES ('b1', 'u0', 'food', 100.0, ?)", (now,))
+    conn.execute("DELETE FROM expenses WHERE expense_id IN ('e1', 'e2')")
+    conn.execute("INSERT OR REPLACE INTO budgets VALUES ('b1', 'u0', 'food', 200.0, ?)", (now,))
+    conn.execute("DELETE FROM users WHERE user_id = 'u2'")
+    conn.commit()
+
+    cursor = conn.cursor()
+    expected = {t: cursor.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in COUNTED_TABLES}
+    assert get_row_counts(cursor) == expected == {"users": 2, "expenses": 48, "budgets": 1}
+    recount_rows(cursor)
+    assert get_row_counts(cursor) == expected
+    conn.close()
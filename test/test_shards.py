@@ -0,0 +1,125 @@
+"""
+Per-user data lives in the user's shard, and rebalancing moves it there
+without changing what the API returns.
+Run with: python -m pytest test/test_shards.py
+"""
+import sqlite3
+import uuid
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from db import database_utilities, shards
+from db.database_utilities import ShardRing
+
+
+@pytest.fixture(autouse=True)
+def unsharded(monkeypatch):
+    monkeypatch.setattr(database_utilities, "SHARDS", 0)
+
+
+def seed(client, register, names):
+    users = {}
+    for n, name in enumerate(names):
+        headers = register(name)
+        for age in range(10 + n):
+            client.post("/expenses", headers=headers, json={
+                "amount": 3 + age, "category": "food", "description": "x",
+                "date": str(date.today() - timedelta(days=age))})
+        client.post("/budgets", headers=headers, json={"category": "food", "monthly_limit": 100})
+        users[name] = headers
+    return users
+
+
+def snapshot(client, users):
+    today = date.today()
+    return {name: (client.get("/expenses", headers=headers).json(),
+                   client.get("/expenses/summary/monthly", headers=headers,
+                              params={"month": today.month, "year": today.year}).json(),
+                   client.get("/budgets/alerts", headers=headers).json())
+            for name, headers in users.items()}
+
+
+def table_count(database, table):
+    with sqlite3.connect(database) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_ring_is_balanced_and_moves_little_when_growing():
+    keys = [str(uuid.UUID(int=i * 7919 + 1)) for i in range(4000)]
+    four, five = ShardRing([f"shard{i}" for i in range(4)]), ShardRing([f"shard{i}" for i in range(5)])
+    counts = {}
+    for key in keys:
+        counts[four.shard_for(key)] = counts.get(four.shard_for(key), 0) + 1
+    assert len(counts) == 4 and min(counts.values()) > 0.5 * len(keys) / 4
+    moved = [key for key in keys if four.shard_for(key) != five.shard_for(key)]
+    assert 0.1 < len(moved) / len(keys) < 0.35
+    assert {five.shard_for(key) for key in moved} == {"shard4"}
+
+
+def test_sharded_writes_land_in_the_users_shard(app, register, monkeypatch):
+    monkeypatch.setattr(database_utilities, "SHARDS", 3)
+    database_utilities.init_database()
+    client = TestClient(app)
+    users = seed(client, register, ["alice", "bobby", "carol", "danny"])
+
+    main = database_utilities.DATABASE_NAME
+    assert table_count(main, "users") == 4 and table_count(main, "expenses") == 0
+    with sqlite3.connect(main) as conn:
+        ids = dict(conn.execute("SELECT username, user_id FROM users"))
+    for n, name in enumerate(users):
+        with sqlite3.connect(database_utilities.shard_database(ids[name])) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM expenses WHERE user_id = ?", (ids[name],)).fetchone()[0] == 10 + n
+    assert sum(table_count(db, "expenses") for db in database_utilities.data_databases()) == 46
+
+    stats = client.get("/stats").json()
+    assert (stats["users_count"], stats["expenses_count"], stats["budgets_count"]) == (4, 46, 4)
+    assert client.get("/health").status_code == 200
+
+
+def test_rebalance_moves_data_without_changing_responses(app, register, monkeypatch):
+    client = TestClient(app)
+    users = seed(client, register, ["erin1", "frank", "gina1", "henry", "ivan1"])
+    before = snapshot(client, users)
+
+    monkeypatch.setattr(database_utilities, "SHARDS", 3)
+    summary = shards.rebalance(report=lambda line: None)
+    assert summary["users"] == 5
+    assert table_count(database_utilities.DATABASE_NAME, "expenses") == 0
+    assert shards.rebalance(report=lambda line: None)["users"] == 0
+
+    for database in database_utilities.data_databases():
+        with sqlite3.connect(database) as conn:
+            counted = dict(conn.execute("SELECT table_name, row_count FROM table_row_counts"))
+            assert counted["expenses"] == conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    assert snapshot(client, users) == before
+
+
+def test_shrinking_drains_retired_shards(app, register, monkeypatch):
+    monkeypatch.setattr(database_utilities, "SHARDS", 3)
+    database_utilities.init_database()
+    client = TestClient(app)
+    retired = database_utilities.shard_path("shard2")
+    users = {}
+    # user_ids are random: add users until the shard being retired holds some
+    for n in range(30):
+        users.update(seed(client, register, [f"user{n:02d}"]))
+        if len(users) >= 4 and table_count(retired, "expenses"):
+            break
+    before = snapshot(client, users)
+    total = sum(table_count(db, "expenses") for db in database_utilities.data_databases())
+    assert table_count(retired, "expenses") > 0
+
+    monkeypatch.setattr(database_utilities, "SHARDS", 2)
+    assert shards.retired_databases() == [retired]
+    assert shards.rebalance(report=lambda line: None)["users"] > 0
+    assert table_count(retired, "expenses") == 0
+    assert shards.rebalance(report=lambda line: None)["users"] == 0
+    assert sum(table_count(db, "expenses") for db in database_utilities.data_databases()) == total
+    assert snapshot(client, users) == before
+
+    monkeypatch.setattr(database_utilities, "SHARDS", 0)
+    shards.rebalance(report=lambda line: None)
+    assert table_count(database_utilities.DATABASE_NAME, "expenses") == total
+    assert snapshot(client, users) == before
@@ -0,0 +1,23 @@
+"""
+Run with: python -m pytest test/test_timeseries.py
+"""
+from datetime import date
+
+import numpy as np
+
+from ml.timeseries import daily_matrix, active_days, trim_leading_empty_days
+
+
+def test_daily_matrix_zero_fills_and_keeps_first_seen_order():
+    rows = [("food", "2024-03-02", 10.0), ("bills", "2024-03-02", 5.0), ("food", "2024-03-04", 2.5)]
+    categories, matrix = daily_matrix(rows, date(2024, 3, 1), date(2024, 3, 5))
+    assert categories == ["food", "bills"]
+    np.testing.assert_array_equal(matrix, [[0, 10.0, 0, 2.5, 0], [0, 5.0, 0, 0, 0]])
+    assert active_days(matrix) == 2
+
+
+def test_trim_leading_empty_days():
+    _, matrix = daily_matrix([("food", "2024-03-03", 1.0)], date(2024, 3, 1), date(2024, 3, 5))
+    np.testing.assert_array_equal(trim_leading_empty_days(matrix), [[1.0, 0, 0]])
+    empty = np.zeros((0, 5))
+    assert trim_leading_empty_days(empty).shape == (0, 5)
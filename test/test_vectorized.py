@@ -0,0 +1,78 @@
+"""
+The NumPy batch engine must agree with the pure-Python reference functions.
+Run with: python -m pytest test/test_vectorized.py
+"""
+import random
+
+import numpy as np
+import pytest
+
+from ml import algorithms
+from ml.vectorized import (
+    as_batch, batch_moving_average, batch_exponential_smoothing, batch_linear_regression,
+    batch_volatility, batch_trend, batch_predict_next, batch_confidence, batch_forecast_total,
+)
+
+
+@pytest.fixture(scope="module")
+def series():
+    rng = random.Random(11)
+    out = [[], [42.0], [5.0, 5.0], [3.0, 3.0, 3.0]]
+    for length in (2, 3, 7, 8, 30, 250, 1000):
+        out.append([round(rng.uniform(1, 150) * (1 + i * 0.01), 2) for i in range(length)])
+    return out
+
+
+def test_moving_average(series):
+    values, lengths = as_batch(series)
+    expected = [algorithms.moving_average(s, window=7) for s in series]
+    np.testing.assert_allclose(batch_moving_average(values, lengths, 7), expected, rtol=1e-12)
+
+
+def test_exponential_smoothing(series):
+    values, lengths = as_batch(series)
+    expected = [algorithms.exponential_smoothing(s, alpha=0.3) for s in series]
+    np.testing.assert_allclose(batch_exponential_smoothing(values, lengths, 0.3), expected, rtol=1e-9)
+
+
+def test_linear_regression(series):
+    values, lengths = as_batch(series)
+    slopes, intercepts = batch_linear_regression(values, lengths)
+    for row, s in enumerate(series):
+        slope, intercept = algorithms.simple_linear_regression(list(range(len(s))), s)
+        assert slopes[row] == pytest.approx(slope, rel=1e-9, abs=1e-9)
+        assert intercepts[row] == pytest.approx(intercept, rel=1e-9, abs=1e-9)
+
+
+def test_labels(series):
+    values, lengths = as_batch(series)
+    assert batch_volatility(values, lengths) == [algorithms.calculate_volatility(s) for s in series]
+    assert batch_trend(values, lengths) == [algorithms.calculate_trend(s) for s in series]
+
+
+def test_predict_next_matches_ensemble(series):
+    values, lengths = as_batch(series)
+    for row, s in enumerate(series):
+        if not s:
+            continue
+        x = list(range(len(s)))
+        slope, intercept = algorithms.simple_linear_regression(x, s)
+        expected = max(0, 0.4 * algorithms.moving_average(s, 7)
+                       + 0.4 * algorithms.exponential_smoothing(s, 0.3)
+                       + 0.2 * (slope * len(s) + intercept))
+        assert batch_predict_next(values, lengths)[row] == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+
+def test_confidence(series):
+    values, lengths = as_batch(series)
+    np.testing.assert_allclose(batch_confidence(values, lengths),
+                               [algorithms.calculate_confidence(s) for s in series])
+
+
+def test_forecast_total_sums_regression_line_over_horizon():
+    values, lengths = as_batch([[1.0, 2.0, 3.0, 4.0]])
+    # A perfect line has slope 1, so the LR part over the next 3 days is 5 + 6 + 7
+    ma = batch_moving_average(values, lengths, 7)[0]
+    es = batch_exponential_smoothing(values, lengths, 0.3)[0]
+    expected = 0.4 * 3 * ma + 0.4 * 3 * es + 0.2 * (5 + 6 + 7)
+    assert batch_forecast_total(values, lengths, horizon=3)[0] == pytest.approx(expected)
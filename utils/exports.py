@@ -0,0 +1,100 @@
+"""
+utils/exports.py
+Serialisers for streamed exports: each takes an async iterator of row
+batches (sqlite3.Row lists) and yields encoded chunks, one per batch, so
+memory use is bounded by the batch size rather than the result size.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import AsyncIterator, List, Sequence
+
+from utils.fastjson import row_dicts
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Written as ISO 8601, matching the same fields in GET /expenses
+TIMESTAMP_COLUMNS = ("created_at", "updated_at")
+
+async def csv_chunks(columns: Sequence[str], batches: AsyncIterator[List]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for rows in batches:
+        writer.writerows(item.values() for item in row_dicts(rows, columns, TIMESTAMP_COLUMNS))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+async def ndjson_chunks(columns: Sequence[str], batches: AsyncIterator[List]) -> AsyncIterator[str]:
+    async for rows in batches:
+        yield "".join(json.dumps(item) + "\n" for item in row_dicts(rows, columns, TIMESTAMP_COLUMNS))
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents are taken out after every row group"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+# Column name -> (pyarrow type name, converter from the stored SQLite value)
+EXPENSE_PARQUET_COLUMNS = {
+    "expense_id": ("string", str),
+    "user_id": ("string", str),
+    "amount": ("float64", float),
+    "category": ("string", str),
+    "description": ("string", str),
+    "date": ("date32", date.fromisoformat),
+    "created_at": ("timestamp[us]", datetime.fromisoformat),
+    "updated_at": ("timestamp[us]", datetime.fromisoformat),
+}
+
+async def parquet_chunks(columns: Sequence[str], batches: AsyncIterator[List]) -> AsyncIterator[bytes]:
+    """One Parquet row group per batch; needs the optional pyarrow package"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {name: EXPENSE_PARQUET_COLUMNS[name] for name in columns}
+    schema = pa.schema([(name, pa.type_for_alias(t)) for name, (t, _) in types.items()])
+    sink = _DrainableSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        async for rows in batches:
+            arrays = [
+                pa.array([convert(row[i]) for row in rows], type=schema.field(i).type)
+                for i, (_, convert) in enumerate(types.values())
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+WRITERS = {"csv": csv_chunks, "ndjson": ndjson_chunks, "parquet": parquet_chunks}
@@ -0,0 +1,81 @@
+"""
+utils/fastjson.py
+JSON encoding for responses. ORJSONResponse is the app's default response
+class; the row encoders serve trusted database rows (written by this API and
+checked against the schemas on the way in) straight from sqlite3 rows to
+JSON bytes, with no dict → pydantic model → validated dict round trip.
+orjson is optional: without it everything falls back to the stdlib encoder.
+"""
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Iterable, Sequence
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if hasattr(value, "item"):      # NumPy scalars
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def json_bytes_response(body: bytes, status_code: int = 200, headers: dict = None) -> Response:
+    """Response for a body that is already encoded JSON"""
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def iso_timestamp(value):
+    """sqlite3 stores datetimes as 'YYYY-MM-DD HH:MM:SS[.ffffff]'; pydantic emits a 'T'"""
+    if isinstance(value, str) and len(value) > 10 and value[10] == " ":
+        return value[:10] + "T" + value[11:]
+    return value
+
+
+def row_dicts(rows: Iterable, columns: Sequence[str], timestamps: Sequence[str] = ()) -> list:
+    """
+    One dict per row, in `columns` order (the SELECT list). Columns named in
+    `timestamps` are rewritten to ISO 8601; every other value is passed through.
+    """
+    stamp = [i for i, column in enumerate(columns) if column in timestamps]
+    if not stamp:
+        return [dict(zip(columns, row)) for row in rows]
+    result = []
+    for row in rows:
+        values = list(row)
+        for i in stamp:
+            values[i] = iso_timestamp(values[i])
+        result.append(dict(zip(columns, values)))
+    return result
+
+
+def encode_rows(rows: Iterable, columns: Sequence[str], timestamps: Sequence[str] = ()) -> bytes:
+    return dumps(row_dicts(rows, columns, timestamps))
+
+
+def encode_rows_ndjson(rows: Iterable, columns: Sequence[str], timestamps: Sequence[str] = ()) -> bytes:
+    return b"".join(dumps(item) + b"\n" for item in row_dicts(rows, columns, timestamps))
@@ -1,12 +1,70 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Request, Response, status
 from datetime import datetime, date, timedelta
+import hashlib
+import os
 
-from db.database_utilities import get_db
+from db.database_utilities import get_db, run_read, require_version
+from db.versions import get_data_version
 # ==================== HELPER FUNCTIONS ====================
 def row_to_dict(row):
     """Convert sqlite3.Row to dictionary"""
     return dict(zip(row.keys(), row))
 
+def month_range(year: int, month: int):
+    """Half-open [first day, first day of next month) range for a month"""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+def seconds_until_midnight(now: datetime = None) -> float:
+    """Time left in the current local day — TTL for anything keyed on date.today()"""
+    now = now or datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max((midnight - now).total_seconds(), 1.0)
+
+def weak_etag(*parts) -> str:
+    """Opaque validator for a response that is fully determined by `parts`"""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match check (weak comparison, so W/ prefixes are ignored)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+# Read endpoints revalidate against the user's data version (db/versions.py),
+# which every expense and budget write bumps. The path, query string and day
+# are part of the tag, since responses depend on them too.
+CONDITIONAL_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Authorization"}
+
+async def check_not_modified(request: Request, user_id: str):
+    """
+    (version, etag, response): response is a ready 304 when If-None-Match
+    matches, else None. Costs one primary-key read, before any other query.
+    Later reads in the request see at least this version (require_version).
+    """
+    version = await run_read(lambda conn: get_data_version(conn.cursor(), user_id))
+    require_version(user_id, version)
+    etag = weak_etag(request.url.path, sorted(request.query_params.multi_items()), user_id, version, date.today())
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return version, etag, Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+    return version, etag, None
+
+def etag_headers(etag: str) -> dict:
+    return {**CONDITIONAL_HEADERS, "ETag": etag}
+
+def uuid4_strings(n: int) -> list:
+    """n random version-4 UUID strings like str(uuid.uuid4()), from one urandom read"""
+    h = os.urandom(16 * n).hex()
+    return [
+        f"{h[i:i+8]}-{h[i+8:i+12]}-4{h[i+13:i+16]}-{'89ab'[int(h[i+16], 16) & 3]}{h[i+17:i+20]}-{h[i+20:i+32]}"
+        for i in range(0, 32 * n, 32)
+    ]
+
 def verify_user_exists(user_id: str):
     """Verify user exists"""
     with get_db() as conn:
@@ -0,0 +1,131 @@
+"""
+utils/ingest.py
+Incremental parsers for bulk uploads: turn an async stream of byte chunks
+into dict records without holding the whole upload as one string.
+"""
+import codecs
+import csv
+import io
+import json
+from typing import AsyncIterator, Dict
+
+FORMATS = ("json", "csv", "ndjson")
+
+def detect_format(content_type: str = "", filename: str = "") -> str:
+    """Pick a parser from a MIME type or file extension; defaults to json"""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    filename = (filename or "").lower()
+    if content_type in ("text/csv", "application/csv") or filename.endswith(".csv"):
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl") \
+            or filename.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "json"
+
+async def _decoded(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def _ndjson_record(line: str):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return e
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict]:
+    """
+    One JSON object per line; blank lines are skipped. A malformed line is
+    yielded as its ValueError so the caller can report it against that row.
+    """
+    pending = ""
+    async for text in _decoded(chunks):
+        pending += text
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if line.strip():
+                yield _ndjson_record(line)
+    if pending.strip():
+        yield _ndjson_record(pending)
+
+async def iter_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict]:
+    """
+    CSV with a header row. Text is handed to the csv module only up to a
+    newline outside quotes, so quoted fields may span chunks and lines.
+    Empty cells are dropped so model defaults apply.
+    """
+    header = None
+    pending = ""
+    async for text in _decoded(chunks):
+        pending += text
+        cut = pending.rfind("\n")
+        if cut < 0 or pending.count('"', 0, cut) % 2:
+            continue
+        block, pending = pending[:cut + 1], pending[cut + 1:]
+        for row in csv.reader(io.StringIO(block)):
+            if header is None:
+                header = [h.strip() for h in row]
+            elif any(row):
+                yield {k: v for k, v in zip(header, row) if v != ""}
+    for row in csv.reader(io.StringIO(pending)):
+        if header is None:
+            header = [h.strip() for h in row]
+        elif any(row):
+            yield {k: v for k, v in zip(header, row) if v != ""}
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict]:
+    """
+    A single JSON array of objects, decoded one element at a time as the text
+    arrives; only the element being decoded is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    texts = _decoded(chunks).__aiter__()
+    buffer, pos, eof, need_more = "", 0, False, False
+    state = "open"   # open -> first/item -> separator -> closed
+    while True:
+        if need_more or pos == len(buffer):
+            if eof:
+                break
+            try:
+                buffer = buffer[pos:] + await texts.__anext__()
+            except StopAsyncIteration:
+                eof = True
+                buffer = buffer[pos:]
+            pos, need_more = 0, False
+            continue
+        if buffer[pos] in " \t\r\n":
+            pos += 1
+            continue
+        if state == "open":
+            if buffer[pos] != "[":
+                raise ValueError("Expected a JSON array of expenses")
+            pos, state = pos + 1, "first"
+        elif state == "first" and buffer[pos] == "]":
+            pos, state = pos + 1, "closed"
+        elif state in ("first", "item"):
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                need_more = True   # the element continues in the next chunk
+                continue
+            if end == len(buffer) and not eof:
+                need_more = True   # a number may continue in the next chunk
+                continue
+            yield record
+            pos, state = end, "separator"
+        elif state == "separator" and buffer[pos] in ",]":
+            pos, state = pos + 1, "item" if buffer[pos] == "," else "closed"
+        else:
+            raise ValueError(f"Unexpected {buffer[pos]!r} in JSON array")
+    if state not in ("open", "closed"):
+        raise ValueError("Unterminated JSON array")
+
+PARSERS = {"json": iter_json_array, "csv": iter_csv, "ndjson": iter_ndjson}
+PARSE_ERRORS = (ValueError, csv.Error)
@@ -0,0 +1,159 @@
+"""
+utils/passwords.py
+Salted password hashing with a memory-hard KDF (hashlib.scrypt, or PBKDF2 via
+PASSWORD_KDF=pbkdf2). Stored hashes carry their scheme and cost, e.g.
+    scrypt$16384$8$1$<salt>$<hash>
+    pbkdf2_sha256$600000$<salt>$<hash>
+so the cost can be raised at any time: verify_password checks a hash with the
+parameters it was made with, and needs_rehash tells login to upgrade it.
+Legacy rows (unsalted SHA-256 hex, or the raw password) still verify once and
+are rehashed on that login.
+
+A KDF costs tens of milliseconds of CPU by design, so the async wrappers run
+it on a dedicated thread pool (hashlib releases the GIL while it works).
+Beyond PASSWORD_HASH_MAX_PENDING queued calls, requests get 503 instead of
+piling up behind the pool.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from utils.metrics import Counter, Histogram
+
+KDF = os.environ.get("PASSWORD_KDF", "scrypt")
+SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("PASSWORD_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("PASSWORD_SCRYPT_P", "1"))
+PBKDF2_ITERATIONS = int(os.environ.get("PASSWORD_PBKDF2_ITERATIONS", "600000"))
+HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", str(HASH_WORKERS * 16)))
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds", "CPU time of password KDF calls", ("operation", "scheme"),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+PASSWORD_REHASHES = Counter("password_rehashes_total", "Stored password hashes upgraded at login", ("from_scheme",))
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # OpenSSL's default maxmem (32 MiB) is below what n=2**15, r=8 needs
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p + 2 ** 20, dklen=HASH_BYTES)
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations, dklen=HASH_BYTES)
+
+
+def scheme_of(stored: str) -> str:
+    if stored.startswith("scrypt$"):
+        return "scrypt"
+    if stored.startswith("pbkdf2_sha256$"):
+        return "pbkdf2"
+    if len(stored) == 64 and all(c in "0123456789abcdef" for c in stored):
+        return "sha256"
+    return "plaintext"
+
+
+def hash_password(password: str) -> str:
+    """Hash with the configured KDF and cost (blocking; see hash_password_async)"""
+    started = time.perf_counter()
+    salt = os.urandom(SALT_BYTES)
+    if KDF == "pbkdf2":
+        stored = f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64(salt)}${_b64(_pbkdf2(password, salt, PBKDF2_ITERATIONS))}"
+    else:
+        digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        stored = f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+    PASSWORD_HASH_SECONDS.observe(time.perf_counter() - started, "hash", KDF)
+    return stored
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """Check password against any stored format, in constant time per format"""
+    started = time.perf_counter()
+    scheme = scheme_of(stored)
+    try:
+        if scheme == "scrypt":
+            _, n, r, p, salt, digest = stored.split("$")
+            candidate = _scrypt(password, _unb64(salt), int(n), int(r), int(p))
+            return hmac.compare_digest(candidate, _unb64(digest))
+        elif scheme == "pbkdf2":
+            _, iterations, salt, digest = stored.split("$")
+            candidate = _pbkdf2(password, _unb64(salt), int(iterations))
+            return hmac.compare_digest(candidate, _unb64(digest))
+        elif scheme == "sha256":
+            return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+        else:
+            return hmac.compare_digest(password.encode(), stored.encode())
+    except ValueError:   # malformed hash, including bad base64 (binascii.Error)
+        return False
+    finally:
+        PASSWORD_HASH_SECONDS.observe(time.perf_counter() - started, "verify", scheme)
+
+
+def needs_rehash(stored: str) -> bool:
+    """True unless stored was made with the configured KDF and cost"""
+    if KDF == "pbkdf2":
+        return not stored.startswith(f"pbkdf2_sha256${PBKDF2_ITERATIONS}$")
+    return not stored.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+# ==================== ASYNC EXECUTION ====================
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="kdf")
+_pending = 0   # only touched on the event loop thread
+
+
+async def _run_kdf(fn, *args):
+    global _pending
+    if _pending >= MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password checks in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_kdf(hash_password, password)
+
+
+async def verify_password_async(password: str, stored: str) -> bool:
+    return await _run_kdf(verify_password, password, stored)
+
+
+# Verified against when the username does not exist, so unknown and known
+# usernames take the same time to reject
+_dummy_hash = None
+
+
+async def reject_unknown_user(password: str) -> bool:
+    global _dummy_hash
+    if _dummy_hash is None or needs_rehash(_dummy_hash):
+        _dummy_hash = await hash_password_async(os.urandom(16).hex())
+    await verify_password_async(password, _dummy_hash)
+    return False
+
+
+def password_hash_stats() -> dict:
+    return {"kdf": KDF, "workers": HASH_WORKERS, "pending": _pending, "max_pending": MAX_PENDING}